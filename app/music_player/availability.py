@@ -0,0 +1,177 @@
+import os
+import threading
+
+from app import settings
+
+
+# stato di ogni entry, un byte per entry
+UNKNOWN = 0
+AVAILABLE = 1
+MISSING = 2
+
+
+class AvailabilityIndex:
+    """
+    Mappa (un byte per entry) della disponibilità su disco dei file di una
+    coda di riproduzione.
+
+    Un thread in background controlla una volta tutte le entry e poi
+    ricontrolla periodicamente solo gli intervalli osservati (le righe
+    mostrate dalla lista, le prossime entry della coda: vedi watch());
+    next_track e prev_track la consultano per saltare in un colpo solo le
+    entry mancanti, senza ricorsione e senza fare stat ad ogni salto. Le
+    directory inesistenti (es. un disco non montato) vengono ricordate, così
+    i loro file sono marcati mancanti senza stat.
+
+    Se le entry hanno un metodo iter_paths(range) (PlaylistRows, PlayQueue) il
+    controllo completo legge i percorsi da lì, a pagine dal database, invece
+    di indicizzare le entry: le righe della playlist non vengono caricate
+    tutte in memoria.
+    """
+
+    def __init__(self, entries, path_of=None):
+        self.entries = entries
+        self.path_of = path_of or (lambda entry: entry.mp4_path)
+        self.states = bytearray(len(entries))
+        self.version = 0  # incrementata quando cambia qualche stato
+        self._watched = {}  # chiave -> (range ricontrollato a ogni refresh, sorgente dei percorsi)
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __len__(self):
+        return len(self.states)
+
+    # === Controlli ===
+    def _check_path(self, path, dir_cache=None):
+        if not path:
+            return MISSING
+        if dir_cache is not None:
+            directory = os.path.dirname(path)
+            exists = dir_cache.get(directory)
+            if exists is None:
+                exists = dir_cache[directory] = os.path.isdir(directory)
+            if not exists:
+                return MISSING
+        return AVAILABLE if os.path.exists(path) else MISSING
+
+    def _set(self, index, state):
+        if self.states[index] != state:
+            self.states[index] = state
+            self.version += 1
+
+    def _path_at(self, index):
+        try:
+            return self.path_of(self.entries[index])
+        except (IndexError, AttributeError):
+            return None
+
+    def check(self, index):
+        """Controlla subito una entry (una sola stat) e ne restituisce lo stato."""
+        state = self._check_path(self._path_at(index))
+        self._set(index, state)
+        return state
+
+    def mark_missing(self, index):
+        self._set(index, MISSING)
+
+    def is_available(self, index):
+        """Usa lo stato noto; fa una stat solo se la entry non è ancora stata controllata."""
+        state = self.states[index]
+        if state == UNKNOWN:
+            state = self.check(index)
+        return state == AVAILABLE
+
+    def is_missing(self, index):
+        return self.states[index] == MISSING
+
+    # === Ricerca della prossima entry riproducibile ===
+    def next_playable(self, start, step=1):
+        """
+        Primo indice a partire da start (incluso), in avanti (step=1) o
+        all'indietro (step=-1) con wrap-around, la cui entry non è nota come
+        mancante. Restituisce None se tutte le entry mancano.
+
+        La ricerca sui byte di stato è fatta da bytearray.find/rfind (in C),
+        quindi anche lunghe sequenze di file mancanti si saltano in un passo.
+        """
+        n = len(self.states)
+        if n == 0:
+            return None
+        start %= n
+        for _ in range(n):
+            index = self._find(start, step)
+            if index is None:
+                return None
+            if self.is_available(index):
+                return index
+            # la entry era sconosciuta ed è risultata mancante: continua da lì
+            start = (index + step) % n
+        return None
+
+    def _find(self, start, step):
+        states = self.states
+        if step > 0:
+            ranges = ((start, len(states)), (0, start))
+            for lo, hi in ranges:
+                hits = [i for i in (states.find(AVAILABLE, lo, hi), states.find(UNKNOWN, lo, hi)) if i >= 0]
+                if hits:
+                    return min(hits)
+        else:
+            ranges = ((0, start + 1), (start + 1, len(states)))
+            for lo, hi in ranges:
+                hits = [i for i in (states.rfind(AVAILABLE, lo, hi), states.rfind(UNKNOWN, lo, hi)) if i >= 0]
+                if hits:
+                    return max(hits)
+        return None
+
+    # === Aggiornamento in background ===
+    def start(self):
+        """Avvia il thread che controlla tutte le entry e le ricontrolla periodicamente."""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._refresh_loop, daemon=True, name="availability")
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def watch(self, key, indices, paths=None):
+        """
+        Fa ricontrollare a ogni refresh periodico le entry in indices (un
+        range), al posto di quelle osservate in precedenza con la stessa
+        chiave (es. 'visible' per la lista, 'queue' per il player).
+
+        Args:
+            paths: funzione che dato un range restituisce i percorsi delle
+                sue entry (es. PlayQueue.iter_paths); di default vengono
+                letti indicizzando le entry dell'indice.
+        """
+        self._watched[key] = (indices, paths)
+
+    def _iter_paths(self, indices):
+        iter_paths = getattr(self.entries, 'iter_paths', None)
+        if iter_paths is not None:
+            return iter_paths(indices)
+        return map(self._path_at, indices)
+
+    def _refresh_range(self, indices, paths=None):
+        dir_cache = {}
+        for index, path in zip(indices, (paths or self._iter_paths)(indices)):
+            if self._stop.is_set():
+                return
+            self._set(index, self._check_path(path, dir_cache))
+
+    def refresh(self):
+        """Controlla tutte le entry (chiamata dal thread in background all'avvio)."""
+        self._refresh_range(range(len(self.states)))
+
+    def refresh_watched(self):
+        """Ricontrolla solo le entry osservate (vedi watch)."""
+        for indices, paths in list(self._watched.values()):
+            indices = range(max(0, indices.start), min(len(self.states), indices.stop))
+            if indices:
+                self._refresh_range(indices, paths)
+
+    def _refresh_loop(self):
+        self.refresh()
+        while not self._stop.wait(settings.AVAILABILITY_REFRESH_INTERVAL):
+            self.refresh_watched()
@@ -0,0 +1,97 @@
+import threading
+
+from app import settings
+
+
+class PlaybackBackend:
+    """
+    Interfaccia del motore di riproduzione usato da MusicPlayer.
+
+    Il backend crea i player e i media; i player hanno gli stessi metodi di
+    vlc.MediaPlayer usati dal lettore:
+    set_media(media), play(), pause(), stop(), get_time(), set_time(ms),
+    get_length() e audio_set_volume(volume).
+
+    Gli eventi arrivano con attach_events, da un thread qualsiasi del backend:
+    i callback devono solo accodare un messaggio per il thread del player.
+    """
+
+    def new_player(self):
+        raise NotImplementedError
+
+    def new_media(self, file_path):
+        """Media pronto per set_media, aperto al momento."""
+        raise NotImplementedError
+
+    def open_media(self, file_path):
+        """
+        Media già analizzato (durata e metadati), chiamato in background dal
+        preloader: ritorna solo a parsing concluso.
+        """
+        return self.new_media(file_path)
+
+    def attach_events(self, player, on_end, on_error, on_time, on_length):
+        """
+        Registra i callback del player: on_end() e on_error() a fine traccia o
+        per un errore, on_time(ms) e on_length(ms) quando cambiano posizione e
+        durata. Solleva un'eccezione se il backend non ha eventi (il lettore
+        passa allora al polling).
+        """
+        raise NotImplementedError
+
+    def is_finished(self, player):
+        """True se la traccia del player è finita o in errore."""
+        raise NotImplementedError
+
+
+class VlcBackend(PlaybackBackend):
+    """Riproduzione reale con libvlc (importato solo quando il backend viene creato)."""
+
+    def __init__(self, headless=False):
+        """
+        Args:
+            headless: solo audio, senza finestre video (es. dalla riga di comando).
+        """
+        import vlc
+
+        self.vlc = vlc
+        # istanza di libvlc: senza display si disattiva l'uscita video
+        self.instance = vlc.Instance(*settings.VLC_HEADLESS_ARGS) if headless else vlc.get_default_instance()
+        self._finished_states = (vlc.State.Ended, vlc.State.Error)
+        status = vlc.MediaParsedStatus
+        self._parsed_states = (status.skipped, status.failed, status.timeout, status.done)
+
+    def new_player(self):
+        return self.instance.media_player_new()
+
+    def new_media(self, file_path):
+        # i media vanno creati dalla stessa istanza di libvlc del player
+        return self.instance.media_new(file_path)
+
+    def open_media(self, file_path):
+        media = self.instance.media_new(file_path)
+        # parse_with_options ritorna subito: si attende l'evento di fine parsing,
+        # altrimenti il preload sembrerebbe pronto con il media ancora da analizzare
+        parsed = threading.Event()
+        event_type = self.vlc.EventType.MediaParsedChanged
+        event_manager = media.event_manager()
+        event_manager.event_attach(
+            event_type, lambda event: parsed.set() if media.get_parsed_status() in self._parsed_states else None)
+        try:
+            # parsing locale (demux dei metadati e della durata) fatto qui e non al play
+            if media.parse_with_options(self.vlc.MediaParseFlag.local, settings.PRELOAD_PARSE_TIMEOUT_MS) == 0:
+                parsed.wait(settings.PRELOAD_PARSE_TIMEOUT_MS / 1000)
+        finally:
+            event_manager.event_detach(event_type)
+        return media
+
+    def attach_events(self, player, on_end, on_error, on_time, on_length):
+        event_type = self.vlc.EventType
+        event_manager = player.event_manager()
+        event_manager.event_attach(event_type.MediaPlayerEndReached, lambda event: on_end())
+        event_manager.event_attach(event_type.MediaPlayerEncounteredError, lambda event: on_error())
+        event_manager.event_attach(event_type.MediaPlayerTimeChanged, lambda event: on_time(event.u.new_time))
+        event_manager.event_attach(event_type.MediaPlayerLengthChanged, lambda event: on_length(event.u.new_length))
+
+    def is_finished(self, player):
+        return player.get_state() in self._finished_states
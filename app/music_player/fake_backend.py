@@ -0,0 +1,182 @@
+import threading
+import zlib
+
+from app.music_player.backend import PlaybackBackend
+
+STOPPED = 'stopped'
+PLAYING = 'playing'
+PAUSED = 'paused'
+ENDED = 'ended'
+ERROR = 'error'
+
+
+class SimulatedClock:
+    """Orologio in millisecondi che avanza solo quando viene chiamato advance()."""
+
+    def __init__(self):
+        self.now_ms = 0
+
+    def advance(self, ms):
+        self.now_ms += ms
+
+
+class FakeMedia:
+    __slots__ = ('path', 'length_ms')
+
+    def __init__(self, path, length_ms):
+        self.path = path
+        self.length_ms = length_ms
+
+    def __repr__(self):
+        return f"FakeMedia({self.path!r}, {self.length_ms})"
+
+
+def default_length_of(file_path):
+    """Durata finta ma stabile per ogni percorso: tra 2 e 6 minuti."""
+    return 120000 + zlib.crc32(file_path.encode('utf-8')) % 240000
+
+
+class FakePlayer:
+    """
+    Player senza audio con gli stessi metodi di vlc.MediaPlayer: la posizione
+    dipende solo dall'orologio simulato del backend.
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.media = None
+        self.state = STOPPED
+        self.volume = 100
+        self.plays = 0  # chiamate a play() che hanno avviato un media
+        self._position_ms = 0  # posizione all'ultimo play/pause/seek
+        self._resumed_at = 0  # ms dell'orologio all'ultimo play/seek
+        self._callbacks = None  # (on_end, on_error, on_time, on_length)
+
+    def _now(self):
+        return self.backend.clock.now_ms
+
+    def _emit(self, index, *args):
+        if self._callbacks is not None:
+            self._callbacks[index](*args)
+
+    def set_media(self, media):
+        with self.backend.lock:
+            self.media = media
+            self.state = STOPPED
+            self._position_ms = 0
+
+    def play(self):
+        with self.backend.lock:
+            if self.media is None:
+                return -1
+            if self.media.path in self.backend.fail_paths:
+                self.state = ERROR
+                failed = True
+            else:
+                if self.state in (STOPPED, ENDED, ERROR):
+                    self._position_ms = 0
+                    self.plays += 1
+                self.state = PLAYING
+                self._resumed_at = self._now()
+                failed = False
+        # come in VLC gli eventi arrivano dopo il ritorno del comando
+        if failed:
+            self._emit(1)
+        else:
+            self._emit(3, self.media.length_ms)
+        return 0
+
+    def pause(self):
+        with self.backend.lock:
+            if self.state == PLAYING:
+                self._position_ms = self.get_time()
+                self.state = PAUSED
+
+    def stop(self):
+        with self.backend.lock:
+            self.state = STOPPED
+            self._position_ms = 0
+
+    def get_time(self):
+        with self.backend.lock:
+            if self.media is None:
+                return -1
+            if self.state != PLAYING:
+                return self._position_ms
+            return min(self._position_ms + self._now() - self._resumed_at, self.media.length_ms)
+
+    def set_time(self, ms):
+        with self.backend.lock:
+            if self.media is None:
+                return
+            self._position_ms = max(0, min(ms, self.media.length_ms))
+            self._resumed_at = self._now()
+
+    def get_length(self):
+        return self.media.length_ms if self.media is not None else 0
+
+    def audio_set_volume(self, volume):
+        self.volume = volume
+        return 0
+
+    def _tick(self):
+        """Aggiorna lo stato dopo un avanzamento dell'orologio; restituisce l'evento da emettere."""
+        if self.state != PLAYING:
+            return None
+        position = self.get_time()
+        if position >= self.media.length_ms:
+            self._position_ms = self.media.length_ms
+            self.state = ENDED
+            return (0,)
+        return (2, position)
+
+
+class FakeBackend(PlaybackBackend):
+    """
+    Backend deterministico per test, soak e benchmark: nessun audio, nessun
+    thread proprio e un orologio simulato. Il tempo scorre solo con advance(),
+    che emette gli eventi di posizione e di fine traccia come farebbe VLC, così
+    ore di riproduzione si simulano in pochi secondi.
+    """
+
+    def __init__(self, length_of=default_length_of, fail_paths=()):
+        """
+        Args:
+            length_of: funzione percorso -> durata in ms dei media.
+            fail_paths: percorsi il cui play() termina con un errore.
+        """
+        self.clock = SimulatedClock()
+        self.length_of = length_of
+        self.fail_paths = set(fail_paths)
+        self.lock = threading.RLock()
+        self.players = []
+        self.media_opened = 0
+
+    def new_player(self):
+        player = FakePlayer(self)
+        self.players.append(player)
+        return player
+
+    def new_media(self, file_path):
+        self.media_opened += 1
+        return FakeMedia(file_path, self.length_of(file_path))
+
+    def attach_events(self, player, on_end, on_error, on_time, on_length):
+        player._callbacks = (on_end, on_error, on_time, on_length)
+
+    def is_finished(self, player):
+        return player.state in (ENDED, ERROR)
+
+    def advance(self, ms):
+        """Fa scorrere l'orologio di ms millisecondi ed emette gli eventi dei player."""
+        with self.lock:
+            self.clock.advance(ms)
+            events = [(player, player._tick()) for player in self.players]
+        for player, event in events:
+            if event is not None:
+                player._emit(*event)
+
+    def active_player(self):
+        """Player in riproduzione (None se nessuno suona)."""
+        with self.lock:
+            return next((player for player in self.players if player.state == PLAYING), None)
@@ -2,109 +2,512 @@
 import os
 import sys
 import time
-import vlc
-import random
+import queue
+import threading
+from collections import deque
+from typing import NamedTuple, Optional
 
 
 # Importa le impostazioni e le utilità del progetto
 from app import settings
 from app import utils
+from app.music_player.backend import VlcBackend
+from app.music_player.preloader import MediaPreloader
+from app.music_player.availability import AvailabilityIndex
+from app.music_player.shuffle import ShuffleBag
+from app.music_player.play_queue import PlayQueue
+from app.utils.history import EVENT_COMPLETE, EVENT_SKIP, EVENT_START
+from app.utils.metrics import metrics
+from app.utils.repository import Track
 
 
+# messaggi della coda del player: comandi (da qualsiasi thread) ed eventi di VLC
+CMD_LOAD = 'load'
+CMD_PLAY_INDEX = 'play_index'
+CMD_NEXT = 'next'
+CMD_PREV = 'prev'
+CMD_TOGGLE_PAUSE = 'toggle_pause'
+CMD_TOGGLE_SHUFFLE = 'toggle_shuffle'
+CMD_TOGGLE_RADIO = 'toggle_radio'
+CMD_STOP = 'stop'
+CMD_VOLUME = 'volume'
+CMD_SEEK = 'seek'
+CMD_ENQUEUE = 'enqueue'
+CMD_INSERT_NEXT = 'insert_next'
+CMD_SHUTDOWN = 'shutdown'
+EVENT_END = 'end'
+EVENT_ERROR = 'error'
+CMD_SYNC = 'sync'
+
+
+class PlayerState(NamedTuple):
+    """Fotografia immutabile dello stato del player, pubblicata dal suo thread."""
+    track: Optional[Track] = None
+    index: int = -1  # posizione nella coda, -1 per le richieste dell'utente
+    is_paused: bool = False
+    is_stopped: bool = True  # nessuna traccia in riproduzione (stop o fine della coda)
+    shuffle: bool = False
+    volume: int = 100
+    started: int = 0  # incrementato a ogni avvio di traccia (anche la stessa)
+    radio: bool = False
+
 
 class MusicPlayer:
-    def __init__(self, on_song_change_callback=None):
+    """
+    Lettore con un solo thread proprietario, su un backend di riproduzione
+    intercambiabile (VLC di default, FakeBackend per test e soak).
+
+    Tutto lo stato (i player del backend, la coda, lo shuffle, il precaricamento)
+    è letto e modificato solo dal thread del player. Gli altri thread (la UI)
+    inviano comandi con i metodi pubblici, che si limitano ad accodarli, e
+    leggono lo stato dalla fotografia self.state, sostituita in blocco dal
+    thread del player a ogni cambiamento.
 
-        # player è il vlc
-        self.player = vlc.MediaPlayer()
+    I comandi arrivati a raffica (es. skip ripetuti) vengono eseguiti tutti ma
+    solo l'ultima traccia scelta viene davvero avviata nel backend.
+    """
 
-        # set empty playlist array
-        self.playlist = []  # Lista di tuple (file_path, titolo, cover_path)
-        ## ->> ci aggiungiamo artist
-        # -> # Lista di tuple (file_path, titolo, artits, cover_path)
+    def __init__(self, on_state_change=None, headless=False, backend=None, history=None, similarity=None,
+                 waveforms=None):
+        """
+        Args:
+            on_state_change: funzione opzionale chiamata con il nuovo PlayerState,
+                dal thread del player (non usarla per toccare widget Tk).
+            headless: solo audio, senza finestre video (es. dalla riga di comando).
+            backend: PlaybackBackend da usare; di default VlcBackend(headless).
+            history: PlayHistory opzionale in cui registrare avvii, skip e
+                tracce completate (la scrittura è differita, il player non aspetta).
+            similarity: SimilarityIndex opzionale per la modalità radio.
+            waveforms: WaveformService opzionale, a cui viene chiesta in
+                anticipo la forma d'onda della prossima traccia.
+        """
+
+        self.backend = backend or VlcBackend(headless)
+        # player è il vlc (o il player del backend scelto)
+        self.player = self.backend.new_player()
+        # secondo player usato solo per il crossfade (se abilitato)
+        self.standby_player = self.backend.new_player() if settings.CROSSFADE_MS > 0 else None
+        self.volume = 100
+
+        # coda di riproduzione: rowid delle canzoni, le Track sono lette dal DB quando servono
+        self.playlist = PlayQueue()
+        # Track in riproduzione (anche se viene dalle richieste dell'utente)
+        self.current_track = None
+        self._playing_pending = False
+        self.history = history
+        self.waveforms = waveforms
+        # True quando la traccia corrente è finita o è già stata registrata come skip
+        self._track_done = True
 
         self.current_index = -1
         self.running = True
         self.is_paused = False
+        self.is_stopped = True
         self.shuffle = False  # ✅ inizializzato
-        self.on_song_change = on_song_change_callback
+        # permutazione lazy per lo shuffle senza ripetizioni
+        self.shuffle_bag = ShuffleBag(seed=settings.SHUFFLE_SEED)
+        # modalità radio: a fine coda accoda le canzoni più simili alla traccia corrente
+        self.similarity = similarity
+        self.radio = False
+        self.recent_rowids = deque(maxlen=settings.RADIO_RECENT)
+        self.on_state_change = on_state_change
+        # ultima fotografia pubblicata, letta dalla UI
+        self.state = PlayerState()
+        self._started = 0
+        # posizione e durata della traccia corrente in ms, scritte dagli eventi
+        # TimeChanged/LengthChanged di VLC (o dal watchdog se gli eventi mancano);
+        # la UI le legge senza chiamare VLC
+        self.time_ms = 0
+        self.length_ms = 0
+        # disponibilità su disco delle entry della playlist, aggiornata in background
+        self.availability = AvailabilityIndex([])
+
+        # look-ahead: indice della prossima traccia già scelto (anche in shuffle)
+        # e relativo media aperto in background
+        self.next_index = None
+        self.preloader = MediaPreloader(self.backend)
+        # True finché la traccia corrente può ancora avviare un crossfade
+        self._fade_armed = False
+        # traccia scelta dai comandi in corso, avviata alla fine della raffica
+        self._to_start = None
+        # eventi di sync() da segnalare alla fine della raffica corrente
+        self._synced = []
+
+        # coda dei messaggi: i callback di VLC girano su un thread interno di libvlc
+        # da cui non si possono richiamare funzioni del player, quindi come la UI
+        # si limitano ad accodare un messaggio per il thread del player
+        self._inbox = queue.Queue()
+        self._thread = None
+        self._pending_end_time = None
+        # avvio dell'ultima traccia, per misurare il primo frame audio (solo con le metriche)
+        self._first_frame_from = None
+        # gap (ms) tra la fine di una traccia e il play() della successiva
+        self.transition_gaps = deque(maxlen=settings.TRANSITION_GAP_HISTORY)
+        self.events_attached = self._attach_events(self.player)
+        if self.standby_player is not None:
+            self._attach_events(self.standby_player)
+
+    # === Comandi (thread-safe, chiamabili da qualsiasi thread) ===
+    def _send(self, kind, arg=None):
+        self._inbox.put((kind, arg))
+
+    def start(self):
+        """Avvia il thread del player."""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self.run, daemon=True, name="player")
+            self._thread.start()
+
+    def load_playlist(self, songs, availability=None, start_index=0):
+        """
+        Carica una nuova coda di riproduzione e avvia la canzone start_index.
+
+        Args:
+            songs: PlayQueue da riprodurre.
+            availability: AvailabilityIndex già costruito sulle stesse entry (ad
+                esempio dalla UI); se assente ne viene creato uno.
+            start_index: indice della prima canzone da suonare.
+        """
+        self._send(CMD_LOAD, (songs, availability, start_index))
+
+    def play_song_at_index(self, index):
+        self._send(CMD_PLAY_INDEX, index)
+
+    def next_track(self):
+        """Passa alla canzone successiva (supporta shuffle)."""
+        self._send(CMD_NEXT)
+
+    def prev_track(self):
+        """Passa alla canzone precedente (in shuffle, quella suonata prima)."""
+        self._send(CMD_PREV)
+
+    def toggle_pause(self):
+        """Metti in pausa o riprendi la riproduzione."""
+        self._send(CMD_TOGGLE_PAUSE)
+
+    def toggle_shuffle(self):
+        """Attiva o disattiva la modalità shuffle."""
+        self._send(CMD_TOGGLE_SHUFFLE)
+
+    def toggle_radio(self):
+        """Attiva o disattiva la modalità radio (serve un indice di similarità)."""
+        self._send(CMD_TOGGLE_RADIO)
+
+    def stop(self):
+        self._send(CMD_STOP)
+
+    def set_volume(self, volume):
+        """Imposta il volume (0-100)."""
+        self._send(CMD_VOLUME, int(float(volume)))
+
+    def seek(self, ms):
+        """Sposta la riproduzione a ms millisecondi dall'inizio della traccia."""
+        self._send(CMD_SEEK, int(ms))
+
+    def enqueue(self, rowid):
+        """Aggiunge una canzone (rowid) in fondo alle richieste dell'utente."""
+        self._send(CMD_ENQUEUE, rowid)
 
+    def insert_next(self, rowid):
+        """Fa suonare una canzone (rowid) subito dopo quella corrente."""
+        self._send(CMD_INSERT_NEXT, rowid)
 
-    def load_playlist(self, songs):
-        """Carica una nuova playlist di canzoni."""
-        self.stop()
+    def sync(self, timeout=None):
+        """
+        Attende che il thread del player abbia eseguito i comandi inviati finora,
+        e i messaggi arrivati nel frattempo, e pubblicato il nuovo stato (usato
+        da test e benchmark).
+        Restituisce False se il timeout scade prima.
+        """
+        done = threading.Event()
+        self._send(CMD_SYNC, done)
+        return done.wait(timeout)
+
+    def shutdown(self):
+        """Ferma la riproduzione e termina il thread del player."""
+        self._send(CMD_SHUTDOWN)
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout=2.0)
+
+    # === Loop del player ===
+    def run(self):
+        """Loop del player: l'unico thread che tocca il backend e lo stato della coda."""
+        handlers = {
+            CMD_LOAD: lambda arg: self._load_playlist(*arg),
+            CMD_PLAY_INDEX: self._play_song_at_index,
+            CMD_NEXT: lambda arg: self._next_track(),
+            CMD_PREV: lambda arg: self._prev_track(),
+            CMD_TOGGLE_PAUSE: lambda arg: self._toggle_pause(),
+            CMD_TOGGLE_SHUFFLE: lambda arg: self._toggle_shuffle(),
+            CMD_TOGGLE_RADIO: lambda arg: self._toggle_radio(),
+            CMD_STOP: lambda arg: self._stop(),
+            CMD_VOLUME: self._set_volume,
+            CMD_SEEK: self._seek,
+            CMD_ENQUEUE: self._enqueue,
+            CMD_INSERT_NEXT: self._insert_next,
+            CMD_SHUTDOWN: lambda arg: self._shutdown(),
+            CMD_SYNC: self._synced.append,
+            EVENT_END: lambda arg: self._handle_end(EVENT_END, arg),
+            EVENT_ERROR: lambda arg: self._handle_end(EVENT_ERROR, arg),
+        }
+        while self.running:
+            try:
+                kind, arg = self._inbox.get(timeout=self._watchdog_timeout())
+            except queue.Empty:
+                self._on_watchdog()
+            else:
+                self._dispatch(handlers, kind, arg)
+                # una raffica di comandi viene eseguita tutta prima di avviare la traccia
+                while self.running:
+                    try:
+                        kind, arg = self._inbox.get_nowait()
+                    except queue.Empty:
+                        break
+                    self._dispatch(handlers, kind, arg)
+            if self.running:
+                self._flush()
+            # sync() aspetta anche gli eventi generati dalla raffica (es. errore al play)
+            if self._synced and (self._inbox.empty() or not self.running):
+                while self._synced:
+                    self._synced.pop().set()
+
+    @staticmethod
+    def _dispatch(handlers, kind, arg):
+        try:
+            handlers[kind](arg)
+        except Exception as e:
+            # un comando fallito non deve fermare il thread del player
+            print(f"Errore nel comando '{kind}' del player: {e}")
+
+    def _flush(self):
+        """Avvia la traccia scelta dalla raffica di comandi e pubblica il nuovo stato."""
+        if self._to_start is not None:
+            track, index = self._to_start
+            self._to_start = None
+            self._start_track(track, index)
+        self._publish()
+
+    def _publish(self):
+        index = -1 if self._playing_pending or self.current_track is None else self.current_index
+        state = PlayerState(self.current_track, index, self.is_paused, self.is_stopped,
+                            self.shuffle, self.volume, self._started, self.radio)
+        if state != self.state:
+            self.state = state
+            if self.on_state_change:
+                self.on_state_change(state)
+
+    # === Implementazione dei comandi (solo dal thread del player) ===
+    def _load_playlist(self, songs, availability, start_index):
+        with metrics.span('player_load_playlist'):
+            self._replace_playlist(songs, availability, start_index)
+
+    def _replace_playlist(self, songs, availability, start_index):
+        if songs is self.playlist:
+            # stessa coda: shuffle, disponibilità e richieste restano valide
+            self._play_song_at_index(start_index)
+            return
+        self.player.stop()
+        self.preloader.clear()
+        self.next_index = None
+        if availability is not self.availability:
+            self.availability.stop()
+        self.availability = availability or AvailabilityIndex(songs)
+        self.availability.start()
         self.playlist = songs # -> songs preso da ui box
-        self.current_index = 0
+        self.shuffle_bag.weight_of = self._shuffle_weights(songs)
+        self.shuffle_bag.reset(len(songs))
+        self.current_index = start_index
+        if self.shuffle:
+            self.shuffle_bag.select(start_index)
         self.play_current()
 
-    def play_song_at_index(self, index):
+    def _shuffle_weights(self, songs):
+        """Peso per lo shuffle: gli avvii registrati nella cronologia (None = shuffle uniforme)."""
+        if not settings.SHUFFLE_PREFER_LESS_PLAYED or self.history is None:
+            return None
+        counts = self.history.play_counts_by_rowid()
+        return lambda index: counts.get(songs.rowid_at(index), 0)
+
+    def _play_song_at_index(self, index):
         if 0 <= index < len(self.playlist):
             self.current_index = index
+            if self.shuffle:
+                self.shuffle_bag.select(index)
             self.play_current()
 
-    def next_track(self):
-        """Passa alla canzone successiva (supporta shuffle)."""
+    def _enqueue(self, rowid):
+        self.playlist.enqueue(rowid)
+        self.schedule_preload()
+
+    def _insert_next(self, rowid):
+        self.playlist.insert_next(rowid)
+        self.schedule_preload()
+
+    def choose_next_index(self):
+        """
+        Sceglie l'indice della traccia successiva (supporta shuffle), saltando
+        le entry i cui file mancano. None se nessuna entry è riproducibile.
+        """
+        if not self.shuffle:
+            return self.availability.next_playable(self.current_index + 1, 1)
+
+        # la prossima della permutazione; le entry mancanti vengono consumate dal giro
+        for _ in range(len(self.playlist)):
+            candidate = self.shuffle_bag.peek_next()
+            if candidate is None or self.availability.is_available(candidate):
+                return candidate
+            self.shuffle_bag.advance()
+        return None
+
+    def _next_track(self):
+        # le richieste dell'utente hanno la precedenza sul contesto
+        while self.playlist.pending:
+            track = self.playlist.pop_pending()
+            if track is not None and track.mp4_path and os.path.exists(track.mp4_path):
+                self._to_start = (track, -1)
+                return
+            print(f"Errore: file non trovato -> {track.mp4_path if track else None}")
         if not self.playlist:
             return
 
-        if self.shuffle:
-            self.current_index = random.randint(0, len(self.playlist) - 1)
+        # usa l'indice già scelto dal look-ahead, così il media precaricato è quello giusto
+        if self.next_index is not None and 0 <= self.next_index < len(self.playlist):
+            index = self.next_index
         else:
-            self.current_index = (self.current_index + 1) % len(self.playlist)
+            index = self.choose_next_index()
+        # il look-ahead vale per un solo passo: con più skip in raffica si ricalcola
+        self.next_index = None
+        if index is None:
+            print("Nessuna canzone disponibile nella playlist")
+            self.is_stopped = True
+            return
 
+        if self.shuffle:
+            if self.shuffle_bag.peek_next() == index:
+                self.shuffle_bag.advance()
+            else:
+                self.shuffle_bag.select(index)
+        self.current_index = index
         self.play_current()
 
-    def prev_track(self):
-        """Passa alla canzone precedente."""
+    def _prev_track(self):
         if not self.playlist:
             return
-        self.current_index = (self.current_index - 1 + len(self.playlist)) % len(self.playlist)
-        self.play_current()
+        index = self.shuffle_bag.prev() if self.shuffle else None
+        if index is None:
+            index = self.availability.next_playable(self.current_index - 1, -1)
+        if index is None:
+            print("Nessuna canzone disponibile nella playlist")
+            return
+        self.current_index = index
+        self.play_current(step=-1)
 
-    def play_current(self):
-        """Riproduce la canzone corrente."""
+    def play_current(self, step=1):
+        """
+        Sceglie la canzone corrente da avviare. Se il file manca passa, senza
+        ricorsione, alla prima entry riproducibile nella direzione step (1
+        avanti, -1 indietro). L'avvio vero e proprio avviene alla fine della
+        raffica di comandi.
+        """
 
         # se non è settata la plaulist di canzoni oppure
         # il current index è -1 non fa niente
         if not self.playlist or not (0 <= self.current_index < len(self.playlist)):
             return
 
-        # definisce il cazzo di entry
-        entry = self.playlist[self.current_index]
+        while True:
+            # definisce il cazzo di entry
+            track = self.playlist[self.current_index]
+            if track is None:
+                print("Canzone non più presente nel database, indice", self.current_index)
+                self.availability.mark_missing(self.current_index)
+            elif self.availability.is_available(self.current_index):
+                break
+            else:
+                print(f"Errore: file non trovato -> {track.mp4_path}")
 
-        # se la lughezza dell'entry è pari a due setta cover_path none
-        if len(entry) == 2:
-            file_path, song_title = entry
-            cover_path = None
+            index = self.availability.next_playable(self.current_index + step, step)
+            if index is None:
+                print("Nessuna canzone disponibile nella playlist")
+                self.next_index = None
+                return
+            self.current_index = index
 
-        elif len(entry) >= 4:
-            file_path, song_title, cover_path, artists = entry[:4]
+        self._to_start = (track, self.current_index)
 
-        # diversemnte prende i primi 3 
-        elif len(entry) >= 3:
-            file_path, song_title, cover_path = entry[:3]
-        else:
-            print("Formato playlist non valido:", entry)
-            return
+    def _start_track(self, track, index=-1):
+        """
+        Avvia una Track nel backend. index è la sua posizione nel contesto, -1 per
+        le richieste dell'utente (la posizione nel contesto resta quella corrente).
+        """
+        self._record_leave()
+        file_path = track.mp4_path
+        # azzerati prima del play: gli eventi di durata e posizione della nuova
+        # traccia possono arrivare prima che play() ritorni
+        self.time_ms = self.length_ms = 0
+        if metrics.enabled:
+            self._first_frame_from = time.perf_counter()
+        with metrics.span('player_start_track'):
+            # prendi la cazzo di canzone dal file path (già aperta se precaricata)
+            media = self.preloader.take(file_path)
+            if media is None:
+                metrics.count('media_preload_misses')
+                with metrics.span('media_open'):
+                    media = self.backend.new_media(file_path)
+            # la setta
+            self.player.set_media(media)
+            # suonala
+            self.player.play()
+            self.player.audio_set_volume(self._track_volume(track))
+        metrics.count('tracks_started')
+        self.is_paused = False
+        self.is_stopped = False
+        self._fade_armed = self.standby_player is not None
+        self._record_transition()
+        self.current_track = track
+        self.recent_rowids.append(track.rowid)
+        self._playing_pending = index < 0
+        self._started += 1
+        self._record(EVENT_START)
+        if index >= 0:
+            # i file delle prossime entry del contesto vengono ricontrollati periodicamente
+            self.availability.watch('queue', range(index, index + settings.AVAILABILITY_WATCH_AHEAD),
+                                    getattr(self.playlist, 'iter_paths', None))
 
-        if not os.path.exists(file_path):
-            print(f"Errore: file non trovato -> {file_path}")
-            self.next_track()
-            return
+        self.schedule_preload()
 
-        # prendi la cazzo di canzone dal file path
-        media = vlc.Media(file_path)
-        # la setta
-        self.player.set_media(media)
-        # suonala 
-        self.player.play()
-        self.is_paused = False
+    def schedule_preload(self):
+        """Sceglie la prossima traccia e ne apre il media in background."""
+        self._extend_radio()
+        if not settings.PRELOAD_NEXT_TRACK:
+            self.next_index = None
+            return
+        pending = self.playlist.peek_pending()
+        if pending is not None:
+            # la prossima è una richiesta dell'utente; il contesto riprende dopo
+            self.next_index = None
+            if pending.mp4_path:
+                self._preload(pending)
+            return
+        if not self.playlist:
+            self.next_index = None
+            return
+        self.next_index = self.choose_next_index()
+        if self.next_index is None:
+            return
+        track = self.playlist[self.next_index]
+        if track is not None and self.availability.is_available(self.next_index):
+            self._preload(track)
 
-        if self.on_song_change:
-            self.on_song_change(file_path, song_title, self.current_index)
+    def _preload(self, track):
+        self.preloader.schedule(track.mp4_path)
+        if self.waveforms is not None:
+            # l'analisi della forma d'onda (se manca) gira sul thread del servizio
+            self.waveforms.prefetch(track)
 
-    def toggle_pause(self):
-        """Metti in pausa o riprendi la riproduzione."""
+    def _toggle_pause(self):
+        # pausa e seek valgono per la traccia scelta dai comandi precedenti della raffica
+        if self._to_start is not None:
+            self._flush()
         if self.is_paused:
             self.player.play()
             self.is_paused = False
@@ -112,26 +515,258 @@ class MusicPlayer:
             self.player.pause()
             self.is_paused = True
 
-    def toggle_shuffle(self):
-        """Attiva o disattiva la modalità shuffle."""
+    def _toggle_shuffle(self):
         self.shuffle = not self.shuffle
+        if self.shuffle and self.radio:
+            self.radio = False
+            print("Modalità radio disattivata dallo shuffle")
+        if self.shuffle:
+            # nuovo giro che parte dalla traccia corrente
+            self.shuffle_bag.reset(len(self.playlist))
+            if 0 <= self.current_index < len(self.playlist):
+                self.shuffle_bag.select(self.current_index)
+        # la prossima traccia scelta in anticipo non è più valida
+        self.schedule_preload()
         print(f"Modalità shuffle: {'attiva' if self.shuffle else 'disattivata'}")
 
-    def stop(self):
+    def _toggle_radio(self):
+        if not self.radio and self.similarity is None:
+            print("Modalità radio non disponibile: manca l'indice di similarità (run_cmd similarity-index)")
+            return
+        self.radio = not self.radio
+        if self.radio and self.shuffle:
+            # la radio continua la coda in ordine: con lo shuffle non avrebbe una fine
+            self.shuffle = False
+            print("Modalità shuffle disattivata dalla radio")
+        self.schedule_preload()
+        print(f"Modalità radio: {'attiva' if self.radio else 'disattivata'}")
+
+    def _extend_radio(self):
+        """
+        In modalità radio, quando il contesto è all'ultima traccia riproducibile
+        e non ci sono richieste in attesa, accoda tra le richieste le
+        RADIO_BATCH canzoni più simili alla traccia corrente (anche quella
+        della radio che sta suonando), escluse quelle suonate di recente.
+        """
+        if not self.radio or self.playlist.pending or self.current_track is None:
+            return
+        if self.playlist:
+            following = self.availability.next_playable(self.current_index + 1, 1)
+            if following is not None and following > self.current_index:
+                return  # il contesto non è ancora finito
+        for rowid in self.similarity.neighbors(self.current_track.rowid, settings.RADIO_BATCH,
+                                               exclude=self.recent_rowids):
+            self.playlist.enqueue(rowid)
+
+    def _seek(self, ms):
+        if self._to_start is not None:
+            self._flush()
+        self.player.set_time(ms)
+        self.time_ms = ms
+
+    def _stop(self):
+        self._to_start = None
+        self._record_leave()
         self.player.stop()
+        self.is_stopped = True
+        self.time_ms = 0
 
-    def set_volume(self, volume):
-        """Imposta il volume (0-100)."""
-        self.player.audio_set_volume(int(float(volume)))
+    def _set_volume(self, volume):
+        self.volume = volume
+        self.player.audio_set_volume(self._track_volume(self.current_track))
 
-    def shutdown(self):
-        """Ferma la riproduzione e termina il thread di monitoraggio."""
-        self.stop()
+    def _track_volume(self, track):
+        """
+        Volume da passare al backend per la traccia: quello scelto dall'utente
+        corretto dal guadagno di normalizzazione salvato nel database. Nessuna
+        analisi durante la riproduzione: le tracce non analizzate restano
+        al volume dell'utente.
+        """
+        if not settings.LOUDNESS_NORMALIZE or track is None or track.gain_db is None:
+            return self.volume
+        volume = round(self.volume * 10 ** (track.gain_db / 20))
+        return max(0, min(settings.LOUDNESS_MAX_VOLUME, volume))
+
+    def _shutdown(self):
+        self._to_start = None
+        self._record_leave()
+        self.player.stop()
+        if self.standby_player is not None:
+            self.standby_player.stop()
+        self.preloader.shutdown()
+        self.availability.stop()
         self.running = False
 
-    def run_playlist_monitor(self):
-        """Monitora il termine della canzone per passare alla successiva."""
-        while self.running:
-            time.sleep(1)
-            if not self.is_paused and self.player.get_state() == vlc.State.Ended:
-                self.next_track()
+    # === Eventi di fine traccia ===
+    def _attach_events(self, player):
+        """Registra i callback del backend per fine traccia, errori, posizione e durata."""
+        try:
+            self.backend.attach_events(player, self._on_end_reached, self._on_error,
+                                       lambda ms: self._on_time_changed(player, ms),
+                                       lambda ms: self._on_length_changed(player, ms))
+        except Exception as e:
+            print(f"Eventi del backend non disponibili, uso il watchdog a polling: {e}")
+            return False
+        return True
+
+    def _on_end_reached(self):
+        self._send(EVENT_END, time.perf_counter())
+
+    def _on_error(self):
+        self._send(EVENT_ERROR, time.perf_counter())
+
+    # posizione e durata non passano dalla coda: sono solo due interi sovrascritti,
+    # la UI legge l'ultimo valore quando le serve (durante il crossfade conta solo
+    # il player principale)
+    def _on_time_changed(self, player, ms):
+        if player is self.player:
+            self.time_ms = ms
+            if self._first_frame_from is not None and ms > 0:
+                # primo avanzamento della traccia: l'audio sta uscendo
+                metrics.observe('first_audio_frame', time.perf_counter() - self._first_frame_from)
+                metrics.end('switch')
+                self._first_frame_from = None
+
+    def _on_length_changed(self, player, ms):
+        if player is self.player:
+            self.length_ms = ms
+
+    def _watchdog_timeout(self):
+        """
+        Timeout dell'attesa sulla coda dei messaggi.
+        Con gli eventi attivi il watchdog serve solo come rete di sicurezza durante la
+        riproduzione; da fermo il thread resta bloccato senza risvegli.
+        """
+        if not self.events_attached:
+            return settings.PLAYER_POLL_INTERVAL
+        if self.is_paused or (not self.playlist and not self.playlist.pending):
+            return None
+        timeout = settings.PLAYER_WATCHDOG_INTERVAL
+        fade_in = self._crossfade_due_in()
+        if fade_in is not None:
+            timeout = min(timeout, fade_in)
+        return timeout
+
+    def _on_watchdog(self):
+        if not self.events_attached and not self.is_stopped:
+            # senza eventi anche posizione e durata vengono lette a polling
+            self.time_ms = max(self.player.get_time(), 0)
+            self.length_ms = max(self.player.get_length(), 0)
+        fade_in = self._crossfade_due_in()
+        if fade_in is not None and fade_in <= 0:
+            self._crossfade()
+            return
+        # watchdog: per backend senza eventi o eventi persi
+        if self.is_paused or not self.backend.is_finished(self.player):
+            return
+        self._handle_end(EVENT_END, time.perf_counter())
+
+    # === Crossfade ===
+    def _crossfade_due_in(self):
+        """Secondi mancanti all'inizio del crossfade, o None se non previsto."""
+        if not self._fade_armed or self.is_paused:
+            return None
+        length = self.player.get_length()
+        if length <= 0:
+            return None
+        remaining = length - max(self.player.get_time(), 0)
+        return max(0.0, (remaining - settings.CROSSFADE_MS) / 1000)
+
+    def _crossfade(self):
+        """
+        Avvia la traccia successiva sul player di standby e sfuma i volumi
+        in CROSSFADE_MS, poi scambia i due player.
+        """
+        self._fade_armed = False
+        if self.playlist.pending:
+            # le richieste dell'utente passano dal normale fine traccia
+            return
+        if self.next_index is None or not (0 <= self.next_index < len(self.playlist)):
+            return
+        track = self.playlist[self.next_index]
+        if track is None or not self.availability.is_available(self.next_index):
+            # ci pensa il normale fine traccia a saltare la entry non valida
+            return
+        file_path = track.mp4_path
+
+        outgoing, incoming = self.player, self.standby_player
+        media = self.preloader.take(file_path) or self.backend.new_media(file_path)
+        incoming.set_media(media)
+        incoming.audio_set_volume(0)
+        incoming.play()
+        incoming_volume = self._track_volume(track)
+        outgoing_volume = self._track_volume(self.current_track)
+
+        # la sfumatura gira sul thread del player: i comandi arrivati nel
+        # frattempo vengono eseguiti subito dopo
+        steps = max(settings.CROSSFADE_STEPS, 1)
+        for step in range(1, steps + 1):
+            time.sleep(settings.CROSSFADE_MS / 1000 / steps)
+            incoming.audio_set_volume(incoming_volume * step // steps)
+            outgoing.audio_set_volume(outgoing_volume - outgoing_volume * step // steps)
+        outgoing.stop()
+
+        self.player, self.standby_player = incoming, outgoing
+        if self.shuffle and self.shuffle_bag.peek_next() == self.next_index:
+            self.shuffle_bag.advance()
+        # la traccia uscente è arrivata alla sfumatura finale: conta come completata
+        self._record(EVENT_COMPLETE, self.length_ms)
+        self.current_index = self.next_index
+        self.current_track = track
+        self.recent_rowids.append(track.rowid)
+        self._playing_pending = False
+        self._started += 1
+        self._record(EVENT_START)
+        self.time_ms = max(incoming.get_time(), 0)
+        self.length_ms = max(incoming.get_length(), 0)
+        self.is_paused = False
+        self._fade_armed = True
+
+        self.schedule_preload()
+
+    # === Cronologia ===
+    def _record(self, event, position_ms=0):
+        """Registra un evento della traccia corrente nella cronologia (solo nel buffer in memoria)."""
+        self._track_done = event != EVENT_START
+        if self.history is not None and self.current_track is not None:
+            self.history.record(self.current_track.song_id, event, position_ms)
+
+    def _record_leave(self):
+        """La traccia corrente viene lasciata: se non era finita è uno skip, con la posizione raggiunta."""
+        if not self._track_done:
+            self._record(EVENT_SKIP, self.time_ms)
+
+    def _record_transition(self):
+        """Registra il gap tra la fine della traccia precedente e l'avvio della nuova."""
+        if self._pending_end_time is None:
+            return
+        gap_ms = (time.perf_counter() - self._pending_end_time) * 1000
+        self._pending_end_time = None
+        self.transition_gaps.append(gap_ms)
+        if gap_ms > settings.TRANSITION_GAP_BUDGET_MS:
+            print(f"Attenzione: gap tra tracce di {gap_ms:.1f} ms "
+                  f"(budget {settings.TRANSITION_GAP_BUDGET_MS} ms)")
+
+    def transition_stats(self):
+        """Restituisce (numero, medio, massimo) dei gap tra tracce in ms."""
+        if not self.transition_gaps:
+            return 0, 0.0, 0.0
+        gaps = list(self.transition_gaps)
+        return len(gaps), sum(gaps) / len(gaps), max(gaps)
+
+    def _handle_end(self, kind, event_time):
+        """Passa alla traccia successiva dopo un evento di fine o di errore."""
+        # un evento arrivato dopo uno skip manuale è obsoleto: c'è già una traccia
+        # da avviare oppure il player sta già suonando
+        if self._to_start is not None:
+            return
+        if not self.backend.is_finished(self.player):
+            return
+        metrics.count('track_errors' if kind == EVENT_ERROR else 'track_ends')
+        if kind == EVENT_ERROR:
+            print("Errore di riproduzione, passo alla traccia successiva")
+            self._track_done = True
+        else:
+            self._record(EVENT_COMPLETE, self.length_ms)
+        self._pending_end_time = event_time
+        self._next_track()
@@ -0,0 +1,114 @@
+import threading
+from array import array
+from collections import OrderedDict, deque
+
+from app import settings
+
+
+class PlayQueue:
+    """
+    Coda di riproduzione compatta: contiene solo i rowid delle canzoni in un
+    array('q') (8 byte per entry), mentre le Track con titolo, percorso e
+    copertina vengono lette dal database solo quando servono e tenute in una
+    piccola cache LRU.
+
+    La coda ha due parti:
+    - il contesto (playlist o risultati di ricerca), indicizzato come le
+      righe della lista canzoni, su cui lavorano shuffle e disponibilità;
+    - le richieste dell'utente ("riproduci dopo" e "aggiungi in coda"), che
+      vengono suonate prima di riprendere il contesto. Entrambe le aggiunte
+      sono O(1) e non spostano gli indici del contesto.
+    """
+
+    def __init__(self, repository=None, rowids=(), source=None):
+        """
+        Args:
+            repository: Repository da cui leggere le Track.
+            rowids: rowid delle canzoni del contesto, in ordine.
+            source: chiave della sorgente (es. ('playlist', id)), per riconoscere
+                una coda già caricata.
+        """
+        self.repository = repository
+        self.rowids = rowids if isinstance(rowids, array) else array('q', rowids)
+        self.source = source
+        self.pending = deque()  # rowid aggiunti dall'utente, suonati prima del contesto
+        self._cache = OrderedDict()  # rowid -> Track (None se la canzone non esiste più)
+        self._last_index = None  # ultimo indice letto, per riconoscere l'accesso sequenziale
+        self._lock = threading.Lock()
+
+    @classmethod
+    def for_playlist(cls, repository, playlist_id):
+        """Coda con tutte le canzoni della playlist (una sola query di soli interi)."""
+        return cls(repository, repository.get_playlist_rowids(playlist_id), source=('playlist', playlist_id))
+
+    @classmethod
+    def for_rows(cls, repository, rows):
+        """Coda con le righe SongRow già lette (es. risultati di ricerca)."""
+        return cls(repository, (row.rowid for row in rows))
+
+    def __len__(self):
+        return len(self.rowids)
+
+    def __getitem__(self, index):
+        """Track del contesto in posizione index, o None se non esiste più nel database."""
+        return self.track(self.rowids[index], index)
+
+    def rowid_at(self, index):
+        return self.rowids[index]
+
+    # === Track ===
+    def track(self, rowid, index=None):
+        """
+        Track di un rowid dalla cache. In caso di miss durante un accesso
+        sequenziale legge in una sola query anche le QUEUE_PREFETCH entry
+        successive del contesto; negli accessi casuali (shuffle) legge solo
+        quella richiesta.
+        """
+        with self._lock:
+            sequential = index is not None and self._last_index is not None and index == self._last_index + 1
+            if index is not None:
+                self._last_index = index
+            if rowid in self._cache:
+                self._cache.move_to_end(rowid)
+                return self._cache[rowid]
+            wanted = [rowid]
+            if sequential or index == 0:
+                wanted.extend(r for r in self.rowids[index + 1:index + settings.QUEUE_PREFETCH]
+                              if r not in self._cache)
+            tracks = self.repository.get_tracks(wanted) if self.repository is not None else {}
+            for r in wanted:
+                self._cache[r] = tracks.get(r)
+            while len(self._cache) > settings.QUEUE_TRACK_CACHE:
+                self._cache.popitem(last=False)
+            return self._cache[rowid]
+
+    def iter_paths(self, indices):
+        """
+        mp4_path delle entry del contesto in indices (un range), in ordine
+        (None per le canzoni non più nel database). Letti a blocchi di rowid
+        senza passare dalla cache delle Track, per il controllo della
+        disponibilità dei file.
+        """
+        for start in range(0, len(indices), settings.AVAILABILITY_PAGE_SIZE):
+            chunk = [self.rowids[i] for i in indices[start:start + settings.AVAILABILITY_PAGE_SIZE]]
+            tracks = self.repository.get_tracks(chunk) if self.repository is not None else {}
+            for rowid in chunk:
+                track = tracks.get(rowid)
+                yield track.mp4_path if track is not None else None
+
+    # === Richieste dell'utente ===
+    def enqueue(self, rowid):
+        """Aggiunge una canzone in fondo alle richieste dell'utente."""
+        self.pending.append(rowid)
+
+    def insert_next(self, rowid):
+        """La canzone verrà suonata subito dopo quella corrente."""
+        self.pending.appendleft(rowid)
+
+    def peek_pending(self):
+        """Prossima Track richiesta dall'utente, senza toglierla (None se non ce ne sono)."""
+        return self.track(self.pending[0]) if self.pending else None
+
+    def pop_pending(self):
+        """Toglie e restituisce la prossima Track richiesta dall'utente (None se non ce ne sono)."""
+        return self.track(self.pending.popleft()) if self.pending else None
@@ -0,0 +1,78 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from app.music_player.backend import VlcBackend
+from app.utils.metrics import metrics
+
+
+class MediaPreloader:
+    """
+    Apre e analizza in background il media della prossima traccia, in modo
+    che al cambio canzone il player debba solo fare set_media + play.
+
+    Viene tenuta pronta una sola traccia alla volta: una nuova richiesta
+    sostituisce quella precedente.
+    """
+
+    def __init__(self, backend=None):
+        # i media vanno creati dallo stesso backend del player
+        self.backend = backend or VlcBackend()
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="preload")
+        self._lock = threading.Lock()
+        self._path = None
+        self._future = None
+
+    def schedule(self, file_path):
+        """Avvia il preload di file_path, se non è già quello in preparazione."""
+        with self._lock:
+            if file_path == self._path:
+                return
+            if self._future is not None:
+                self._future.cancel()
+            self._path = file_path
+            self._future = self.executor.submit(self._open, file_path)
+
+    def _open(self, file_path):
+        with metrics.span('media_preload'):
+            return self.backend.open_media(file_path)
+
+    def take(self, file_path):
+        """
+        Restituisce il media precaricato per file_path, oppure None se non
+        è stato richiesto o non è ancora pronto (in quel caso il chiamante lo
+        apre normalmente, senza aspettare il worker).
+        """
+        with self._lock:
+            if file_path != self._path or self._future is None:
+                return None
+            future = self._future
+            self._path = None
+            self._future = None
+        if not future.done() or future.cancelled():
+            return None
+        try:
+            return future.result()
+        except Exception as e:
+            print(f"Errore nel preload di {file_path}: {e}")
+            return None
+
+    def wait(self, timeout=None):
+        """Attende la fine del preload in corso (usato dai benchmark)."""
+        with self._lock:
+            future = self._future
+        if future is not None:
+            try:
+                future.result(timeout=timeout)
+            except Exception:
+                pass
+
+    def clear(self):
+        with self._lock:
+            if self._future is not None:
+                self._future.cancel()
+            self._path = None
+            self._future = None
+
+    def shutdown(self):
+        self.clear()
+        self.executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,154 @@
+import random
+
+from app import settings
+
+
+class ShuffleBag:
+    """
+    Shuffle senza ripetizioni basato su una permutazione di Fisher–Yates
+    generata in modo lazy: la posizione k della permutazione viene estratta
+    solo quando serve, scambiandola con una posizione a caso in [k, n).
+
+    Gli scambi sono tenuti in dizionari sparsi che dimenticano le posizioni
+    uscite dalla cronologia, più un byte per entry che segna le tracce già
+    estratte nel giro: next e prev sono O(1) anche su code da milioni di
+    entry. Ogni traccia esce una sola volta per giro; finito il giro ne parte
+    uno nuovo.
+
+    La cronologia per prev() è limitata alle ultime history tracce. Con un
+    seed la sequenza è deterministica.
+    """
+
+    def __init__(self, size=0, seed=None, history=None, weight_of=None):
+        """
+        Args:
+            size: numero di entry della coda.
+            seed: seed del generatore (None = casuale).
+            history: tracce ricordate per prev().
+            weight_of: funzione opzionale indice -> peso (es. numero di ascolti);
+                a parità di estrazione vengono preferite le entry con peso minore.
+        """
+        self.rng = random.Random(seed)
+        self.history = history or settings.SHUFFLE_HISTORY
+        self.weight_of = weight_of
+        self._swaps = {}  # posizione -> indice della coda, solo per le posizioni toccate
+        self._pos = {}  # indice della coda -> posizione, inverso di _swaps
+        self.reset(size)
+
+    def reset(self, size, seed=None):
+        """Ricomincia su una coda di size entry, riusando le strutture esistenti."""
+        if seed is not None:
+            self.rng.seed(seed)
+        self.size = size
+        self._swaps.clear()
+        self._pos.clear()
+        self._played = bytearray(size)  # 1 per gli indici in posizioni [0, _drawn)
+        self._drawn = 0  # posizioni [0, _drawn) già estratte
+        self._cursor = -1  # posizione della traccia corrente
+
+    # === Permutazione lazy ===
+    def _value_at(self, position):
+        return self._swaps.get(position, position)
+
+    def _position_of(self, value):
+        """Posizione di value, o -1 se già estratto e uscito dalla cronologia."""
+        position = self._pos.get(value)
+        if position is None:
+            return -1 if self._played[value] else value
+        return position
+
+    def _swap(self, a, b):
+        va, vb = self._value_at(a), self._value_at(b)
+        self._swaps[a], self._swaps[b] = vb, va
+        self._pos[vb], self._pos[va] = a, b
+
+    def _pick(self, k):
+        """Posizione in [k, size) da portare in k, opzionalmente pesata."""
+        j = self.rng.randrange(k, self.size)
+        if self.weight_of is not None:
+            # "power of choices": tra pochi candidati casuali vince quello con peso minore
+            for _ in range(settings.SHUFFLE_WEIGHT_CHOICES - 1):
+                other = self.rng.randrange(k, self.size)
+                if self.weight_of(self._value_at(other)) < self.weight_of(self._value_at(j)):
+                    j = other
+        return j
+
+    def _draw(self):
+        k = self._drawn
+        self._swap(k, self._pick(k))
+        self._played[self._value_at(k)] = 1
+        self._drawn += 1
+        # cronologia limitata: la posizione uscita dalla finestra di prev() non serve più
+        old = k - self.history
+        if old >= 0:
+            value = self._swaps.pop(old, None)
+            if value is not None:
+                del self._pos[value]
+
+    def _undraw(self, start):
+        """Rimette nel pool le posizioni [start, _drawn), estratte in anticipo."""
+        for position in range(start, self._drawn):
+            self._played[self._value_at(position)] = 0
+        self._drawn = start
+
+    def _new_round(self):
+        last = self._value_at(self._cursor) if self._cursor >= 0 else None
+        self.reset(self.size)
+        if last is not None and self.size > 1:
+            # evita che il nuovo giro inizi con la traccia appena suonata
+            self._draw()
+            if self._value_at(0) == last:
+                self._swap(0, self.rng.randrange(1, self.size))
+                self._played[last] = 0
+                self._played[self._value_at(0)] = 1
+
+    # === API ===
+    def peek_next(self):
+        """Indice della prossima traccia, senza avanzare (None se la coda è vuota)."""
+        if self.size == 0:
+            return None
+        if self._cursor + 1 >= self.size:
+            self._new_round()
+        if self._cursor + 1 >= self._drawn:
+            self._draw()
+        return self._value_at(self._cursor + 1)
+
+    def advance(self):
+        """Avanza alla traccia restituita da peek_next e la restituisce."""
+        value = self.peek_next()
+        if value is not None:
+            self._cursor += 1
+        return value
+
+    def next(self):
+        return self.advance()
+
+    def prev(self):
+        """Traccia precedente nella cronologia, o None se la cronologia è esaurita."""
+        position = self._cursor - 1
+        if position < 0 or position < self._drawn - self.history or position not in self._swaps:
+            return None
+        self._cursor = position
+        return self._swaps[position]
+
+    def select(self, value):
+        """
+        La traccia value è stata scelta dall'utente: diventa la corrente e,
+        se non era ancora uscita in questo giro, non verrà più estratta.
+        """
+        if not 0 <= value < self.size:
+            return
+        k = self._cursor + 1
+        if k >= self.size:
+            self._new_round()
+            k = 0
+        # le posizioni estratte in anticipo (peek) tornano nel pool
+        self._undraw(k)
+        position = self._position_of(value)
+        if position < k:
+            # già suonata in questo giro: non si ripete nel giro
+            return
+        self._swap(k, position)
+        self._played[value] = 1
+        self._drawn = k + 1
+        self._cursor = k
@@ -16,15 +16,114 @@ DATABASE_PATH = os.path.join(PROJECT_ROOT, 'db', 'music-player.db')
 # Percorso delle copertine path -> deprecato
 COVERS_BASE_PATH = os.path.join(os.path.expanduser('~'), 'Desktop', 'copertine')
 
+# Cache persistente delle miniature delle copertine gia' ridimensionate
+THUMBNAIL_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'my-mp3', 'thumbnails')
+
+# --- Copertine ---
+COVER_CACHE_MAX_BYTES = 64 * 1024 * 1024  # budget della cache LRU in memoria
+COVER_WORKERS = 2  # thread per decodifica e ridimensionamento
+COVER_POLL_MS = 15  # intervallo con cui la UI controlla se la copertina e' pronta
+COVER_SIZES = (64, 300, 640)  # risoluzioni salvate nel database (colonne copertina_<size>_path)
+COVER_COMMIT_EVERY = 500  # canzoni con copertine create salvate per transazione da run_cmd covers
+
+# --- Database ---
+DB_MAX_READERS = 4  # connessioni in sola lettura nel pool
+DB_BUSY_TIMEOUT = 5.0  # s di attesa su un lock prima di "database is locked"
+DB_CACHED_STATEMENTS = 256  # prepared statement tenuti in cache per connessione
+DB_CACHE_KB = 16384  # page cache per connessione
+DB_MMAP_BYTES = 256 * 1024 * 1024  # lettura via mmap del file del database
+
+# --- Scansione della libreria ---
+SCAN_WORKERS = 8  # thread che visitano le directory in parallelo
+SCAN_POLL_INTERVAL = 60.0  # s tra due scansioni incrementali se inotify non è disponibile
+SCAN_WATCH_DEBOUNCE = 1.0  # s di attesa per raggruppare una raffica di eventi inotify
+
 # --- Impostazioni della UI ---
 WINDOW_TITLE = "MyMP3-@cla.pelosi"
 BACKGROUND_COLOR = "#2e2e2e"
 PRIMARY_COLOR = "#1e90ff"
 TEXT_COLOR = "white"
 MUTED_TEXT_COLOR = "lightgrey"
+UNAVAILABLE_TEXT_COLOR = "#808080"  # righe delle canzoni con file mancante
 COMPONENT_BACKGROUND = "#404040"
 ACTIVE_COMPONENT_BACKGROUND = "#555555"
 
+# --- Riproduzione ---
+VLC_HEADLESS_ARGS = ('--no-video', '--quiet')  # opzioni di libvlc per la riproduzione senza display
+PLAYER_WATCHDOG_INTERVAL = 5.0  # s, controllo di sicurezza quando gli eventi VLC sono attivi
+PLAYER_POLL_INTERVAL = 0.25  # s, polling di fallback per backend senza eventi
+PLAYER_UI_POLL_MS = 50  # intervallo con cui la UI applica l'ultimo stato del player
+PLAYER_UI_IDLE_MS = 500  # lo stesso intervallo in pausa, da fermo o con la finestra nascosta
+SEEK_BAR_STEPS = 1000  # risoluzione della barra di avanzamento
+SEEK_THROTTLE_MS = 100  # intervallo minimo tra due seek durante il trascinamento
+TRANSITION_GAP_BUDGET_MS = 50  # gap massimo atteso tra fine traccia e avvio della successiva
+TRANSITION_GAP_HISTORY = 100  # numero di gap conservati per le statistiche
+PRELOAD_NEXT_TRACK = True  # apre in anticipo il media della traccia successiva
+PRELOAD_PARSE_TIMEOUT_MS = 5000  # timeout del parsing in background (anche attesa massima del preloader)
+CROSSFADE_MS = 0  # durata del crossfade tra tracce, 0 = disabilitato
+CROSSFADE_STEPS = 20  # passi della rampa di volume durante il crossfade
+SHUFFLE_SEED = None  # seed dello shuffle (None = casuale), utile per test riproducibili
+SHUFFLE_HISTORY = 500  # tracce ricordate per "precedente" in shuffle
+SHUFFLE_WEIGHT_CHOICES = 2  # candidati confrontati per l'estrazione pesata
+SHUFFLE_PREFER_LESS_PLAYED = False  # lo shuffle preferisce le canzoni con meno ascolti nella cronologia
+QUEUE_TRACK_CACHE = 256  # Track della coda tenute in memoria
+QUEUE_PREFETCH = 32  # entry della coda lette insieme a ogni miss della cache
+AVAILABILITY_REFRESH_INTERVAL = 30.0  # s tra due controlli delle righe mostrate e delle prossime entry della coda
+AVAILABILITY_PAGE_SIZE = 500  # percorsi letti dal database per volta nel controllo completo iniziale
+AVAILABILITY_WATCH_AHEAD = 20  # entry della coda, dalla corrente, ricontrollate periodicamente
+AVAILABILITY_POLL_MS = 500  # intervallo con cui la UI ridisegna le righe non disponibili
+
+# --- Cronologia degli ascolti ---
+HISTORY_FLUSH_INTERVAL = 5.0  # s tra due scritture del buffer della cronologia
+HISTORY_MAX_BUFFER = 500  # eventi in memoria oltre cui la scrittura viene anticipata
+
+# --- Clustering delle playlist ---
+CLUSTER_COUNT = 50  # playlist "Cluster N" create dal clustering dei vettori delle canzoni
+CLUSTER_BATCH_SIZE = 1024  # vettori per passo del mini-batch k-means
+CLUSTER_EPOCHS = 3  # passate sull'intera libreria durante l'addestramento
+CLUSTER_CHUNK_ROWS = 50000  # vettori letti dal database per volta (memoria limitata)
+CLUSTER_SAMPLE_ROWS = 20000  # vettori campionati per l'inizializzazione k-means++
+CLUSTER_MAX_NEW_FRACTION = 0.25  # oltre questa quota di canzoni nuove il clustering riparte da zero
+
+# --- Similarità e radio ---
+SIMILARITY_INDEX_PATH = os.path.join(os.path.expanduser('~'), '.cache', 'my-mp3', 'similarity')  # .vectors.npy e .meta.npz
+SIMILARITY_PROBES = 4  # liste IVF (cluster) visitate almeno per ogni query
+SIMILARITY_BLOCK = 65536  # vettori confrontati per volta (memoria limitata anche senza clustering)
+RADIO_BATCH = 10  # canzoni simili accodate per volta in modalità radio
+RADIO_RECENT = 200  # canzoni suonate di recente che la radio non ripropone
+
+# --- Normalizzazione del volume ---
+LOUDNESS_NORMALIZE = True  # applica all'avvio di ogni traccia il guadagno calcolato da run_cmd loudness
+LOUDNESS_TARGET_LUFS = -14.0  # loudness integrata a cui vengono portate le tracce
+LOUDNESS_MAX_GAIN_DB = 12.0  # amplificazione massima delle tracce troppo basse
+LOUDNESS_MAX_VOLUME = 150  # volume massimo passato a VLC (oltre 100 amplifica)
+LOUDNESS_FFMPEG = 'ffmpeg'  # decoder usato da loudness e forme d'onda (eseguibile nel PATH o percorso)
+LOUDNESS_SAMPLE_RATE = 48000  # frequenza del PCM analizzato (quella dei filtri della ITU-R BS.1770)
+LOUDNESS_CHUNK_SECONDS = 10  # secondi di PCM analizzati per volta (memoria limitata)
+LOUDNESS_COMMIT_EVERY = 200  # risultati salvati per transazione: un'interruzione perde al più questi
+
+# --- Forme d'onda della barra di avanzamento ---
+WAVEFORM_BINS = 1024  # picchi salvati per traccia (un byte ciascuno, compressi con snappy)
+WAVEFORM_SAMPLE_RATE = 8000  # frequenza del PCM mono da cui si estraggono i picchi
+WAVEFORM_COMMIT_EVERY = 500  # forme d'onda salvate per transazione da run_cmd waveforms
+WAVEFORM_HEIGHT = 48  # altezza in pixel della barra
+WAVEFORM_BAR_PX = 3  # pixel per barra, spazio compreso
+WAVEFORM_IDLE_COLOR = "#707070"  # barre non ancora suonate (quelle suonate usano PRIMARY_COLOR)
+WAVEFORM_POLL_MS = 50  # intervallo con cui la UI controlla se la forma d'onda analizzata è pronta
+
+# --- Metriche ---
+# spans e contatori sui percorsi caldi; disabilitati costano una chiamata a vuoto
+METRICS_ENABLED = os.environ.get('MYMP3_METRICS') == '1'
+METRICS_WINDOW = 1024  # ultimi campioni per metrica usati per p50 e p99
+METRICS_PORT = 9464  # endpoint Prometheus su 127.0.0.1 (0 = disabilitato)
+METRICS_LOG_PATH = os.path.join(os.path.expanduser('~'), '.cache', 'my-mp3', 'metrics.log')
+METRICS_LOG_INTERVAL = 60.0  # s tra due righe di riepilogo nel log
+METRICS_LOG_MAX_BYTES = 1024 * 1024  # dimensione oltre cui il log viene ruotato
+METRICS_LOG_BACKUPS = 3  # file ruotati conservati
+
+# --- Avvio ---
+STARTUP_POLL_MS = 15  # intervallo con cui la UI controlla il lavoro di avvio in background
+
 # --- Dimensioni ---
 DEFAULT_COVER_SIZE = (300, 300)
 CONTROL_BUTTON_SIZE = {'width': 4, 'height': 2}
@@ -35,3 +134,18 @@ FONT_SIZE_TITLE = 12
 FONT_SIZE_TIME = 9
 FONT_SIZE_BUTTON = 14
 FONT_SIZE_PLAYLIST = 10
+
+# --- Lista canzoni ---
+SONG_PAGE_SIZE = 500  # righe lette dal cursore SQLite per volta
+SONG_PAGES_KEPT = 2  # pagine tenute in memoria prima e dopo l'ultima letta
+SONG_LIST_MARGIN = 50  # righe materializzate sopra e sotto quelle visibili
+SONG_LIST_WHEEL_ROWS = 3  # righe scorse per scatto della rotellina
+SONG_LIST_THUMB_SIZE = 64  # lato delle miniature delle righe, 0 = lista senza miniature
+SONG_LIST_THUMB_CACHE = 512  # miniature tenute in memoria (più delle righe materializzate)
+
+# --- Ricerca ---
+SEARCH_DEBOUNCE_MS = 150  # attesa dopo l'ultimo tasto prima di lanciare la ricerca
+SEARCH_MIN_CHARS = 3  # lunghezza minima di una parola (tokenizer trigram)
+SEARCH_LIMIT = 500  # risultati massimi mostrati
+SEARCH_PROGRESS_STEPS = 1000  # istruzioni SQLite tra un controllo di obsolescenza e l'altro
+SEARCH_POLL_MS = 15  # intervallo con cui la UI controlla se i risultati sono pronti
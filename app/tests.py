@@ -1,24 +1,40 @@
 import os
 import sys
+import subprocess
 
 # Aggiungi la root del progetto (new_music-player) al PYTHONPATH
 project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
 if project_root not in sys.path:
     sys.path.insert(0, project_root)
 
-# Ora puoi importare da app e dai suoi sottomoduli
-from utils import find_cover, format_time
+from app.utils import format_time
+
+
+def run_benchmark(module, *args):
+    """Esegue un benchmark in un processo separato e restituisce True se è nel budget."""
+    print(f"\n=== {module} {' '.join(args)} ===", flush=True)
+    return subprocess.run([sys.executable, '-m', module, *args], cwd=project_root).returncode == 0
 
 
 # testing the functions
 if __name__ == "__main__":
 
-    print("Testing find_cover function:")
-        
-    # song_id = "7eJMfftS33KTjuF7lTsMCx"  # example song ID
-    song_id = "ab67616d0000b273a3f0e9f20bfbdd1ab8752e39"  # example song ID
-    try:
-        find_cover(song_id, size=(640, 640))
-        print("find_cover executed successfully.")
-    except Exception as e:
-        print(f"Error during find_cover test: {e}")
+    print("Testing format_time function:")
+    failed = []
+    for ms, expected in ((0, "00:00"), (61000, "01:01"), (3599000, "59:59")):
+        if format_time(ms) != expected:
+            print(f"Error: format_time({ms}) = {format_time(ms)!r}, atteso {expected!r}")
+            failed.append('format_time')
+    print("format_time executed successfully." if 'format_time' not in failed else "format_time failed.")
+
+    # libreria piccola: confronta con results/baseline-10000.json se esiste
+    if not run_benchmark('benchmarks.bench_suite', '--songs', '10000', '--playlists', '500'):
+        failed.append('bench_suite')
+    if not run_benchmark('benchmarks.bench_startup', '--runs', '3'):
+        failed.append('bench_startup')
+    # player sul backend finto: stato coerente, memoria e latenza nei budget
+    if not run_benchmark('benchmarks.bench_soak', '--songs', '2000', '--actions', '5000', '--hours', '12'):
+        failed.append('bench_soak')
+
+    print(f"\nFALLITI: {', '.join(failed)}" if failed else "\nTutti i controlli superati.")
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,259 @@
+from collections import OrderedDict
+from tkinter import Frame, Scrollbar, ttk
+from tkinter import font as tkfont
+
+from app import settings
+from app.utils.metrics import metrics
+
+
+class RowThumbnails:
+    """
+    Miniature delle righe della lista canzoni, come PhotoImage per song_id.
+
+    Le miniature mancanti vengono chieste al CoverService (che sceglie la
+    copertina salvata più piccola adatta, di solito quella da 64px) e
+    controllate sul thread di Tk; quando sono pronte viene chiamato
+    on_ready(song_ids). Le richieste per righe uscite dalla finestra
+    materializzata vengono annullate, così uno scroll veloce non accoda
+    decodifiche inutili davanti alla copertina grande.
+    """
+
+    def __init__(self, widget, size, limit=None, on_ready=None):
+        self.widget = widget
+        self.size = (size, size)
+        self.limit = limit or settings.SONG_LIST_THUMB_CACHE
+        self.on_ready = on_ready
+        self.service = None  # CoverService, impostato quando Pillow è stato importato
+        self._images = OrderedDict()  # song_id -> PhotoImage (None se la canzone non ha copertina)
+        self._pending = {}  # song_id -> Future
+        self._after = None
+
+    def cached(self, row):
+        image = self._images.get(row.song_id)
+        if image is not None:
+            self._images.move_to_end(row.song_id)
+        return image
+
+    def request(self, rows):
+        """Miniature già pronte per rows (None dove mancano); chiede in background le altre."""
+        wanted = {row.song_id for row in rows}
+        for song_id in [song_id for song_id in self._pending if song_id not in wanted]:
+            self._pending.pop(song_id).cancel()
+        images = []
+        for row in rows:
+            images.append(self.cached(row))
+            if self.service is None or row.song_id in self._images or row.song_id in self._pending:
+                continue
+            self._pending[row.song_id] = self.service.submit_best(row, self.size)
+        if self._pending and self._after is None:
+            self._after = self.widget.after(settings.COVER_POLL_MS, self._poll)
+        return images
+
+    def _poll(self):
+        from PIL import ImageTk  # già caricato dal servizio copertine
+
+        ready = []
+        for song_id, future in list(self._pending.items()):
+            if not future.done():
+                continue
+            del self._pending[song_id]
+            img = None if future.cancelled() else future.result()
+            # anche l'assenza di copertina viene ricordata, per non richiederla a ogni render
+            self._images[song_id] = ImageTk.PhotoImage(img) if img is not None else None
+            ready.append(song_id)
+        while len(self._images) > self.limit:
+            self._images.popitem(last=False)
+        self._after = self.widget.after(settings.COVER_POLL_MS, self._poll) if self._pending else None
+        if ready and self.on_ready is not None:
+            self.on_ready(ready)
+
+
+class VirtualSongList(Frame):
+    """
+    Lista di canzoni virtualizzata: il Treeview contiene solo le righe visibili
+    più un margine, mentre la scrollbar rappresenta l'intera sorgente.
+
+    La sorgente è una qualsiasi sequenza (len + indicizzazione) di righe; il
+    testo mostrato viene preso da row_text(row) e, se row_fg(index) restituisce
+    un colore, la riga viene mostrata con quel colore. Con thumb_size ogni riga
+    mostra anche la miniatura della copertina. Gli indici usati da
+    curselection, selection_set, activate e see sono quelli della sorgente,
+    come per una normale Listbox.
+    """
+
+    STYLE = 'Songs.Treeview'
+
+    def __init__(self, master, row_text=None, row_fg=None, margin=None, thumb_size=None,
+                 bg=None, fg=None, selectbackground=None, font=None):
+        bg = bg or settings.COMPONENT_BACKGROUND
+        super().__init__(master, bg=bg)
+        self.row_text = row_text or (lambda row: row[1])
+        self.row_fg = row_fg
+        self.margin = margin if margin is not None else settings.SONG_LIST_MARGIN
+        thumb_size = settings.SONG_LIST_THUMB_SIZE if thumb_size is None else thumb_size
+        self.thumbnails = RowThumbnails(self, thumb_size, on_ready=self._show_thumbnails) if thumb_size else None
+
+        font = font or (settings.FONT_FAMILY, settings.FONT_SIZE_PLAYLIST)
+        text_height = tkfont.Font(root=self, font=font).metrics('linespace') + 1
+        self.row_height = max(text_height, thumb_size + 4 if thumb_size else 0)
+        style = ttk.Style(self)
+        style.configure(self.STYLE, background=bg, fieldbackground=bg, foreground=fg or settings.TEXT_COLOR,
+                        font=font, rowheight=self.row_height, borderwidth=0)
+        style.map(self.STYLE, background=[('selected', selectbackground or settings.PRIMARY_COLOR)])
+
+        self.tree = ttk.Treeview(self, style=self.STYLE, show='tree', selectmode='browse')
+        self.tree.pack(side='left', fill='both', expand=True)
+        self.scrollbar = Scrollbar(self, orient='vertical', command=self.yview)
+        self.scrollbar.pack(side='right', fill='y')
+
+        self.source = []
+        self.first = 0  # indice della prima riga visibile
+        self.window_start = 0  # indice della prima riga materializzata nel Treeview
+        self.window_end = 0
+        self.selected = None
+        self.active = None
+        self._color_tags = set()  # colori già registrati come tag del Treeview
+
+        self.tree.bind("<Configure>", lambda e: self.render())
+        self.tree.bind("<<TreeviewSelect>>", self._on_select)
+        self.tree.bind("<MouseWheel>", self._on_mousewheel)
+        self.tree.bind("<Button-4>", lambda e: self.scroll(-settings.SONG_LIST_WHEEL_ROWS))
+        self.tree.bind("<Button-5>", lambda e: self.scroll(settings.SONG_LIST_WHEEL_ROWS))
+
+    # === Sorgente dati ===
+    def set_source(self, source):
+        """Imposta una nuova sorgente e torna in cima alla lista."""
+        self.source = source
+        self.first = 0
+        self.selected = None
+        self.active = None
+        self.render(force=True)
+
+    def set_cover_service(self, service):
+        """Abilita le miniature quando il servizio copertine è pronto."""
+        if self.thumbnails is not None:
+            self.thumbnails.service = service
+            self.render(force=True)
+
+    def visible_rows(self):
+        height = self.tree.winfo_height()
+        return max(1, height // self.row_height) if height > 1 else int(self.tree.cget('height'))
+
+    # === Rendering ===
+    def render(self, force=False):
+        """Materializza nel Treeview le righe visibili più il margine."""
+        total = len(self.source)
+        visible = self.visible_rows()
+        self.first = max(0, min(self.first, total - visible))
+        last = min(total, self.first + visible)
+
+        # se le righe visibili sono già nella finestra basta spostare la vista
+        if force or self.first < self.window_start or last > self.window_end:
+            self.window_start = max(0, self.first - self.margin)
+            self.window_end = min(total, last + self.margin)
+            with metrics.span('song_list_render'):
+                self.tree.delete(*self.tree.get_children())
+                rows = [self.source[i] for i in range(self.window_start, self.window_end)]
+                images = self.thumbnails.request(rows) if self.thumbnails is not None else [None] * len(rows)
+                # l'iid di ogni riga è il suo indice nella sorgente
+                for index, row, image in zip(range(self.window_start, self.window_end), rows, images):
+                    self.tree.insert('', 'end', iid=str(index), text=self.row_text(row),
+                                     image=image or '', tags=self._row_tags(index))
+                self._apply_marks()
+
+        span = self.window_end - self.window_start
+        self.tree.yview_moveto((self.first - self.window_start) / span if span else 0)
+        if total:
+            self.scrollbar.set(self.first / total, last / total)
+        else:
+            self.scrollbar.set(0, 1)
+
+    def _row_tags(self, index):
+        if self.row_fg is None:
+            return ()
+        color = self.row_fg(index)
+        if not color:
+            return ()
+        if color not in self._color_tags:
+            self.tree.tag_configure(color, foreground=color)
+            self._color_tags.add(color)
+        return (color,)
+
+    def _show_thumbnails(self, song_ids):
+        """Aggiunge alle righe materializzate le miniature appena decodificate."""
+        song_ids = set(song_ids)
+        for index in range(self.window_start, min(self.window_end, len(self.source))):
+            row = self.source[index]
+            if row.song_id in song_ids:
+                image = self.thumbnails.cached(row)
+                if image is not None:
+                    self.tree.item(str(index), image=image)
+
+    def _apply_marks(self):
+        """Riporta selezione e riga attiva dentro la finestra materializzata."""
+        if self.selected is not None and self.window_start <= self.selected < self.window_end:
+            self.tree.selection_set(str(self.selected))
+        else:
+            self.tree.selection_remove(*self.tree.selection())
+        if self.active is not None and self.window_start <= self.active < self.window_end:
+            self.tree.focus(str(self.active))
+
+    # === Scroll ===
+    def yview(self, *args):
+        """Comando della scrollbar ('moveto' o 'scroll')."""
+        total = len(self.source)
+        if not args or not total:
+            return
+        if args[0] == 'moveto':
+            self.first = int(float(args[1]) * total)
+        elif args[0] == 'scroll':
+            amount = int(args[1])
+            if args[2] == 'pages':
+                amount *= self.visible_rows()
+            self.first += amount
+        self.render()
+
+    def scroll(self, rows):
+        self.first += rows
+        self.render()
+        return "break"
+
+    def _on_mousewheel(self, event):
+        return self.scroll(-settings.SONG_LIST_WHEEL_ROWS if event.delta > 0 else settings.SONG_LIST_WHEEL_ROWS)
+
+    # === API compatibile con Listbox (indici della sorgente) ===
+    def _on_select(self, event=None):
+        items = self.tree.selection()
+        if items:
+            self.selected = int(items[0])
+
+    def index_at(self, y):
+        """Indice della sorgente della riga alla coordinata y (l'ultima se y è sotto le righe)."""
+        item = self.tree.identify_row(y)
+        return int(item) if item else self.window_end - 1
+
+    def curselection(self):
+        return () if self.selected is None else (self.selected,)
+
+    def selection_clear(self, first=0, last=None):
+        self.selected = None
+        self.tree.selection_remove(*self.tree.selection())
+
+    def selection_set(self, index):
+        self.selected = index
+        self._apply_marks()
+
+    def activate(self, index):
+        self.active = index
+        self._apply_marks()
+
+    def see(self, index):
+        """Porta la riga index nella parte visibile, centrandola se serve."""
+        visible = self.visible_rows()
+        if not self.first <= index < self.first + visible:
+            self.first = index - visible // 2
+        self.render()
+
+    def bind_rows(self, sequence, func):
+        """Collega un evento alle righe del Treeview interno."""
+        self.tree.bind(sequence, func)
@@ -1,28 +1,33 @@
-import os
-import threading
-import sqlite3
 from tkinter import (
     Label, 
     Button, 
     Frame, 
     StringVar, 
+    Entry, 
     PhotoImage, 
     Listbox, 
-    Scrollbar
+    Scrollbar,
+    Menu,
+    EventType
 )
 from tkinter import ttk
-from PIL import Image, ImageTk
+from concurrent.futures import ThreadPoolExecutor
 
+# VLC e Pillow non vengono importati qui: li carica un thread in background
+# dopo il primo disegno della finestra (vedi App.start_background_work)
 from app import settings
 from app import utils
-from app.music_player.music_palyer import MusicPlayer
+from app.music_player.availability import AvailabilityIndex
+from app.music_player.play_queue import PlayQueue
+from app.utils.metrics import metrics
+from app.utils.playlist_rows import PlaylistRows
+from app.utils.repository import get_repository
+from app.utils.search import SongSearcher, build_match_expression
+from app.ui.song_list import VirtualSongList
+from app.ui.waveform_bar import WaveformSeekBar
 
-from app.utils.queries import (
-    get_playlists_query, 
-    get_songs_from_playlist_query,
-    GET_PLAYLISTS_QUERY, 
-    GET_SONGS_FROM_PLAYLIST_QUERY
-)
+# comandi che cambiano traccia: da qui parte la misura fino al primo frame audio
+SWITCH_COMMANDS = ('next_track', 'prev_track')
 
 
 class App:
@@ -41,24 +46,53 @@ class App:
         self.root.title(settings.WINDOW_TITLE)
         self.root.configure(bg=settings.BACKGROUND_COLOR)
 
-        # Connessione al database SQLite
-        self.db_conn = sqlite3.connect(settings.DATABASE_PATH)
+        # Accesso al database SQLite (pool di lettori + uno scrittore); nessuna
+        # connessione viene aperta finché non serve
+        self.repository = get_repository()
         self.playlists = []  # Lista per memorizzare le playlist come tuple (id, name)
-
-        # Istanza del lettore musicale
-        self.player = MusicPlayer(self.update_ui_for_song)
+        self.current_song_list = []  # righe mostrate nella lista canzoni (playlist o ricerca)
+        self.playlist_rows = []  # righe dell'ultima playlist aperta
+        self.queue_rows = []  # righe caricate nel player
+        self.play_queue = None  # PlayQueue del player costruita da queue_rows
+        # disponibilità su disco delle righe mostrate (condivisa col player quando vengono riprodotte)
+        self.song_availability = AvailabilityIndex([])
+        self._availability_version = 0
+
+        # Ricerca full-text eseguita su un thread dedicato
+        self.searcher = SongSearcher(self.repository)
+        self._search_after = None
+        self._search_token = 0
+
+        # Servizio copertine (decodifica fuori dal main loop di Tk, con cache) e
+        # lettore musicale (un thread proprietario che esegue i comandi della UI):
+        # vengono creati in background dopo il primo disegno della finestra
+        self.cover_service = None
+        self._cover_token = 0
+        self.waveforms = None  # forme d'onda della barra di avanzamento
+        self._waveform_token = 0
+        self.player = None
+        self.history = None  # cronologia degli ascolti alimentata dal player
+        self._player_state = None  # ultimo stato mostrato dalla UI
+        self._player_after = None  # prossimo poll_player programmato
+        self._shown_progress = None  # (secondi, durata, posizione della barra) mostrati
+        self._visible = True  # False quando la finestra è iconizzata o nascosta
+        # trascinamento della barra di avanzamento
+        self._seeking = False
+        self._seek_after = None
+        self.queue_availability = None  # disponibilità passata al player con la coda
 
         # Impostazione degli stili e creazione dei widget
         self.setup_styles()
         self.create_widgets() # at line 59
-        self.load_playlists_from_db() # at line 193
-
-        # Thread per monitorare la fine delle tracce musicali in background
-        self.playback_thread = threading.Thread(target=self.player.run_playlist_monitor, daemon=True)
-        self.playback_thread.start()
 
-        # Avvia l'aggiornamento periodico della barra di progresso
-        self.update_progress() 
+        # Database, VLC e Pillow solo dopo che la finestra è stata disegnata
+        self._startup_executor = None
+        self.root.after_idle(self.start_background_work)
+        # Finestra nascosta: niente aggiornamenti dell'avanzamento
+        self.root.bind("<Unmap>", self.on_visibility_changed, add='+')
+        self.root.bind("<Map>", self.on_visibility_changed, add='+')
+        # Ridisegna le righe quando cambia la disponibilità dei file
+        self.poll_availability()
         # Gestisce la chiusura della finestra
         self.root.protocol("WM_DELETE_WINDOW", self.on_close)
 
@@ -67,12 +101,7 @@ class App:
         """Configura gli stili personalizzati per i widget ttk."""
         style = ttk.Style()
         style.theme_use('clam')
-        # Stile per la barra di progresso
-        style.configure("dark.Horizontal.TProgressbar",
-                        troughcolor=settings.COMPONENT_BACKGROUND,
-                        background=settings.PRIMARY_COLOR,
-                        bordercolor=settings.BACKGROUND_COLOR)
-        # Stile per lo slider del volume
+        # Stile per lo slider del volume e la barra di avanzamento
         style.configure("dark.Horizontal.TScale",
                         troughcolor=settings.COMPONENT_BACKGROUND,
                         background=settings.PRIMARY_COLOR,
@@ -111,9 +140,11 @@ class App:
         Label(info_frame, textvariable=self.time_var,
               fg=settings.MUTED_TEXT_COLOR, bg=settings.BACKGROUND_COLOR,
               font=(settings.FONT_FAMILY, settings.FONT_SIZE_TIME)).pack()
-        self.progress_bar = ttk.Progressbar(info_frame, orient='horizontal',
-                                            mode='determinate', style="dark.Horizontal.TProgressbar")
-        self.progress_bar.pack(pady=5, fill='x', expand=True)
+        # barra di avanzamento a forma d'onda, click e trascinamento per il seek
+        # (valori in millesimi della durata)
+        self.seek_bar = WaveformSeekBar(info_frame, settings.SEEK_BAR_STEPS, on_press=self.on_seek_start,
+                                        on_drag=self.on_seek_drag, on_release=self.on_seek_end)
+        self.seek_bar.pack(pady=5, fill='x', expand=True)
 
         # Frame per i controlli di riproduzione (play, pausa, etc.)
         controls_frame = Frame(left_frame, bg=settings.BACKGROUND_COLOR)
@@ -128,13 +159,18 @@ class App:
             **settings.CONTROL_BUTTON_SIZE
         }
         # Creazione dei bottoni
-        Button(controls_frame, text="⏮", font=button_font, command=self.player.prev_track, **button_config).grid(row=0, column=0, padx=5)
+        Button(controls_frame, text="⏮", font=button_font, command=lambda: self.send_to_player('prev_track'), **button_config).grid(row=0, column=0, padx=5)
         self.play_pause_button = Button(controls_frame, text="▶", font=button_font,
                                         command=self.toggle_play_pause, **button_config)
         self.play_pause_button.grid(row=0, column=1, padx=5)
-        Button(controls_frame, text="⏭", font=button_font, command=self.player.next_track, **button_config).grid(row=0, column=2, padx=5)
-        Button(controls_frame, text="⏹", font=button_font, command=self.player.stop, **button_config).grid(row=0, column=3, padx=5)
-        Button(controls_frame, text="🔀", font=button_font, command=self.toggle_shuffle_ui, **button_config).grid(row=0, column=4, padx=5)
+        Button(controls_frame, text="⏭", font=button_font, command=lambda: self.send_to_player('next_track'), **button_config).grid(row=0, column=2, padx=5)
+        Button(controls_frame, text="⏹", font=button_font, command=lambda: self.send_to_player('stop'), **button_config).grid(row=0, column=3, padx=5)
+        self.shuffle_button = Button(controls_frame, text="🔀", font=button_font,
+                                     command=self.toggle_shuffle_ui, **button_config)
+        self.shuffle_button.grid(row=0, column=4, padx=5)
+        self.radio_button = Button(controls_frame, text="📻", font=button_font,
+                                   command=self.toggle_radio_ui, **button_config)
+        self.radio_button.grid(row=0, column=5, padx=5)
 
         # Frame per il controllo del volume
         volume_frame = Frame(left_frame, bg=settings.BACKGROUND_COLOR)
@@ -142,7 +178,7 @@ class App:
         Label(volume_frame, text="🔉", bg=settings.BACKGROUND_COLOR,
               fg=settings.TEXT_COLOR, font=(settings.FONT_FAMILY, 12)).pack(side='left')
         self.volume_slider = ttk.Scale(volume_frame, from_=0, to=100, orient='horizontal',
-                                       command=self.player.set_volume, style="dark.Horizontal.TScale")
+                                       command=self.on_volume_change, style="dark.Horizontal.TScale")
         self.volume_slider.set(100)  # Imposta il volume iniziale al 100%
         self.volume_slider.pack(side='left', fill='x', expand=True, padx=5)
         Label(volume_frame, text="🔊", bg=settings.BACKGROUND_COLOR,
@@ -153,6 +189,21 @@ class App:
         right_frame.pack(side='right', fill='y', expand=False, padx=(10, 0))
         right_frame.pack_propagate(False)  # Impedisce al frame di ridimensionarsi
 
+        # Casella di ricerca (search-as-you-type su titolo e artisti)
+        search_frame = Frame(right_frame, bg=settings.BACKGROUND_COLOR)
+        search_frame.pack(fill='x', pady=(0, 5))
+        Label(search_frame, text="🔍", bg=settings.BACKGROUND_COLOR,
+              fg=settings.TEXT_COLOR, font=(settings.FONT_FAMILY, 12)).pack(side='left')
+        self.search_var = StringVar()
+        self.search_entry = Entry(search_frame, textvariable=self.search_var,
+                                  bg=settings.COMPONENT_BACKGROUND, fg=settings.TEXT_COLOR,
+                                  insertbackground=settings.TEXT_COLOR, highlightthickness=0, border=0,
+                                  font=(settings.FONT_FAMILY, settings.FONT_SIZE_PLAYLIST))
+        self.search_entry.pack(side='left', fill='x', expand=True, padx=5)
+        self.search_entry.bind("<Return>", self.play_first_search_result)
+        self.search_entry.bind("<Escape>", lambda e: self.search_var.set(""))
+        self.search_var.trace_add('write', self.on_search_changed)
+
         # Finestra "paned" per dividere lo spazio tra playlist e canzoni
         paned_window = ttk.PanedWindow(right_frame, orient='vertical')
         paned_window.pack(fill='both', expand=True)
@@ -183,37 +234,103 @@ class App:
         Label(songs_frame, text="Canzoni 🎵", font=(settings.FONT_FAMILY, 14),
               fg=settings.TEXT_COLOR, bg=settings.BACKGROUND_COLOR).pack(pady=(0, 5))
 
-        songs_container = Frame(songs_frame)
-        songs_container.pack(fill='both', expand=True)
-
-        self.song_box = Listbox(songs_container, bg=settings.COMPONENT_BACKGROUND, fg=settings.TEXT_COLOR,
-                                selectbackground=settings.PRIMARY_COLOR, highlightthickness=0, border=0,
-                                font=(settings.FONT_FAMILY, settings.FONT_SIZE_PLAYLIST), exportselection=False)
-        self.song_box.pack(side='left', fill='both', expand=True)
-        self.song_box.bind("<Double-1>", self.play_selected_song)
-
-        scrollbar_songs = Scrollbar(songs_container, orient='vertical', command=self.song_box.yview)
-        scrollbar_songs.pack(side='right', fill='y')
-        self.song_box.config(yscrollcommand=scrollbar_songs.set)
+        # lista virtualizzata: solo le righe visibili (più un margine) sono nel Treeview,
+        # ognuna con la miniatura della copertina da 64px
+        self.song_box = VirtualSongList(songs_frame, row_text=lambda row: row[1], row_fg=self.song_row_color,
+                                        bg=settings.COMPONENT_BACKGROUND, fg=settings.TEXT_COLOR,
+                                        selectbackground=settings.PRIMARY_COLOR,
+                                        font=(settings.FONT_FAMILY, settings.FONT_SIZE_PLAYLIST))
+        self.song_box.pack(fill='both', expand=True)
+        self.song_box.bind_rows("<Double-1>", self.play_selected_song)
+        self.song_box.bind_rows("<Button-3>", self.show_song_menu)
+
+        # menu contestuale delle righe: richieste dell'utente nella coda
+        self.song_menu = Menu(self.root, tearoff=0, bg=settings.COMPONENT_BACKGROUND, fg=settings.TEXT_COLOR)
+        self.song_menu.add_command(label="Riproduci dopo", command=lambda: self.queue_selected_song(next_=True))
+        self.song_menu.add_command(label="Aggiungi in coda", command=self.queue_selected_song)
 
         paned_window.add(songs_frame, weight=2)
 
     # === Metodi funzionali ===
-    def load_playlists_from_db(self):
-        """Carica i nomi delle playlist dal database e li visualizza nella Listbox."""
+    def start_background_work(self):
+        """
+        Chiamata dopo il primo disegno: legge le playlist e crea player e
+        servizio copertine (import di VLC e Pillow) su thread in background.
+        """
+        self._startup_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="startup")
+        playlists_future = self._startup_executor.submit(self.repository.get_playlists)
+        player_future = self._startup_executor.submit(self._create_player, self.repository)
+        if metrics.enabled:
+            self._startup_executor.submit(metrics.start)
+        self._startup_executor.shutdown(wait=False)
+        self.root.after(settings.STARTUP_POLL_MS, self.poll_playlists, playlists_future)
+        self.root.after(settings.STARTUP_POLL_MS, self.poll_player_ready, player_future)
+
+    @staticmethod
+    def _create_player(repository):
+        """
+        Importa VLC e Pillow e crea player, cronologia, servizio copertine e
+        forme d'onda (thread in background). L'indice di similarità per la radio è
+        facoltativo: senza NumPy o con un indice mancante o illeggibile il bottone
+        radio non fa nulla. Anche le forme d'onda lo sono: senza NumPy o snappy
+        la barra di avanzamento resta uniforme.
+        """
+        from app.music_player.music_palyer import MusicPlayer
+        from app.utils.covers import get_cover_service
+        from app.utils.history import PlayHistory
+
+        # WAL e colonne della loudness una volta sola, prima che la cronologia e le Track leggano
+        repository.prepare()
+        try:
+            from app.utils.similarity import SimilarityIndex
+            similarity = SimilarityIndex.load()
+        except Exception as e:
+            print(f"Indice di similarità non disponibile, radio disattivata: {e}")
+            similarity = None
+        try:
+            from app.utils.waveforms import WaveformService
+            waveforms = WaveformService(repository)
+        except Exception as e:
+            print(f"Forme d'onda non disponibili: {e}")
+            waveforms = None
+        history = PlayHistory(repository)
+        player = MusicPlayer(history=history, similarity=similarity, waveforms=waveforms)
+        return player, history, get_cover_service(), waveforms
+
+    def poll_player_ready(self, future):
+        """Quando il player è pronto lo avvia e inizia ad applicarne lo stato alla UI."""
+        if not future.done():
+            self.root.after(settings.STARTUP_POLL_MS, self.poll_player_ready, future)
+            return
         try:
-            cursor = self.db_conn.cursor()
-            cursor.execute("SELECT id, name FROM playlists ORDER BY name")
-            # cursor.execute(get_playlists_query())
-            # cursor.execute(GET_PLAYLISTS_QUERY)
-            self.playlists = cursor.fetchall()
-
-            self.playlist_box.delete(0, 'end')  # Pulisce la lista prima di caricarla
-            for _, name in self.playlists:
-                self.playlist_box.insert('end', name)
+            self.player, self.history, self.cover_service, self.waveforms = future.result()
+        except Exception as e:
+            print(f"Errore nell'avvio del lettore: {e}")
+            return
+        self.song_box.set_cover_service(self.cover_service)
+        self._player_state = self.player.state
+        # Thread del player: VLC e la coda vengono toccati solo da lui
+        self.player.start()
+        self.player.set_volume(self.volume_slider.get())
+        # Applica alla UI i cambi di stato e l'avanzamento del player (sul thread di Tk)
+        self.poll_player()
+
+    def poll_playlists(self, future):
+        """Mostra le playlist quando la lettura in background è terminata."""
+        if not future.done():
+            self.root.after(settings.STARTUP_POLL_MS, self.poll_playlists, future)
+            return
+        try:
+            self.show_playlists(future.result())
         except Exception as e:
             print(f"Errore nel caricamento delle playlist: {e}")
 
+    def show_playlists(self, playlists):
+        self.playlists = playlists
+        self.playlist_box.delete(0, 'end')  # Pulisce la lista prima di caricarla
+        # un solo insert per tutte le playlist: un solo round-trip Tcl
+        self.playlist_box.insert('end', *(name for _, name in self.playlists))
+
     def load_songs_for_playlist(self, event=None):
         """Carica le canzoni associate alla playlist selezionata."""
         selected_indices = self.playlist_box.curselection()
@@ -225,115 +342,373 @@ class App:
         print(f"Caricamento canzoni per playlist: {playlist_name} (ID: {playlist_id})")
 
         try:
-            cursor = self.db_conn.cursor()
-            cursor.execute("""
-                SELECT 
-                    s.song_id,
-                    s.title,
-                    s.mp4_path,
-                    s.copertina_640_path AS cover_path,
-                    s.artists
-                FROM songs s
-                JOIN playlist_songs ps ON s.song_id = ps.song_id
-                WHERE ps.playlist_id = ?
-            """, (playlist_id,))
-            # cursor.execute(get_songs_from_playlist_query(playlist_id))
-            # cursor.execute(GET_SONGS_FROM_PLAYLIST_QUERY, (playlist_id,))
-            self.current_song_list = cursor.fetchall()
-
-            self.song_box.delete(0, 'end')  # Pulisce la lista delle canzoni
-
-            # carichiamo i nuovi dati dentro song_box
-            # for song_id, title, mp4_path, cover_path, artists??
-            for _, title, _, _, _ in self.current_song_list:
-                self.song_box.insert('end', title)
+            # la stessa playlist riselezionata riusa righe, disponibilità e coda del player
+            if getattr(self.playlist_rows, 'playlist_id', None) != playlist_id:
+                # le righe vengono lette dal cursore a pagine, solo quando la lista le mostra
+                self.playlist_rows = PlaylistRows(self.repository, playlist_id)
+            self.search_var.set("")
+            self.show_song_rows(self.playlist_rows)
 
         except Exception as e:
             print(f"Errore nel caricare le canzoni della playlist: {e}")
 
     def play_selected_song(self, event=None):
         """Avvia la riproduzione della canzone selezionata dalla lista."""
+        if event is not None:
+            self.song_box.selection_set(self.song_box.index_at(event.y))
         selected_indices = self.song_box.curselection()
         if not selected_indices:
             return
         
-        song_index = selected_indices[0] ## sono gli indeci del song_box??
-        # Prepara la lista di canzoni per il player
-        songs_for_player = [(s[2], s[1], s[3], s[4]) for s in self.current_song_list]
-        self.player.load_playlist(songs_for_player)
-        self.player.play_song_at_index(song_index)
+        metrics.begin('switch')
+        song_index = selected_indices[0] # indice nella playlist, non nella Listbox
+        if self.current_song_list is not self.queue_rows:
+            # nuova coda: solo i rowid, le Track vengono lette quando servono
+            self.queue_rows = self.current_song_list
+            with metrics.span('queue_build'):
+                self.play_queue = self.build_play_queue(self.queue_rows)
+            self.queue_availability = self.song_availability
+        self.send_to_player('load_playlist', self.play_queue,
+                            availability=self.queue_availability, start_index=song_index)
+
+    def build_play_queue(self, rows):
+        """Coda del player con le stesse entry (e lo stesso ordine) delle righe mostrate."""
+        if isinstance(rows, PlaylistRows):
+            return PlayQueue.for_playlist(self.repository, rows.playlist_id)
+        return PlayQueue.for_rows(self.repository, rows)
+
+    def show_song_menu(self, event):
+        """Tasto destro su una riga: la seleziona e apre il menu contestuale."""
+        self.song_box.selection_set(self.song_box.index_at(event.y))
+        self.song_menu.tk_popup(event.x_root, event.y_root)
+
+    def queue_selected_song(self, next_=False):
+        """Aggiunge la riga selezionata alle richieste dell'utente nella coda del player."""
+        selected_indices = self.song_box.curselection()
+        if not selected_indices:
+            return
+        rowid = self.current_song_list[selected_indices[0]].rowid
+        if next_:
+            self.send_to_player('insert_next', rowid)
+        else:
+            self.send_to_player('enqueue', rowid)
+
+    def show_song_rows(self, rows):
+        """Mostra nella lista canzoni le righe di una playlist o di una ricerca."""
+        # la disponibilità della coda in riproduzione appartiene al player
+        if self.song_availability is not self.queue_availability:
+            self.song_availability.stop()
+        if rows is self.queue_rows:
+            self.song_availability = self.queue_availability
+        else:
+            # controllo dei file in background: le righe mancanti vengono mostrate in grigio
+            self.song_availability = AvailabilityIndex(rows)
+            self.song_availability.start()
+        self._availability_version = self.song_availability.version
+        self.current_song_list = rows
+        self.song_box.set_source(rows)
+
+    def song_row_color(self, index):
+        """Colore di una riga della lista canzoni: grigio se il file non è disponibile."""
+        if index < len(self.song_availability) and self.song_availability.is_missing(index):
+            return settings.UNAVAILABLE_TEXT_COLOR
+        return None
+
+    def poll_availability(self):
+        """Ridisegna la lista canzoni quando il controllo in background trova file mancanti."""
+        # le righe materializzate sono quelle ricontrollate periodicamente
+        self.song_availability.watch('visible', range(self.song_box.window_start, self.song_box.window_end))
+        if self.song_availability.version != self._availability_version:
+            self._availability_version = self.song_availability.version
+            self.song_box.render(force=True)
+        self.root.after(settings.AVAILABILITY_POLL_MS, self.poll_availability)
+
+    # === Ricerca ===
+    def on_search_changed(self, *args):
+        """Debounce: la ricerca parte solo dopo una pausa nella digitazione."""
+        if self._search_after is not None:
+            self.root.after_cancel(self._search_after)
+        self._search_after = self.root.after(settings.SEARCH_DEBOUNCE_MS, self.run_search)
+
+    def run_search(self):
+        """Lancia la ricerca sul thread del SongSearcher."""
+        self._search_after = None
+        self._search_token += 1
+        text = self.search_var.get().strip()
+        if not build_match_expression(text):
+            # testo vuoto o troppo corto: torna alla playlist aperta
+            if self.current_song_list is not self.playlist_rows:
+                self.show_song_rows(self.playlist_rows)
+            return
+        future = self.searcher.search(text)
+        self.root.after(settings.SEARCH_POLL_MS, self.poll_search, future, self._search_token)
 
-    def update_ui_for_song(self, file_path, song_title, index):
-        """Aggiorna l'interfaccia utente (titolo, copertina, selezione) per la canzone corrente."""
-        artists = ""
-        if hasattr(self, 'current_song_list') and 0 <= index < len(self.current_song_list):
-            artists = self.current_song_list[index][4] or ""  # campo artists nel DB
-        display_title = f"{song_title} - {artists}" if artists else song_title
-        self.song_title_var.set(display_title)
+    def poll_search(self, future, token):
+        """Mostra i risultati della ricerca quando sono pronti, scartando quelli obsoleti."""
+        if token != self._search_token:
+            return
+        if not future.done():
+            self.root.after(settings.SEARCH_POLL_MS, self.poll_search, future, token)
+            return
+        rows = None if future.cancelled() else future.result()
+        if rows is not None:
+            self.show_song_rows(rows)
+
+    def play_first_search_result(self, event=None):
+        """Invio nella casella di ricerca: riproduce il primo risultato."""
+        if self.current_song_list is self.playlist_rows or not self.current_song_list:
+            return
+        self.song_box.selection_set(0)
+        self.play_selected_song()
+
+    def send_to_player(self, command, *args, **kwargs):
+        """
+        Invia un comando (nome del metodo di MusicPlayer) al player e anticipa
+        il prossimo poll, anche se la UI era a riposo. Finché il player non è
+        pronto i comandi vengono ignorati.
+        """
+        if self.player is None:
+            print(f"Player non ancora pronto, comando '{command}' ignorato")
+            return
+        if command in SWITCH_COMMANDS:
+            metrics.begin('switch')
+        getattr(self.player, command)(*args, **kwargs)
+        self.wake_player_poll()
+
+    def on_volume_change(self, volume):
+        # il volume iniziale viene passato al player quando è pronto
+        if self.player is not None:
+            self.player.set_volume(volume)
+
+    def wake_player_poll(self):
+        if self.player is None:
+            return
+        if self._player_after is not None:
+            self.root.after_cancel(self._player_after)
+        self._player_after = self.root.after(settings.PLAYER_UI_POLL_MS, self.poll_player)
+
+    def poll_player(self):
+        """
+        Applica alla UI l'ultimo stato pubblicato dal thread del player. Gli
+        stati intermedi (es. durante skip ripetuti) vengono saltati: si
+        ridisegna una sola volta, con lo stato più recente.
+
+        In riproduzione con la finestra visibile gira ogni PLAYER_UI_POLL_MS e
+        aggiorna anche l'avanzamento; in pausa, da fermo o con la finestra
+        nascosta rallenta a PLAYER_UI_IDLE_MS e non tocca i widget.
+        """
+        self._player_after = None
+        state = self.player.state
+        previous = self._player_state
+        restarted = state.is_stopped != previous.is_stopped or state.started != previous.started
+        if state is not previous:
+            self._player_state = state
+            if state.started != previous.started or state.track is not previous.track:
+                if state.track is not None:
+                    self.update_ui_for_song(state.track, state.index)
+            if state.is_paused != previous.is_paused or restarted:
+                self.play_pause_button.config(text="▶" if state.is_paused else "⏸")
+            if state.shuffle != previous.shuffle:
+                self.shuffle_button.config(fg=settings.PRIMARY_COLOR if state.shuffle else settings.TEXT_COLOR)
+            if state.radio != previous.radio:
+                self.radio_button.config(fg=settings.PRIMARY_COLOR if state.radio else settings.TEXT_COLOR)
+        active = self._visible and state.track is not None and not (state.is_paused or state.is_stopped)
+        if active or restarted:
+            self.update_progress()
+        if self.player.running:
+            interval = settings.PLAYER_UI_POLL_MS if active else settings.PLAYER_UI_IDLE_MS
+            self._player_after = self.root.after(interval, self.poll_player)
 
+    def on_visibility_changed(self, event):
+        # <Map>/<Unmap> legati alla root arrivano anche dai widget figli
+        if event.widget is not self.root:
+            return
+        self._visible = event.type == EventType.Map
+        if self._visible:
+            self._shown_progress = None
+            self.wake_player_poll()
 
-        cover_path = None
-        if hasattr(self, 'current_song_list') and 0 <= index < len(self.current_song_list):
-            cover_path = self.current_song_list[index][3]
+    def update_ui_for_song(self, track, index):
+        """Aggiorna l'interfaccia utente (titolo, copertina, selezione) per la canzone corrente."""
+        with metrics.span('ui_update'):
+            self._update_ui_for_song(track, index)
 
-        if cover_path and os.path.exists(cover_path):
-            try:
-                img = Image.open(cover_path)
-                # Ridimensiona l'immagine per adattarla alla label
-                label_w = self.cover_label.winfo_width() or 640
-                label_h = self.cover_label.winfo_height() or 640
-                img.thumbnail((label_w, label_h))
-                cover_img = ImageTk.PhotoImage(img)
-                self.cover_label.configure(image=cover_img)
-                self.cover_label.image = cover_img  # Mantiene un riferimento all'immagine
-            except Exception as e:
-                print(f"Errore caricamento copertina: {e}")
+    def _update_ui_for_song(self, track, index):
+        artists = track.artists or ""  # campo artists nel DB
+        display_title = f"{track.title} - {artists}" if artists else track.title
+        self.song_title_var.set(display_title)
+
+        # ogni cambio canzone invalida le richieste di copertina ancora in corso
+        self._cover_token += 1
+        # Ridimensiona l'immagine per adattarla alla label, partendo dalla copertina
+        # salvata più piccola che la copre (64, 300 o 640px)
+        label_w = self.cover_label.winfo_width() or 640
+        label_h = self.cover_label.winfo_height() or 640
+        size = (label_w, label_h)
+        cover_path = utils.pick_cover_path(track, size)
+        if cover_path:
+            img = self.cover_service.get_cached(cover_path, size)
+            if img is not None:
+                self.show_cover(img)
+            else:
+                # decodifica e ridimensionamento avvengono nel pool del CoverService
+                future = self.cover_service.submit(cover_path, size)
+                self.root.after(settings.COVER_POLL_MS, self.poll_cover, future, self._cover_token)
         else:
-            # Mostra un placeholder se la copertina non è disponibile
-            placeholder = PhotoImage(width=640, height=640)
-            self.cover_label.configure(image=placeholder, text="Copertina non trovata",
-                                       fg=settings.TEXT_COLOR, compound='center')
-            self.cover_label.image = placeholder
+            self.show_cover_placeholder()
+        self.show_waveform(track)
 
-        # Aggiorna la selezione nella lista delle canzoni
+        # Aggiorna la selezione nella lista delle canzoni (solo se mostra la coda in riproduzione;
+        # le richieste dell'utente, index -1, non sono nella lista)
+        if self.current_song_list is not self.queue_rows or index < 0:
+            return
         self.song_box.selection_clear(0, 'end')
         self.song_box.selection_set(index)
         self.song_box.activate(index)
         self.song_box.see(index)  # Assicura che la canzone selezionata sia visibile
 
+    def poll_cover(self, future, token):
+        """Controlla (sul thread di Tk) se la copertina richiesta in background e' pronta."""
+        if token != self._cover_token:
+            # la canzone e' cambiata nel frattempo: risultato obsoleto
+            future.cancel()
+            return
+        if not future.done():
+            self.root.after(settings.COVER_POLL_MS, self.poll_cover, future, token)
+            return
+        img = None if future.cancelled() else future.result()
+        if img is not None:
+            self.show_cover(img)
+        else:
+            self.show_cover_placeholder()
+
+    def show_waveform(self, track):
+        """
+        Disegna la forma d'onda salvata della traccia (lettura per chiave
+        primaria e decompressione: sotto il millisecondo). Se manca, la barra
+        resta uniforme finché il servizio non ha analizzato il file.
+        """
+        self._waveform_token += 1
+        if self.waveforms is None:
+            return  # servizio non disponibile: la barra resta uniforme
+        peaks = self.waveforms.read(track.song_id)
+        self.seek_bar.set_waveform(peaks)
+        if peaks is None:
+            future = self.waveforms.submit(track)
+            self.root.after(settings.WAVEFORM_POLL_MS, self.poll_waveform, future, self._waveform_token)
+
+    def poll_waveform(self, future, token):
+        """Controlla (sul thread di Tk) se la forma d'onda analizzata in background è pronta."""
+        if token != self._waveform_token:
+            return  # la canzone è cambiata: l'analisi continua e resta salvata per la prossima volta
+        if not future.done():
+            self.root.after(settings.WAVEFORM_POLL_MS, self.poll_waveform, future, token)
+            return
+        if future.cancelled():
+            return
+        try:
+            peaks = future.result()
+        except Exception as e:
+            print(f"Errore nel caricamento della forma d'onda: {e}")
+            return
+        if peaks is not None:
+            self.seek_bar.set_waveform(peaks)
+
+    def show_cover(self, img):
+        """Mostra una copertina gia' decodificata e ridimensionata."""
+        from PIL import ImageTk  # già caricato dal servizio copertine
+
+        try:
+            with metrics.span('cover_show'):
+                cover_img = ImageTk.PhotoImage(img)
+            self.cover_label.configure(image=cover_img, text="")
+            self.cover_label.image = cover_img  # Mantiene un riferimento all'immagine
+        except Exception as e:
+            print(f"Errore caricamento copertina: {e}")
+
+    def show_cover_placeholder(self):
+        """Mostra un placeholder se la copertina non è disponibile."""
+        placeholder = PhotoImage(width=640, height=640)
+        self.cover_label.configure(image=placeholder, text="Copertina non trovata",
+                                   fg=settings.TEXT_COLOR, compound='center')
+        self.cover_label.image = placeholder
+
     def toggle_play_pause(self):
-        """Gestisce il click sul pulsante play/pausa."""
-        self.player.toggle_pause()
-        new_text = "▶" if self.player.is_paused else "⏸"
-        self.play_pause_button.config(text=new_text)
+        """Gestisce il click sul pulsante play/pausa (il bottone si aggiorna da poll_player)."""
+        self.send_to_player('toggle_pause')
 
     def toggle_shuffle_ui(self):
-        """Attiva/disattiva la modalità shuffle e aggiorna il colore del bottone."""
-        self.player.toggle_shuffle()
-        new_color = settings.PRIMARY_COLOR if self.player.shuffle else settings.TEXT_COLOR
-        # Trova il bottone shuffle e cambia il colore del testo
-        for widget in self.root.winfo_children():
-            for subwidget in widget.winfo_children():
-                if isinstance(subwidget, Button) and subwidget.cget("text") == "🔀":
-                    subwidget.config(fg=new_color)
+        """Attiva/disattiva la modalità shuffle (il colore del bottone si aggiorna da poll_player)."""
+        self.send_to_player('toggle_shuffle')
+
+    def toggle_radio_ui(self):
+        """Attiva/disattiva la radio: a fine coda continua con le canzoni simili alla corrente."""
+        self.send_to_player('toggle_radio')
 
     def update_progress(self):
-        """Aggiorna la barra di progresso e il tempo di riproduzione."""
-        if self.player.running:
-            current_ms = self.player.player.get_time()
-            total_ms = self.player.player.get_length()
+        """
+        Aggiorna tempo e barra di avanzamento con la posizione pubblicata dagli
+        eventi del player. I widget vengono riscritti solo se cambia il secondo
+        mostrato o la posizione della barra; durante il trascinamento la barra
+        resta all'utente.
+        """
+        if self._seeking:
+            return
+        state = self._player_state
+        if state.is_stopped or state.track is None:
+            current_ms, total_ms = 0, 0
+        else:
+            current_ms, total_ms = self.player.time_ms, self.player.length_ms
+        position = current_ms * settings.SEEK_BAR_STEPS // total_ms if total_ms > 0 else 0
+        shown = (current_ms // 1000, total_ms // 1000, position)
+        if shown == self._shown_progress:
+            return
+        if self._shown_progress is None or shown[:2] != self._shown_progress[:2]:
             # Aggiorna il testo del tempo
             self.time_var.set(f"{utils.format_time(current_ms)} / {utils.format_time(total_ms)}")
-            # Aggiorna la barra di progresso
-            if total_ms > 0:
-                self.progress_bar['value'] = (current_ms / total_ms) * 100
-            else:
-                self.progress_bar['value'] = 0
-            # Richiama questa funzione dopo 500ms
-            self.root.after(500, self.update_progress)
+        if self._shown_progress is None or position != self._shown_progress[2]:
+            self.seek_bar.set(position)
+        self._shown_progress = shown
+
+    # === Barra di avanzamento trascinabile ===
+    def on_seek_start(self, event=None):
+        self._seeking = True
+
+    def on_seek_drag(self, value):
+        """Durante il trascinamento: anteprima del tempo e seek al massimo ogni SEEK_THROTTLE_MS."""
+        if not self._seeking or self.player is None:
+            return  # valore impostato da update_progress
+        total_ms = self.player.length_ms
+        self.time_var.set(f"{utils.format_time(self._seek_target_ms())} / {utils.format_time(total_ms)}")
+        if self._seek_after is None:
+            self._seek_after = self.root.after(settings.SEEK_THROTTLE_MS, self.send_seek)
+
+    def on_seek_end(self, event=None):
+        if self._seek_after is not None:
+            self.root.after_cancel(self._seek_after)
+        self.send_seek()
+        self._seeking = False
+        self._shown_progress = None
+
+    def _seek_target_ms(self):
+        return int(float(self.seek_bar.get()) * self.player.length_ms / settings.SEEK_BAR_STEPS)
+
+    def send_seek(self):
+        self._seek_after = None
+        if self.player is not None and self.player.length_ms > 0:
+            self.player.seek(self._seek_target_ms())
 
     def on_close(self):
         """Gestisce la chiusura dell'applicazione in modo pulito."""
-        self.player.shutdown()  # Ferma la riproduzione e rilascia le risorse
-        self.db_conn.close()  # Chiude la connessione al database
+        if self.player is not None:
+            self.player.shutdown()  # Ferma la riproduzione e rilascia le risorse
+        if self.history is not None:
+            self.history.close()  # Scrive gli ultimi eventi della cronologia
+        if self.cover_service is not None:
+            self.cover_service.shutdown()  # Ferma i worker delle copertine
+        if self.waveforms is not None:
+            self.waveforms.shutdown()  # Ferma l'analisi delle forme d'onda
+        self.searcher.shutdown()  # Ferma il thread di ricerca
+        metrics.stop()  # Scrive l'ultimo riepilogo delle metriche
+        self.repository.close()  # Chiude le connessioni al database
         self.root.destroy()  # Distrugge la finestra di Tkinter
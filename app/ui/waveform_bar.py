@@ -0,0 +1,121 @@
+from tkinter import Canvas
+
+from app import settings
+from app.utils.metrics import metrics
+
+
+def bar_heights(peaks, count, max_height):
+    """
+    Mezza altezza di ciascuna di count barre: il picco più alto dei bin che
+    copre, in scala su max_height. Senza picchi le barre sono basse e uniformi.
+    """
+    if not peaks:
+        return [max(1, max_height // 8)] * count
+    n = len(peaks)
+    heights = []
+    for i in range(count):
+        start = i * n // count
+        end = max(start + 1, (i + 1) * n // count)
+        heights.append(max(1, max(peaks[start:end]) * max_height // 255))
+    return heights
+
+
+class WaveformSeekBar(Canvas):
+    """
+    Barra di avanzamento disegnata come forma d'onda, con seek al click e
+    durante il trascinamento.
+
+    Come la ttk.Scale che sostituisce lavora con valori tra 0 e steps
+    (set/get). Ogni barra verticale è un item del Canvas: il ridisegno
+    completo avviene solo quando cambiano la forma d'onda o la larghezza,
+    mentre l'avanzamento ricolora solo le barre tra la posizione precedente
+    e la nuova. Senza forma d'onda (non ancora analizzata) le barre sono
+    basse e uniformi e la barra funziona comunque.
+    """
+
+    def __init__(self, parent, steps, on_press=None, on_drag=None, on_release=None, **kwargs):
+        """
+        Args:
+            steps: valore della fine della traccia.
+            on_press: chiamata con l'evento alla pressione, prima del seek.
+            on_drag: chiamata con il nuovo valore al click e durante il trascinamento.
+            on_release: chiamata con l'evento al rilascio.
+        """
+        super().__init__(parent, height=settings.WAVEFORM_HEIGHT, bg=settings.BACKGROUND_COLOR,
+                         highlightthickness=0, border=0, cursor='hand2', **kwargs)
+        self.steps = steps
+        self.on_press = on_press
+        self.on_drag = on_drag
+        self.on_release = on_release
+        self.peaks = None  # bytes 0-255 della forma d'onda, None se non disponibile
+        self._value = 0
+        self._bars = []  # id degli item delle barre, da sinistra
+        self._played = 0  # barre colorate come già suonate
+        self.bind('<Configure>', lambda event: self.redraw())
+        self.bind('<ButtonPress-1>', self._on_press)
+        self.bind('<B1-Motion>', self._on_motion)
+        self.bind('<ButtonRelease-1>', self._on_release)
+
+    # === Valore ===
+    def get(self):
+        return self._value
+
+    def set(self, value):
+        self._value = max(0, min(self.steps, int(float(value))))
+        self._color_played()
+
+    def set_waveform(self, peaks):
+        """Mostra la forma d'onda (bytes di picchi 0-255) o, con None, le barre uniformi."""
+        if peaks == self.peaks:
+            return
+        self.peaks = peaks
+        self.redraw()
+
+    # === Disegno ===
+    def redraw(self):
+        with metrics.span('waveform_draw'):
+            self.delete('all')
+            width, height = self.winfo_width(), self.winfo_height()
+            if width <= 1:
+                self._bars = []
+                return
+            step = settings.WAVEFORM_BAR_PX
+            middle = height // 2
+            heights = bar_heights(self.peaks, max(1, width // step), middle - 1)
+            bar_width = max(1, step - 1)
+            self._bars = [
+                self.create_line(x * step + bar_width / 2, middle - h, x * step + bar_width / 2, middle + h + 1,
+                                 width=bar_width, fill=settings.WAVEFORM_IDLE_COLOR)
+                for x, h in enumerate(heights)
+            ]
+            self._played = 0
+            self._color_played()
+
+    def _color_played(self):
+        played = self._value * len(self._bars) // self.steps
+        if played == self._played:
+            return
+        start, end = sorted((played, self._played))
+        color = settings.PRIMARY_COLOR if played > self._played else settings.WAVEFORM_IDLE_COLOR
+        for item in self._bars[start:end]:
+            self.itemconfigure(item, fill=color)
+        self._played = played
+
+    # === Seek ===
+    def _value_at(self, x):
+        width = max(1, self.winfo_width())
+        return max(0, min(self.steps, round(x * self.steps / width)))
+
+    def _on_press(self, event):
+        if self.on_press is not None:
+            self.on_press(event)
+        self._on_motion(event)
+
+    def _on_motion(self, event):
+        self.set(self._value_at(event.x))
+        if self.on_drag is not None:
+            self.on_drag(self._value)
+
+    def _on_release(self, event):
+        if self.on_release is not None:
+            self.on_release(event)
@@ -1,19 +1,44 @@
 
 import os
-from PIL import Image, ImageTk
 from app import settings
 
-def load_image(path, size):
-    """Carica un'immagine da un percorso, la ridimensiona e la restituisce come PhotoImage."""
+# copertine salvate per ogni canzone (SongRow e Track), dalla più piccola
+COVER_FIELDS = ((64, 'cover_64_path'), (300, 'cover_300_path'), (640, 'cover_path'))
+
+
+def pick_cover_path(entry, size):
+    """
+    Percorso della copertina più piccola tra quelle salvate che copre size
+    (larghezza, altezza) senza essere ingrandita. Se nessuna è abbastanza
+    grande restituisce la più grande esistente, None se non ce ne sono.
+    """
+    needed = max(size)
+    best = None
+    for resolution, field in COVER_FIELDS:
+        path = getattr(entry, field)
+        if path and os.path.exists(path):
+            best = path
+            if resolution >= needed:
+                break
+    return best
+
+
+def load_image(path, size, service=None):
+    """
+    Carica un'immagine da un percorso, la ridimensiona e la restituisce come PhotoImage.
+    Usa il CoverService condiviso, quindi beneficia della cache in memoria e su disco.
+    """
+    # import locali: i moduli di app.utils vengono usati anche senza Tk e Pillow (CLI)
+    from PIL import ImageTk
+    from app.utils.covers import get_cover_service
+
     if not path or not os.path.exists(path):
         return None
-    try:
-        img = Image.open(path)
-        img.thumbnail(size)
-        return ImageTk.PhotoImage(img)
-    except Exception as e:
-        print(f"Errore durante il caricamento dell'immagine {path}: {e}")
+    service = service or get_cover_service()
+    img = service.load(path, size)
+    if img is None:
         return None
+    return ImageTk.PhotoImage(img)
 
 
 def format_time(ms):
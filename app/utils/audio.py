@@ -0,0 +1,38 @@
+import shutil
+import subprocess
+
+import numpy as np
+
+from app import settings
+
+
+def decoder_available():
+    """True se il decoder configurato (LOUDNESS_FFMPEG) è eseguibile."""
+    return shutil.which(settings.LOUDNESS_FFMPEG) is not None
+
+
+def decode_pcm(path, rate, channels, chunk_frames):
+    """
+    PCM float32 (campioni, channels) del file a rate Hz, decodificato da
+    ffmpeg e letto chunk_frames campioni per volta (l'ultimo blocco può
+    essere più corto): la memoria non dipende dalla durata della traccia.
+
+    Raises:
+        RuntimeError: se ffmpeg non riesce a decodificare il file.
+    """
+    command = [settings.LOUDNESS_FFMPEG, '-nostdin', '-v', 'error', '-i', path, '-vn',
+               '-f', 'f32le', '-ac', str(channels), '-ar', str(rate), '-']
+    chunk_bytes = chunk_frames * channels * 4
+    with subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE) as process:
+        try:
+            while True:
+                data = process.stdout.read(chunk_bytes)
+                if not data:
+                    break
+                yield np.frombuffer(data, dtype='<f4').reshape(-1, channels)
+        finally:
+            process.stdout.close()
+            errors = process.stderr.read().decode(errors='replace').strip()
+            process.wait()
+    if process.returncode != 0:
+        raise RuntimeError(errors.splitlines()[-1] if errors else f"ffmpeg terminato con codice {process.returncode}")
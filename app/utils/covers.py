@@ -0,0 +1,187 @@
+import os
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image
+
+from app import settings
+from app.utils import pick_cover_path
+from app.utils.metrics import metrics
+
+
+class CoverService:
+    """
+    Servizio per le copertine: decodifica e ridimensiona le immagini in un pool
+    di worker, mantiene una cache LRU in memoria (con budget in byte) e una
+    cache persistente su disco delle miniature gia' ridimensionate.
+
+    La chiave di cache e' (path, mtime, size): se il file cambia su disco la
+    vecchia miniatura non viene piu' usata.
+    """
+
+    def __init__(self, max_bytes=None, cache_dir=None, max_workers=None):
+        self.max_bytes = max_bytes if max_bytes is not None else settings.COVER_CACHE_MAX_BYTES
+        self.cache_dir = cache_dir if cache_dir is not None else settings.THUMBNAIL_CACHE_DIR
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_workers or settings.COVER_WORKERS,
+            thread_name_prefix="cover"
+        )
+
+        # cache LRU: chiave -> PIL.Image gia' ridimensionata e caricata
+        self._cache = OrderedDict()
+        self._cache_bytes = 0
+        self._lock = threading.Lock()
+
+        if self.cache_dir:
+            os.makedirs(self.cache_dir, exist_ok=True)
+
+    # === Chiavi e cache in memoria ===
+    @staticmethod
+    def make_key(path, size):
+        """Restituisce la chiave (path, mtime_ns, size) o None se il file non esiste."""
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except (OSError, TypeError):
+            return None
+        return (path, mtime, (int(size[0]), int(size[1])))
+
+    @staticmethod
+    def _image_bytes(img):
+        return img.width * img.height * len(img.getbands())
+
+    def get_cached(self, path, size):
+        """Restituisce l'immagine dalla cache in memoria, senza toccare il disco pesantemente."""
+        key = self.make_key(path, size)
+        if key is None:
+            return None
+        return self._get(key)
+
+    def _get(self, key):
+        with self._lock:
+            img = self._cache.get(key)
+            if img is not None:
+                self._cache.move_to_end(key)
+            return img
+
+    def _put(self, key, img):
+        nbytes = self._image_bytes(img)
+        # un'immagine piu' grande dell'intero budget non viene messa in cache
+        if nbytes > self.max_bytes:
+            return
+        with self._lock:
+            old = self._cache.pop(key, None)
+            if old is not None:
+                self._cache_bytes -= self._image_bytes(old)
+            self._cache[key] = img
+            self._cache_bytes += nbytes
+            while self._cache_bytes > self.max_bytes and self._cache:
+                _, evicted = self._cache.popitem(last=False)
+                self._cache_bytes -= self._image_bytes(evicted)
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+            self._cache_bytes = 0
+
+    # === Cache su disco ===
+    def _disk_path(self, key):
+        if not self.cache_dir:
+            return None
+        path, mtime, (w, h) = key
+        digest = hashlib.sha1(f"{path}|{mtime}|{w}x{h}".encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, digest[:2], f"{digest}.jpg")
+
+    def _read_disk(self, key):
+        disk_path = self._disk_path(key)
+        if not disk_path or not os.path.exists(disk_path):
+            return None
+        try:
+            img = Image.open(disk_path)
+            img.load()
+            return img
+        except Exception as e:
+            print(f"Miniatura su disco non valida {disk_path}: {e}")
+            return None
+
+    def _write_disk(self, key, img):
+        disk_path = self._disk_path(key)
+        if not disk_path:
+            return
+        try:
+            os.makedirs(os.path.dirname(disk_path), exist_ok=True)
+            # scrittura atomica: file temporaneo + rename
+            tmp_path = f"{disk_path}.{threading.get_ident()}.tmp"
+            img.save(tmp_path, format='JPEG', quality=90)
+            os.replace(tmp_path, disk_path)
+        except Exception as e:
+            print(f"Errore nel salvataggio della miniatura {disk_path}: {e}")
+
+    # === Decodifica ===
+    def _decode(self, key):
+        path, _, size = key
+        img = self._read_disk(key)
+        if img is None:
+            metrics.count('cover_decodes')
+            img = Image.open(path)
+            # una copertina salvata gia' abbastanza piccola non va duplicata su disco
+            fits = img.width <= size[0] and img.height <= size[1]
+            # draft permette al decoder JPEG di ridurre gia' in fase di decodifica
+            img.draft('RGB', size)
+            img = img.convert('RGB')
+            img.thumbnail(size)
+            if not fits:
+                self._write_disk(key, img)
+        self._put(key, img)
+        return img
+
+    def load(self, path, size):
+        """Carica la copertina in modo sincrono (cache -> disco -> decodifica)."""
+        key = self.make_key(path, size)
+        if key is None:
+            return None
+        img = self._get(key)
+        if img is not None:
+            metrics.count('cover_cache_hits')
+            return img
+        try:
+            with metrics.span('cover_decode'):
+                return self._decode(key)
+        except Exception as e:
+            print(f"Errore durante il caricamento dell'immagine {path}: {e}")
+            return None
+
+    def submit(self, path, size):
+        """
+        Richiede la copertina in background.
+
+        Returns:
+            Un Future il cui risultato e' la PIL.Image ridimensionata (o None).
+        """
+        return self.executor.submit(self.load, path, size)
+
+    def load_best(self, entry, size):
+        """Carica la copertina salvata piu' adatta a size per una SongRow o una Track."""
+        path = pick_cover_path(entry, size)
+        return self.load(path, size) if path else None
+
+    def submit_best(self, entry, size):
+        """Come submit(), ma sceglie la risoluzione nel worker (controlli sul disco compresi)."""
+        return self.executor.submit(self.load_best, entry, size)
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+_service = None
+_service_lock = threading.Lock()
+
+
+def get_cover_service():
+    """Restituisce l'istanza condivisa del CoverService."""
+    global _service
+    with _service_lock:
+        if _service is None:
+            _service = CoverService()
+        return _service
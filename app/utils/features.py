@@ -0,0 +1,82 @@
+import os
+
+import numpy as np
+
+# vettori salvati come blob float32 little-endian, una riga per canzone
+DTYPE = np.dtype('<f4')
+
+
+def create_feature_tables(conn):
+    """Crea le tabelle dei vettori delle canzoni e dei centroidi del clustering se non esistono."""
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS song_features (
+        song_id TEXT PRIMARY KEY,
+        vector BLOB NOT NULL,
+        cluster INTEGER
+    )
+    """)
+    # le canzoni ancora da assegnare (cluster NULL) vengono trovate senza scansione
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_song_features_cluster ON song_features (cluster)")
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS cluster_centroids (
+        cluster INTEGER PRIMARY KEY,
+        centroid BLOB NOT NULL,
+        count INTEGER NOT NULL,
+        playlist_id INTEGER
+    )
+    """)
+
+
+def pack(vector):
+    return np.asarray(vector, dtype=DTYPE).tobytes()
+
+
+def unpack_many(blobs, dim):
+    """Matrice (len(blobs), dim) float32 da una sequenza di blob, con una sola copia."""
+    return np.frombuffer(b''.join(blobs), dtype=DTYPE).reshape(-1, dim)
+
+
+def feature_dim(conn):
+    """Dimensione dei vettori salvati, None se non ce ne sono."""
+    row = conn.execute("SELECT length(vector) FROM song_features LIMIT 1").fetchone()
+    return row[0] // DTYPE.itemsize if row else None
+
+
+def store_features(conn, song_ids, matrix):
+    """
+    Salva (o sostituisce) i vettori delle canzoni. Un vettore cambiato torna
+    da assegnare: il prossimo clustering incrementale sposta la canzone dalla
+    playlist del vecchio cluster a quella del nuovo.
+
+    Returns:
+        Il numero di vettori scritti.
+    """
+    matrix = np.ascontiguousarray(matrix, dtype=DTYPE)
+    if matrix.ndim != 2 or len(matrix) != len(song_ids):
+        raise ValueError(f"attesa una matrice ({len(song_ids)}, dim), ricevuta {matrix.shape}")
+    dim = feature_dim(conn)
+    if dim is not None and dim != matrix.shape[1]:
+        raise ValueError(f"vettori di dimensione {matrix.shape[1]}, nel database sono {dim}")
+    conn.executemany("""
+        INSERT INTO song_features (song_id, vector, cluster) VALUES (?, ?, NULL)
+        ON CONFLICT (song_id) DO UPDATE SET vector = excluded.vector, cluster = NULL
+        WHERE vector != excluded.vector
+        """, ((str(song_id), row.tobytes()) for song_id, row in zip(song_ids, matrix)))
+    return len(song_ids)
+
+
+def read_features_file(path):
+    """
+    Legge i vettori da un file .npz (array 'song_id' e 'features') o da un
+    CSV con la colonna song_id seguita da una colonna numerica per dimensione.
+
+    Returns:
+        (song_ids, matrice float32)
+    """
+    if os.path.splitext(path)[1].lower() == '.npz':
+        with np.load(path, allow_pickle=False) as data:
+            return data['song_id'].astype(str), data['features'].astype(DTYPE)
+    import pandas as pd  # import locale: pandas serve solo per leggere i CSV
+
+    df = pd.read_csv(path, dtype={'song_id': str})
+    return df['song_id'].to_numpy(), df.drop(columns=['song_id']).to_numpy(dtype=DTYPE)
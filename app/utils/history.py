@@ -0,0 +1,183 @@
+import time
+import threading
+from typing import Dict, List, NamedTuple, Optional
+
+from app import settings
+
+EVENT_START = 'start'
+EVENT_SKIP = 'skip'  # traccia lasciata prima della fine (position_ms dice dove)
+EVENT_COMPLETE = 'complete'
+
+# colonne di play_stats aggiornate da ciascun evento
+_STAT_COLUMNS = {EVENT_START: 'starts', EVENT_SKIP: 'skips', EVENT_COMPLETE: 'completions'}
+
+
+class SongStats(NamedTuple):
+    song_id: str
+    title: Optional[str]
+    artists: Optional[str]
+    starts: int
+    completions: int
+    skips: int
+    listened_ms: int
+    last_played: Optional[float]
+
+
+def create_history_tables(conn):
+    """Crea la cronologia e la tabella degli aggregati per canzone se non esistono."""
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS play_history (
+        id INTEGER PRIMARY KEY,
+        song_id TEXT NOT NULL,
+        event TEXT NOT NULL,
+        position_ms INTEGER NOT NULL DEFAULT 0,
+        played_at REAL NOT NULL
+    )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_play_history_song ON play_history (song_id, played_at)")
+    # aggregati mantenuti a ogni scrittura: le classifiche non rileggono la cronologia
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS play_stats (
+        song_id TEXT PRIMARY KEY,
+        starts INTEGER NOT NULL DEFAULT 0,
+        completions INTEGER NOT NULL DEFAULT 0,
+        skips INTEGER NOT NULL DEFAULT 0,
+        listened_ms INTEGER NOT NULL DEFAULT 0,
+        last_played REAL
+    )
+    """)
+    for column in ('starts', 'completions', 'skips', 'last_played'):
+        conn.execute(f"CREATE INDEX IF NOT EXISTS idx_play_stats_{column} ON play_stats ({column})")
+
+
+class PlayHistory:
+    """
+    Cronologia degli ascolti con scrittura differita.
+
+    record() aggiunge l'evento a un buffer in memoria e ritorna subito: né il
+    player né la UI aspettano mai un commit. Un thread dedicato scrive il
+    buffer ogni HISTORY_FLUSH_INTERVAL secondi (o prima, se supera
+    HISTORY_MAX_BUFFER eventi) in una sola transazione, che aggiorna anche
+    gli aggregati per canzone di play_stats. close() scrive gli eventi rimasti.
+    """
+
+    def __init__(self, repository, flush_interval=None, max_buffer=None):
+        self.repository = repository
+        self.flush_interval = flush_interval or settings.HISTORY_FLUSH_INTERVAL
+        self.max_buffer = max_buffer or settings.HISTORY_MAX_BUFFER
+        self._buffer = []
+        self._lock = threading.Lock()  # protegge il buffer
+        self._flush_lock = threading.Lock()  # una scrittura alla volta
+        self._wake = threading.Event()
+        self._closed = False
+        self._schema_ready = False
+        self._thread = threading.Thread(target=self._flush_loop, daemon=True, name="history")
+        self._thread.start()
+
+    # === Scrittura ===
+    def record(self, song_id, event, position_ms=0, played_at=None):
+        """Registra un evento (EVENT_START, EVENT_SKIP o EVENT_COMPLETE) senza toccare il database."""
+        if song_id is None or self._closed:
+            return
+        entry = (song_id, event, max(0, int(position_ms or 0)), played_at or time.time())
+        with self._lock:
+            self._buffer.append(entry)
+            full = len(self._buffer) >= self.max_buffer
+        if full:
+            self._wake.set()
+
+    def _flush_loop(self):
+        while not self._closed:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                # gli eventi restano nel buffer e vengono riprovati al giro successivo
+                print(f"Errore nella scrittura della cronologia: {e}")
+
+    def flush(self):
+        """Scrive gli eventi in attesa in una transazione; restituisce quanti ne ha scritti."""
+        with self._flush_lock:
+            with self._lock:
+                batch, self._buffer = self._buffer, []
+            if not batch:
+                return 0
+            try:
+                self._write(batch)
+            except Exception:
+                with self._lock:
+                    self._buffer[:0] = batch
+                raise
+            return len(batch)
+
+    def _write(self, batch):
+        # aggregati del batch calcolati qui: una sola UPSERT per canzone
+        stats = {}
+        for song_id, event, position_ms, played_at in batch:
+            row = stats.setdefault(song_id, {'starts': 0, 'completions': 0, 'skips': 0,
+                                             'listened_ms': 0, 'last_played': None})
+            row[_STAT_COLUMNS[event]] += 1
+            if event != EVENT_START:
+                row['listened_ms'] += position_ms
+            else:
+                row['last_played'] = max(row['last_played'] or 0, played_at)
+
+        with self.repository.writer() as conn:
+            if not self._schema_ready:
+                create_history_tables(conn)
+                self._schema_ready = True
+            conn.executemany(
+                "INSERT INTO play_history (song_id, event, position_ms, played_at) VALUES (?, ?, ?, ?)", batch
+            )
+            conn.executemany("""
+                INSERT INTO play_stats (song_id, starts, completions, skips, listened_ms, last_played)
+                VALUES (:song_id, :starts, :completions, :skips, :listened_ms, :last_played)
+                ON CONFLICT (song_id) DO UPDATE SET
+                    starts = starts + excluded.starts,
+                    completions = completions + excluded.completions,
+                    skips = skips + excluded.skips,
+                    listened_ms = listened_ms + excluded.listened_ms,
+                    last_played = COALESCE(MAX(last_played, excluded.last_played), last_played, excluded.last_played)
+                """, ({'song_id': song_id, **row} for song_id, row in stats.items()))
+
+    def close(self):
+        """Ferma il thread di scrittura e scrive gli eventi rimasti nel buffer."""
+        self._closed = True
+        self._wake.set()
+        self._thread.join(timeout=2.0)
+        try:
+            self.flush()
+        except Exception as e:
+            print(f"Errore nella scrittura della cronologia: {e}")
+
+    # === Lettura (solo aggregati) ===
+    def _ensure_schema(self):
+        if not self._schema_ready:
+            with self.repository.writer() as conn:
+                create_history_tables(conn)
+            self._schema_ready = True
+
+    def top_songs(self, limit=10, by='starts') -> List[SongStats]:
+        """Canzoni con più avvii (o completamenti, skip) o ascoltate più di recente."""
+        if by not in ('starts', 'completions', 'skips', 'last_played'):
+            raise ValueError(f"ordinamento non valido: {by}")
+        self._ensure_schema()
+        with self.repository.reader() as conn:
+            rows = conn.execute(f"""
+                SELECT p.song_id, s.title, s.artists, p.starts, p.completions, p.skips,
+                       p.listened_ms, p.last_played
+                FROM play_stats p
+                LEFT JOIN songs s ON s.song_id = p.song_id
+                ORDER BY p.{by} DESC
+                LIMIT ?
+                """, (limit,)).fetchall()
+        return [SongStats(*row) for row in rows]
+
+    def play_counts_by_rowid(self) -> Dict[int, int]:
+        """Avvii per rowid della canzone, per pesare lo shuffle (una sola query sugli aggregati)."""
+        self._ensure_schema()
+        with self.repository.reader() as conn:
+            return dict(conn.execute(
+                "SELECT s.rowid, p.starts FROM play_stats p JOIN songs s ON s.song_id = p.song_id"
+            ))
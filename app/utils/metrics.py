@@ -0,0 +1,227 @@
+import os
+import json
+import time
+import threading
+from collections import deque
+
+from app import settings
+
+QUANTILES = (0.5, 0.99)
+PREFIX = 'mymp3_'
+
+
+class _NoSpan:
+    """Span usato a metriche disabilitate: non misura niente."""
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NO_SPAN = _NoSpan()
+
+
+class _Span:
+    __slots__ = ('metrics', 'name', 'start')
+
+    def __init__(self, metrics, name):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.observe(self.name, time.perf_counter() - self.start)
+        return False
+
+
+class Metrics:
+    """
+    Spans e contatori per i percorsi caldi di player e UI (query, lista
+    canzoni, apertura dei media, primo frame audio, copertine, aggiornamento
+    della UI).
+
+    Disabilitate, span() restituisce un context manager condiviso che non fa
+    niente e gli altri metodi ritornano subito, quindi la strumentazione può
+    restare nel codice. Abilitate, per ogni span vengono tenuti conteggio,
+    somma e gli ultimi METRICS_WINDOW tempi, da cui si calcolano p50 e p99.
+
+    start() avvia gli esportatori: un riepilogo periodico in un log ruotato e
+    un endpoint in formato testo Prometheus su 127.0.0.1.
+    """
+
+    def __init__(self, enabled=False, window=None):
+        self.enabled = enabled
+        self.window = window or settings.METRICS_WINDOW
+        self._lock = threading.Lock()
+        self._samples = {}  # nome -> deque degli ultimi tempi in secondi
+        self._totals = {}  # nome -> [conteggio, somma]
+        self._counters = {}
+        self._marks = {}  # nome -> istante di begin(), per le misure tra thread diversi
+        self._server = None
+        self._log_thread = None
+        self._started = False
+        self._stop = threading.Event()
+
+    # === Misure ===
+    def span(self, name):
+        """Context manager che misura il blocco: with metrics.span('cover_decode'): ..."""
+        if not self.enabled:
+            return _NO_SPAN
+        return _Span(self, name)
+
+    def observe(self, name, seconds):
+        if not self.enabled:
+            return
+        with self._lock:
+            samples = self._samples.get(name)
+            if samples is None:
+                samples = self._samples[name] = deque(maxlen=self.window)
+                self._totals[name] = [0, 0.0]
+            samples.append(seconds)
+            totals = self._totals[name]
+            totals[0] += 1
+            totals[1] += seconds
+
+    def count(self, name, n=1):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + n
+
+    def begin(self, name):
+        """Inizio di una misura che finisce altrove (es. doppio click -> primo frame audio)."""
+        if self.enabled:
+            self._marks[name] = time.perf_counter()
+
+    def end(self, name):
+        """Chiude la misura aperta da begin(); senza begin() non fa niente."""
+        if not self.enabled:
+            return
+        start = self._marks.pop(name, None)
+        if start is not None:
+            self.observe(name, time.perf_counter() - start)
+
+    # === Lettura ===
+    def summary(self):
+        """dict con conteggio, somma e quantili di ogni span e il valore dei contatori."""
+        with self._lock:
+            spans = {name: (sorted(samples), *self._totals[name]) for name, samples in self._samples.items()}
+            counters = dict(self._counters)
+        result = {'spans': {}, 'counters': counters}
+        for name, (values, count, total) in spans.items():
+            entry = {'count': count, 'sum': total}
+            for q in QUANTILES:
+                entry[q] = values[min(len(values) - 1, int(len(values) * q))]
+            result['spans'][name] = entry
+        return result
+
+    def prometheus_text(self):
+        """Metriche nel formato testo di Prometheus (span come summary in secondi)."""
+        summary = self.summary()
+        lines = []
+        for name, entry in sorted(summary['spans'].items()):
+            metric = f"{PREFIX}{name}_seconds"
+            lines.append(f"# TYPE {metric} summary")
+            for q in QUANTILES:
+                lines.append(f'{metric}{{quantile="{q}"}} {entry[q]:.6f}')
+            lines.append(f"{metric}_sum {entry['sum']:.6f}")
+            lines.append(f"{metric}_count {entry['count']}")
+        for name, value in sorted(summary['counters'].items()):
+            metric = f"{PREFIX}{name}_total"
+            lines.append(f"# TYPE {metric} counter")
+            lines.append(f"{metric} {value}")
+        return "\n".join(lines) + "\n"
+
+    # === Esportazione ===
+    def start(self, port=None, log_path=None):
+        """
+        Avvia il log ruotato e l'endpoint Prometheus (solo se abilitate).
+        logging e http.server vengono importati qui, non all'avvio dell'app.
+        """
+        if not self.enabled or self._started:
+            return
+        self._started = True
+        port = settings.METRICS_PORT if port is None else port
+        log_path = log_path if log_path is not None else settings.METRICS_LOG_PATH
+        if log_path:
+            self._log_thread = threading.Thread(target=self._log_loop, args=(log_path,), daemon=True,
+                                                name="metrics-log")
+            self._log_thread.start()
+        if port:
+            try:
+                self._server = _make_server(self, port)
+            except OSError as e:
+                print(f"Endpoint delle metriche non avviato sulla porta {port}: {e}")
+                return
+            threading.Thread(target=self._server.serve_forever, daemon=True, name="metrics-http").start()
+            print(f"Metriche su http://127.0.0.1:{self._server.server_port}/metrics")
+
+    def stop(self):
+        """Ferma gli esportatori dopo aver scritto l'ultimo riepilogo nel log."""
+        self._stop.set()
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+        if self._log_thread is not None:
+            self._log_thread.join(timeout=1.0)
+            self._log_thread = None
+
+    def _log_loop(self, log_path):
+        import logging
+        from logging.handlers import RotatingFileHandler
+
+        os.makedirs(os.path.dirname(log_path), exist_ok=True)
+        logger = logging.getLogger('my-mp3.metrics')
+        logger.propagate = False
+        logger.setLevel(logging.INFO)
+        handler = RotatingFileHandler(log_path, maxBytes=settings.METRICS_LOG_MAX_BYTES,
+                                      backupCount=settings.METRICS_LOG_BACKUPS, encoding='utf-8')
+        logger.addHandler(handler)
+        try:
+            while True:
+                # l'ultima riga viene scritta anche alla chiusura
+                stopping = self._stop.wait(settings.METRICS_LOG_INTERVAL)
+                summary = self.summary()
+                spans = {name: {'count': entry['count'],
+                                **{f"p{int(q * 100)}_ms": round(entry[q] * 1000, 3) for q in QUANTILES}}
+                         for name, entry in summary['spans'].items()}
+                logger.info(json.dumps({'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                                        'spans': spans, 'counters': summary['counters']}))
+                if stopping:
+                    break
+        finally:
+            logger.removeHandler(handler)
+            handler.close()
+
+
+def _make_server(metrics, port):
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?')[0] != '/metrics':
+                self.send_error(404)
+                return
+            body = metrics.prometheus_text().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    # solo localhost: le metriche non escono dalla macchina
+    return ThreadingHTTPServer(('127.0.0.1', port), Handler)
+
+
+# istanza condivisa usata dalla strumentazione
+metrics = Metrics(settings.METRICS_ENABLED)
@@ -0,0 +1,108 @@
+import threading
+from itertools import islice
+
+from app import settings
+
+
+class PlaylistRows:
+    """
+    Righe SongRow di una playlist lette dal database a pagine, solo quando
+    servono.
+
+    Si comporta come una sequenza (len e indicizzazione), quindi la lista
+    virtuale della UI e il MusicPlayer possono usarla senza che l'intera
+    playlist venga caricata in anticipo. Ogni pagina prende in prestito una
+    connessione dal pool del Repository per il solo tempo della query, così
+    nessuna transazione di lettura resta aperta tra una pagina e l'altra.
+
+    Le pagine sono in una cache sparsa per numero di pagina: un salto della
+    scrollbar legge solo la pagina di arrivo, partendo dal song_id della riga
+    che la precede, e in memoria restano solo le pagine vicine all'ultima letta.
+    Quel song_id si trova dalla riga nota più vicina (bordi delle pagine già
+    lette, inizio o fine della playlist), così trascinando la scrollbar ogni
+    salto scorre solo le righe dal salto precedente.
+    """
+
+    def __init__(self, repository, playlist_id, page_size=None):
+        self.repository = repository
+        self.playlist_id = playlist_id
+        self.page_size = page_size or settings.SONG_PAGE_SIZE
+        self._lock = threading.Lock()
+        self._pages = {}  # numero di pagina -> righe
+        self._anchors = {-1: ''}  # indice di riga -> song_id, ai bordi delle pagine lette
+        self._count = repository.count_playlist_songs(playlist_id)
+
+    def __len__(self):
+        return self._count
+
+    def _cached_row(self, index):
+        page = self._pages.get(index // self.page_size)
+        offset = index % self.page_size
+        return page[offset] if page is not None and offset < len(page) else None
+
+    def _song_id_before(self, index):
+        """song_id della riga che precede index, punto di partenza del keyset ('' per la prima)."""
+        index -= 1
+        if index in self._anchors:
+            return self._anchors[index]
+        row = self._cached_row(index)
+        if row is not None:
+            return row.song_id
+        known = min(self._anchors, key=lambda anchor: abs(anchor - index))
+        if self._count - index <= abs(known - index):
+            return self.repository.get_playlist_song_id_at(self.playlist_id, self._count - 1 - index, None,
+                                                           backward=True)
+        if known < index:
+            return self.repository.get_playlist_song_id_at(self.playlist_id, index - known - 1, self._anchors[known])
+        return self.repository.get_playlist_song_id_at(self.playlist_id, known - index - 1, self._anchors[known],
+                                                       backward=True)
+
+    def _fetch_page(self, number):
+        """Legge la pagina number e toglie dalla cache quelle lontane."""
+        with self._lock:
+            page = self._pages.get(number)
+            if page is None:
+                after = self._song_id_before(number * self.page_size)
+                page = [] if after is None else self.repository.get_playlist_songs_page(
+                    self.playlist_id, after, self.page_size)
+                if page:
+                    first = number * self.page_size
+                    self._anchors[first - 1] = after
+                    self._anchors[first + len(page) - 1] = page[-1].song_id
+                for other in [n for n in self._pages if abs(n - number) > settings.SONG_PAGES_KEPT]:
+                    del self._pages[other]
+                self._pages[number] = page
+            return page
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += self._count
+        if not 0 <= index < self._count:
+            raise IndexError(index)
+        number, offset = divmod(index, self.page_size)
+        page = self._pages.get(number)
+        if page is None:
+            page = self._fetch_page(number)
+        return page[offset]
+
+    def iter_paths(self, indices):
+        """
+        Percorsi dei file delle righe in indices (un range, vedi
+        AvailabilityIndex). Quelli delle righe in memoria vengono dalle
+        pagine già lette, gli altri dal database a pagine di soli percorsi,
+        senza caricare le righe né toccare la cache.
+        """
+        for index in indices:
+            row = self._cached_row(index)
+            if row is None:
+                break
+            yield row.mp4_path
+        else:
+            return
+        after = self._song_id_before(index)
+        if after is not None:
+            yield from islice(self.repository.iter_playlist_paths(self.playlist_id, after),
+                              indices.stop - index)
+
+    def title(self, index):
+        return self[index][1]
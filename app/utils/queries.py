@@ -1,58 +1,195 @@
-import sqlite3
-import pandas as pd
-import os 
+import os
 
 
-def get_playlists_query() -> str:
-    return "SELECT id, name FROM playlists ORDER BY name"
+GET_PLAYLISTS_QUERY: str = "SELECT id, name FROM playlists ORDER BY name"
 
-GET_PLAYLISTS_QUERY: str="SELECT id, name FROM playlists ORDER BY name"
-
-def get_songs_from_playlist_query(playlist_id) -> str:
-
-    return """
-        SELECT 
-            s.song_id, 
+# le canzoni di una playlist sono lette a pagine (keyset sulla chiave primaria
+# di playlist_songs), così ogni pagina usa l'indice e non serve un cursore aperto
+GET_SONGS_FROM_PLAYLIST_PAGE_QUERY: str = """
+        SELECT
+            s.song_id,
             s.title,
+            s.mp4_path,
+            s.copertina_640_path AS cover_path,
             s.artists,
-            s.mp4_path, 
-            s.copertina_640_path AS cover_path
-        FROM 
-            songs s 
-        JOIN 
-            playlist_songs ps 
-        ON 
+            s.rowid,
+            s.copertina_300_path AS cover_300_path,
+            s.copertina_64_path AS cover_64_path
+        FROM
+            playlist_songs ps
+        JOIN
+            songs s
+        ON
             s.song_id = ps.song_id
-        WHERE 
-            ps.playlist_id = {playlist_id}
-    """.format(playlist_id=playlist_id)
+        WHERE
+            ps.playlist_id = ? AND ps.song_id > ?
+        ORDER BY
+            ps.song_id
+        LIMIT ?
+    """
 
+COUNT_SONGS_FROM_PLAYLIST_QUERY: str = """
+        SELECT
+            COUNT(*)
+        FROM
+            playlist_songs ps
+        JOIN
+            songs s
+        ON
+            s.song_id = ps.song_id
+        WHERE
+            ps.playlist_id = ?
+    """
 
-GET_SONGS_FROM_PLAYLIST_QUERY = """
-        SELECT 
-            s.song_id, 
+GET_SONG_QUERY: str = """
+        SELECT
+            s.song_id,
             s.title,
+            s.mp4_path,
+            s.copertina_640_path AS cover_path,
             s.artists,
-            s.mp4_path, 
-            s.copertina_640_path AS cover_path
-        FROM 
-            songs s 
-        JOIN 
-            playlist_songs ps 
-        ON 
+            s.rowid,
+            s.copertina_300_path AS cover_300_path,
+            s.copertina_64_path AS cover_64_path
+        FROM
+            songs s
+        WHERE
+            s.song_id = ?
+    """
+
+# la coda di riproduzione contiene solo i rowid delle canzoni, nello stesso
+# ordine della pagina qui sopra
+GET_PLAYLIST_ROWIDS_QUERY: str = """
+        SELECT
+            s.rowid
+        FROM
+            playlist_songs ps
+        JOIN
+            songs s
+        ON
             s.song_id = ps.song_id
-        WHERE 
+        WHERE
             ps.playlist_id = ?
+        ORDER BY
+            ps.song_id
     """
 
-PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-DATABASE_PATH = os.path.join(PROJECT_ROOT, 'db', 'music-player.db')
-db_conn = sqlite3.connect(DATABASE_PATH)
+# song_id a una distanza data da una riga nota, per le pagine lontane da
+# quelle già lette (salti della scrollbar): keyset fino alla riga nota, poi un
+# OFFSET breve che scorre solo gli indici. All'indietro si parte dalla fine.
+GET_PLAYLIST_SONG_ID_AFTER_QUERY: str = """
+        SELECT
+            ps.song_id
+        FROM
+            playlist_songs ps
+        JOIN
+            songs s
+        ON
+            s.song_id = ps.song_id
+        WHERE
+            ps.playlist_id = ? AND ps.song_id > ?
+        ORDER BY
+            ps.song_id
+        LIMIT 1 OFFSET ?
+    """
+
+GET_PLAYLIST_SONG_ID_BEFORE_QUERY: str = """
+        SELECT
+            ps.song_id
+        FROM
+            playlist_songs ps
+        JOIN
+            songs s
+        ON
+            s.song_id = ps.song_id
+        WHERE
+            ps.playlist_id = ? AND ps.song_id < ?
+        ORDER BY
+            ps.song_id DESC
+        LIMIT 1 OFFSET ?
+    """
+
+GET_PLAYLIST_SONG_ID_FROM_END_QUERY: str = """
+        SELECT
+            ps.song_id
+        FROM
+            playlist_songs ps
+        JOIN
+            songs s
+        ON
+            s.song_id = ps.song_id
+        WHERE
+            ps.playlist_id = ?
+        ORDER BY
+            ps.song_id DESC
+        LIMIT 1 OFFSET ?
+    """
+
+# solo i percorsi, per il controllo della disponibilità dei file: stesse pagine
+# (keyset su ps.song_id) e stesso ordine delle righe della playlist
+GET_PLAYLIST_PATHS_PAGE_QUERY: str = """
+        SELECT
+            ps.song_id,
+            s.mp4_path
+        FROM
+            playlist_songs ps
+        JOIN
+            songs s
+        ON
+            s.song_id = ps.song_id
+        WHERE
+            ps.playlist_id = ? AND ps.song_id > ?
+        ORDER BY
+            ps.song_id
+        LIMIT ?
+    """
+
+# {placeholders} viene sostituito con un "?" per ogni rowid richiesto
+GET_TRACKS_BY_ROWID_QUERY: str = """
+        SELECT
+            s.rowid,
+            s.song_id,
+            s.title,
+            s.mp4_path,
+            s.copertina_640_path AS cover_path,
+            s.artists,
+            s.copertina_300_path AS cover_300_path,
+            s.copertina_64_path AS cover_64_path,
+            s.gain_db
+        FROM
+            songs s
+        WHERE
+            s.rowid IN ({placeholders})
+    """
+
+SEARCH_SONGS_QUERY: str = """
+        SELECT
+            s.song_id,
+            s.title,
+            s.mp4_path,
+            s.copertina_640_path AS cover_path,
+            s.artists,
+            s.rowid,
+            s.copertina_300_path AS cover_300_path,
+            s.copertina_64_path AS cover_64_path
+        FROM
+            songs_fts f
+        JOIN
+            songs s
+        ON
+            s.rowid = f.rowid
+        WHERE
+            songs_fts MATCH ?
+        LIMIT ?
+    """
+
+
+def test_query(query: str, db_conn, params=()):
+    import pandas as pd
 
-def test_query(query: str, db_conn=db_conn):
     try:
         cursor = db_conn.cursor()
-        cursor.execute(query)
+        cursor.execute(query, params)
         result = cursor.fetchall()
 
         # Estrai i nomi delle colonne dal cursore
@@ -73,13 +210,17 @@ def test_query(query: str, db_conn=db_conn):
 if __name__=='__main__':
 
     import sys
+    import sqlite3
 
-    project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+    project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
     if project_root not in sys.path:
         sys.path.insert(0, project_root)
 
-    print(PROJECT_ROOT)
-    print(DATABASE_PATH)
+    from app import settings
+
+    print(settings.PROJECT_ROOT)
+    print(settings.DATABASE_PATH)
 
-    # test_query(GET_PLAYLISTS_QUERY)
-    test_query(get_songs_from_playlist_query(21))
+    db_conn = sqlite3.connect(settings.DATABASE_PATH)
+    # test_query(GET_PLAYLISTS_QUERY, db_conn)
+    test_query(GET_SONGS_FROM_PLAYLIST_PAGE_QUERY, db_conn, (21, '', 10))
@@ -0,0 +1,281 @@
+import os
+import queue
+import sqlite3
+import threading
+from array import array
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, NamedTuple, Optional
+
+from app import settings
+from app.utils import queries
+from app.utils.metrics import metrics
+
+
+class Playlist(NamedTuple):
+    id: int
+    name: str
+
+
+class SongRow(NamedTuple):
+    song_id: str
+    title: str
+    mp4_path: Optional[str]
+    cover_path: Optional[str]
+    artists: Optional[str]
+    rowid: int
+    cover_300_path: Optional[str]
+    cover_64_path: Optional[str]
+
+
+class Track:
+    """
+    Canzone della coda di riproduzione, letta dal database solo quando serve.
+    Con __slots__ ogni istanza occupa una frazione di una tupla con dizionario.
+    """
+
+    __slots__ = ('rowid', 'song_id', 'title', 'mp4_path', 'cover_path', 'artists', 'cover_300_path', 'cover_64_path',
+                 'gain_db')
+
+    def __init__(self, rowid, song_id, title, mp4_path, cover_path, artists, cover_300_path=None, cover_64_path=None,
+                 gain_db=None):
+        self.rowid = rowid
+        self.song_id = song_id
+        self.title = title
+        self.mp4_path = mp4_path
+        self.cover_path = cover_path
+        self.artists = artists
+        self.cover_300_path = cover_300_path
+        self.cover_64_path = cover_64_path
+        self.gain_db = gain_db  # guadagno di normalizzazione, None se la traccia non è stata analizzata
+
+    def __repr__(self):
+        return f"Track({self.rowid}, {self.title!r})"
+
+
+def _song_row_factory(cursor, row):
+    return SongRow(*row)
+
+
+# colonne dell'analisi della loudness (init_db.analyze_loudness), assenti nei database più vecchi
+LOUDNESS_COLUMNS = (('loudness_lufs', 'REAL'), ('sample_peak', 'REAL'), ('gain_db', 'REAL'))
+
+
+def add_loudness_columns(conn):
+    """Aggiunge a 'songs' le colonne della loudness se mancano (nulla se la tabella non esiste)."""
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(songs)")}
+    if not columns:
+        return
+    for name, sql_type in LOUDNESS_COLUMNS:
+        if name not in columns:
+            conn.execute(f"ALTER TABLE songs ADD COLUMN {name} {sql_type}")
+
+
+class Repository:
+    """
+    Unico punto di accesso al database SQLite.
+
+    - un pool di connessioni in sola lettura, una per thread che legge
+      (UI, ricerca, loader in background), restituite al pool dopo l'uso;
+    - una sola connessione di scrittura, serializzata da un lock.
+
+    Il database è in modalità WAL, quindi i lettori non si bloccano a vicenda
+    né aspettano lo scrittore ("database is locked"). Ogni connessione tiene
+    una cache di prepared statement (cached_statements), riusati da tutte le
+    query con parametri.
+    """
+
+    def __init__(self, db_path=None, max_readers=None):
+        self.db_path = db_path or settings.DATABASE_PATH
+        self._idle_readers = queue.LifoQueue()
+        self._reader_slots = threading.BoundedSemaphore(max_readers or settings.DB_MAX_READERS)
+        self._writer = None
+        self._writer_lock = threading.Lock()
+        self._closed = False
+
+    # === Connessioni ===
+    def _connect(self, readonly):
+        if readonly:
+            uri = f"file:{self.db_path}?mode=ro"
+        else:
+            os.makedirs(os.path.dirname(self.db_path) or '.', exist_ok=True)
+            uri = f"file:{self.db_path}"
+        conn = sqlite3.connect(
+            uri,
+            uri=True,
+            timeout=settings.DB_BUSY_TIMEOUT,
+            check_same_thread=False,  # le connessioni passano da un thread all'altro tramite il pool
+            cached_statements=settings.DB_CACHED_STATEMENTS,
+        )
+        conn.execute(f"PRAGMA cache_size = -{settings.DB_CACHE_KB}")
+        conn.execute(f"PRAGMA mmap_size = {settings.DB_MMAP_BYTES}")
+        conn.execute("PRAGMA temp_store = MEMORY")
+        if readonly:
+            conn.execute("PRAGMA query_only = 1")
+        else:
+            # WAL è persistente nel file: basta impostarlo dalla connessione di scrittura
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.execute("PRAGMA synchronous = NORMAL")
+        return conn
+
+    @contextmanager
+    def reader(self):
+        """Presta una connessione in sola lettura dal pool."""
+        self._reader_slots.acquire()
+        try:
+            try:
+                conn = self._idle_readers.get_nowait()
+            except queue.Empty:
+                conn = self._connect(readonly=True)
+            try:
+                with metrics.span('db_query'):
+                    yield conn
+            finally:
+                if self._closed:
+                    conn.close()
+                else:
+                    self._idle_readers.put(conn)
+        finally:
+            self._reader_slots.release()
+
+    def _ensure_writer(self):
+        with self._writer_lock:
+            if self._writer is None:
+                self._writer = self._connect(readonly=False)
+            return self._writer
+
+    def prepare(self):
+        """
+        Da chiamare una volta all'avvio, prima delle letture: apre la
+        connessione di scrittura (che imposta WAL) e aggiunge le colonne della
+        loudness, che le Track leggono anche da database creati prima
+        dell'analisi. Le letture poi aprono solo connessioni in sola lettura.
+        """
+        with self.writer() as conn:
+            add_loudness_columns(conn)
+
+    @contextmanager
+    def writer(self):
+        """
+        Connessione di scrittura in una transazione: commit all'uscita,
+        rollback in caso di eccezione. Un solo scrittore alla volta.
+        """
+        conn = self._ensure_writer()
+        with self._writer_lock:
+            with conn:
+                yield conn
+
+    def close(self):
+        self._closed = True
+        while True:
+            try:
+                self._idle_readers.get_nowait().close()
+            except queue.Empty:
+                break
+        with self._writer_lock:
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+
+    # === Query tipizzate ===
+    def get_playlists(self) -> List[Playlist]:
+        with self.reader() as conn:
+            return [Playlist(*row) for row in conn.execute(queries.GET_PLAYLISTS_QUERY)]
+
+    def count_playlist_songs(self, playlist_id: int) -> int:
+        with self.reader() as conn:
+            return conn.execute(queries.COUNT_SONGS_FROM_PLAYLIST_QUERY, (playlist_id,)).fetchone()[0]
+
+    def get_playlist_songs_page(self, playlist_id: int, after_song_id: str = '', limit: int = None) -> List[SongRow]:
+        """Pagina di canzoni della playlist successive a after_song_id (ordine per song_id)."""
+        with self.reader() as conn:
+            cursor = conn.cursor()
+            cursor.row_factory = _song_row_factory
+            cursor.execute(queries.GET_SONGS_FROM_PLAYLIST_PAGE_QUERY,
+                           (playlist_id, after_song_id, limit or settings.SONG_PAGE_SIZE))
+            return cursor.fetchall()
+
+    def get_playlist_song_id_at(self, playlist_id: int, offset: int, from_song_id: Optional[str] = '',
+                                backward: bool = False) -> Optional[str]:
+        """
+        song_id che viene offset righe dopo from_song_id nella playlist (ordine
+        per song_id), o prima con backward; all'indietro from_song_id None
+        parte dalla fine. None se la riga non esiste.
+        """
+        if not backward:
+            query, params = queries.GET_PLAYLIST_SONG_ID_AFTER_QUERY, (playlist_id, from_song_id, offset)
+        elif from_song_id is None:
+            query, params = queries.GET_PLAYLIST_SONG_ID_FROM_END_QUERY, (playlist_id, offset)
+        else:
+            query, params = queries.GET_PLAYLIST_SONG_ID_BEFORE_QUERY, (playlist_id, from_song_id, offset)
+        with self.reader() as conn:
+            row = conn.execute(query, params).fetchone()
+            return row[0] if row else None
+
+    def get_song(self, song_id: str) -> Optional[SongRow]:
+        with self.reader() as conn:
+            cursor = conn.cursor()
+            cursor.row_factory = _song_row_factory
+            return cursor.execute(queries.GET_SONG_QUERY, (song_id,)).fetchone()
+
+    def get_playlist_rowids(self, playlist_id: int) -> array:
+        """rowid delle canzoni della playlist, nello stesso ordine delle pagine, in un array('q')."""
+        with self.reader() as conn:
+            cursor = conn.execute(queries.GET_PLAYLIST_ROWIDS_QUERY, (playlist_id,))
+            return array('q', (row[0] for row in cursor))
+
+    def iter_playlist_paths(self, playlist_id: int, after_song_id: str = '',
+                            page_size: int = None) -> Iterator[Optional[str]]:
+        """
+        mp4_path delle canzoni della playlist successive a after_song_id, nello
+        stesso ordine delle pagine. Letti a pagine di soli percorsi: in memoria
+        c'è una pagina alla volta e la connessione torna al pool tra una
+        pagina e l'altra.
+        """
+        page_size = page_size or settings.AVAILABILITY_PAGE_SIZE
+        after = after_song_id
+        while True:
+            with self.reader() as conn:
+                page = conn.execute(queries.GET_PLAYLIST_PATHS_PAGE_QUERY, (playlist_id, after, page_size)).fetchall()
+            for _, path in page:
+                yield path
+            if len(page) < page_size:
+                return
+            after = page[-1][0]
+
+    def get_tracks(self, rowids) -> Dict[int, Track]:
+        """Track per rowid; i rowid non più presenti nel database mancano dal risultato."""
+        rowids = list(rowids)
+        if not rowids:
+            return {}
+        query = queries.GET_TRACKS_BY_ROWID_QUERY.format(placeholders=", ".join("?" * len(rowids)))
+        with self.reader() as conn:
+            return {row[0]: Track(*row) for row in conn.execute(query, rowids)}
+
+    def search_songs(self, match_expression: str, limit: int, is_stale=None) -> List[SongRow]:
+        """
+        Ricerca full-text. is_stale, se dato, viene chiamata periodicamente da
+        SQLite: se restituisce True la query viene interrotta (OperationalError).
+        """
+        with self.reader() as conn:
+            if is_stale is not None:
+                conn.set_progress_handler(is_stale, settings.SEARCH_PROGRESS_STEPS)
+            try:
+                cursor = conn.cursor()
+                cursor.row_factory = _song_row_factory
+                return cursor.execute(queries.SEARCH_SONGS_QUERY, (match_expression, limit)).fetchall()
+            finally:
+                if is_stale is not None:
+                    conn.set_progress_handler(None, 0)
+
+
+_repository = None
+_repository_lock = threading.Lock()
+
+
+def get_repository():
+    """Restituisce l'istanza condivisa del Repository."""
+    global _repository
+    with _repository_lock:
+        if _repository is None:
+            _repository = Repository()
+        return _repository
@@ -0,0 +1,404 @@
+import os
+import sys
+import time
+import errno
+import ctypes
+import select
+import struct
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from app import settings
+from app import resources
+
+
+# estensioni indicizzate e relativo tipo di media
+MEDIA_KINDS = {
+    '.mp4': 'mp4',
+    '.jpg': 'cover',
+    '.jpeg': 'cover',
+    '.png': 'cover',
+}
+
+SONG_PATH_COLUMNS = ('mp4_path', 'copertina_640_path', 'copertina_300_path', 'copertina_64_path')
+
+
+def create_media_tables(conn):
+    """Crea le tabelle dell'indice dei file su disco se non esistono."""
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS media_dirs (
+        path TEXT PRIMARY KEY,
+        parent TEXT,
+        mtime_ns INTEGER NOT NULL
+    )
+    """)
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS media_files (
+        path TEXT PRIMARY KEY,
+        dir TEXT NOT NULL,
+        kind TEXT NOT NULL,
+        size INTEGER NOT NULL,
+        mtime_ns INTEGER NOT NULL
+    )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_media_files_dir ON media_files (dir)")
+
+
+def _list_dir(path, known_mtime, known_children, force):
+    """
+    Visita una directory (eseguita nel pool di thread).
+
+    Se la mtime della directory non è cambiata (nessun file aggiunto, rimosso
+    o rinominato) i file non vengono riletti e si riusano le sottodirectory
+    già note.
+
+    Returns:
+        (path, mtime_ns, files, subdirs): files è None se la directory non è
+        stata riletta, mtime_ns è None se la directory non esiste più.
+    """
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except OSError:
+        return path, None, None, []
+    if not force and mtime == known_mtime:
+        return path, mtime, None, known_children
+
+    files = {}
+    subdirs = []
+    try:
+        with os.scandir(path) as entries:
+            for entry in entries:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        subdirs.append(entry.path)
+                        continue
+                    kind = MEDIA_KINDS.get(os.path.splitext(entry.name)[1].lower())
+                    if kind is None:
+                        continue
+                    st = entry.stat()
+                    files[entry.path] = (kind, st.st_size, st.st_mtime_ns)
+                except OSError:
+                    continue
+    except OSError as e:
+        print(f"Impossibile leggere la directory {path}: {e}")
+        return path, None, None, []
+    return path, mtime, files, subdirs
+
+
+class LibraryScanner:
+    """
+    Indicizza i file di MP4_DIR e COPERTINE_DIR (dimensione e mtime) nelle
+    tabelle media_dirs e media_files e li riconcilia con i percorsi della
+    tabella 'songs'.
+
+    Le scansioni successive rileggono solo le directory la cui mtime è
+    cambiata; watch() mantiene l'indice aggiornato con inotify (Linux) o, in
+    alternativa, con scansioni incrementali periodiche.
+    """
+
+    def __init__(self, repository, roots=None, workers=None):
+        self.repository = repository
+        self.roots = [os.path.abspath(r) for r in (roots or (resources.MP4_DIR, resources.COPERTINE_DIR))]
+        self.workers = workers or settings.SCAN_WORKERS
+        with self.repository.writer() as conn:
+            create_media_tables(conn)
+
+    # === Scansione ===
+    def _load_index(self):
+        with self.repository.reader() as conn:
+            dirs = {path: (parent, mtime) for path, parent, mtime
+                    in conn.execute("SELECT path, parent, mtime_ns FROM media_dirs")}
+            files = {}
+            for path, directory, kind, size, mtime in conn.execute(
+                    "SELECT path, dir, kind, size, mtime_ns FROM media_files"):
+                files.setdefault(directory, {})[path] = (kind, size, mtime)
+        children = {}
+        for path, (parent, _) in dirs.items():
+            children.setdefault(parent, []).append(path)
+        return dirs, files, children
+
+    def _walk(self, dirs, children, force_dirs):
+        """Visita in parallelo tutte le directory sotto le radici."""
+        results = []
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="scan") as pool:
+            def submit(path, parent):
+                known_mtime = dirs.get(path, (None, None))[1]
+                future = pool.submit(_list_dir, path, known_mtime, children.get(path, []), path in force_dirs)
+                pending[future] = parent
+
+            pending = {}
+            for root in self.roots:
+                submit(root, None)
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    parent = pending.pop(future)
+                    path, mtime, files, subdirs = future.result()
+                    if mtime is None:
+                        continue
+                    results.append((path, parent, mtime, files))
+                    for subdir in subdirs:
+                        submit(subdir, path)
+        return results
+
+    def scan(self, force_dirs=(), relink_moved=True):
+        """
+        Esegue una scansione incrementale.
+
+        Args:
+            force_dirs: directory da rileggere anche se la loro mtime non è cambiata
+                (ad esempio quelle segnalate da inotify per file modificati).
+            relink_moved: aggiorna i percorsi in 'songs' per i file spostati.
+
+        Returns:
+            Un dizionario con le liste new, moved (coppie vecchio/nuovo) e missing,
+            i conteggi delle directory rilette/saltate, le canzoni con file
+            mancanti e la durata.
+        """
+        start = time.perf_counter()
+        force_dirs = set(force_dirs)
+        dirs, files_by_dir, children = self._load_index()
+        visited = self._walk(dirs, children, force_dirs)
+
+        new, changed, removed = {}, {}, {}
+        dir_rows = []
+        listed = skipped = 0
+        seen_dirs = set()
+        for path, parent, mtime, files in visited:
+            seen_dirs.add(path)
+            dir_rows.append((path, parent, mtime))
+            if files is None:
+                skipped += 1
+                continue
+            listed += 1
+            old_files = files_by_dir.get(path, {})
+            for file_path, info in files.items():
+                old = old_files.get(file_path)
+                if old is None:
+                    new[file_path] = (path,) + info
+                elif old != info:
+                    changed[file_path] = (path,) + info
+            for file_path, info in old_files.items():
+                if file_path not in files:
+                    removed[file_path] = info
+
+        gone_dirs = [path for path in dirs if path not in seen_dirs]
+        for path in gone_dirs:
+            removed.update(files_by_dir.get(path, {}))
+
+        # file spostati: stesso nome e stessa dimensione, spariti da un punto e comparsi in un altro
+        by_name = {}
+        for file_path, (kind, size, _) in removed.items():
+            by_name.setdefault((os.path.basename(file_path), size), []).append(file_path)
+        moved = []
+        for file_path, (_, kind, size, _) in new.items():
+            candidates = by_name.get((os.path.basename(file_path), size))
+            if candidates:
+                moved.append((candidates.pop(), file_path))
+        moved_from = {old for old, _ in moved}
+        moved_to = {new_path for _, new_path in moved}
+
+        with self.repository.writer() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO media_dirs (path, parent, mtime_ns) VALUES (?, ?, ?)", dir_rows
+            )
+            conn.executemany("DELETE FROM media_dirs WHERE path = ?", ((p,) for p in gone_dirs))
+            conn.executemany("DELETE FROM media_files WHERE path = ?", ((p,) for p in removed))
+            conn.executemany(
+                "INSERT OR REPLACE INTO media_files (path, dir, kind, size, mtime_ns) VALUES (?, ?, ?, ?, ?)",
+                ((p,) + info for p, info in list(new.items()) + list(changed.items()))
+            )
+            if relink_moved and moved:
+                self._relink_moved(conn, moved)
+            changed_audio = [p for p, info in changed.items() if info[1] == 'mp4']
+            if changed_audio:
+                self._forget_analysis(conn, changed_audio)
+            songs_missing = self._songs_missing_media(conn)
+
+        report = {
+            'new': sorted(p for p in new if p not in moved_to),
+            'moved': moved,
+            'missing': sorted(p for p in removed if p not in moved_from),
+            'changed': sorted(changed),
+            'dirs_listed': listed,
+            'dirs_skipped': skipped,
+            'songs_missing_mp4': songs_missing,
+            'seconds': time.perf_counter() - start,
+        }
+        return report
+
+    @staticmethod
+    def _relink_moved(conn, moved):
+        """
+        Aggiorna i percorsi in 'songs' dei file spostati. Le colonne dei
+        percorsi non sono indicizzate: una UPDATE per colonna con le coppie in
+        una tabella temporanea, quindi una sola scansione di 'songs' per colonna
+        qualunque sia il numero di file spostati.
+        """
+        conn.execute("CREATE TEMP TABLE IF NOT EXISTS moved_media (old TEXT PRIMARY KEY, new TEXT NOT NULL)")
+        conn.execute("DELETE FROM moved_media")
+        conn.executemany("INSERT OR REPLACE INTO moved_media (old, new) VALUES (?, ?)", moved)
+        for column in SONG_PATH_COLUMNS:
+            conn.execute(f"""
+                UPDATE songs SET {column} = (SELECT new FROM moved_media WHERE old = songs.{column})
+                WHERE {column} IN (SELECT old FROM moved_media)
+            """)
+        conn.execute("DELETE FROM moved_media")
+
+    @staticmethod
+    def _forget_analysis(conn, mp4_paths):
+        """
+        Un'mp4 riscritta sul posto va rianalizzata: azzera la loudness e
+        cancella la forma d'onda delle canzoni che la usano (run_cmd loudness
+        e run_cmd waveforms le ricalcolano).
+        """
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(songs)")}
+        if 'mp4_path' not in columns:
+            return
+        conn.execute("CREATE TEMP TABLE IF NOT EXISTS changed_media (path TEXT PRIMARY KEY)")
+        conn.execute("DELETE FROM changed_media")
+        conn.executemany("INSERT OR IGNORE INTO changed_media (path) VALUES (?)", ((p,) for p in mp4_paths))
+        if conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'song_waveforms'").fetchone():
+            conn.execute("""
+                DELETE FROM song_waveforms WHERE song_id IN (
+                    SELECT song_id FROM songs WHERE mp4_path IN (SELECT path FROM changed_media)
+                )
+            """)
+        if 'loudness_lufs' in columns:
+            conn.execute("""
+                UPDATE songs SET loudness_lufs = NULL, sample_peak = NULL, gain_db = NULL
+                WHERE mp4_path IN (SELECT path FROM changed_media)
+            """)
+        conn.execute("DELETE FROM changed_media")
+
+    def _songs_missing_media(self, conn):
+        """song_id le cui mp4 sotto le radici scansionate non sono presenti su disco."""
+        if conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'songs'").fetchone() is None:
+            return []
+        clauses = " OR ".join("s.mp4_path LIKE ? ESCAPE '\\'" for _ in self.roots)
+        params = [r.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + os.sep + '%'
+                  for r in self.roots]
+        return [row[0] for row in conn.execute(f"""
+            SELECT s.song_id
+            FROM songs s
+            LEFT JOIN media_files m ON m.path = s.mp4_path
+            WHERE m.path IS NULL AND ({clauses})
+        """, params)]
+
+    # === Watch ===
+    def watch(self, on_report=None, stop_event=None):
+        """
+        Mantiene l'indice aggiornato finché stop_event non viene impostato.
+        on_report(report) viene chiamata dopo ogni scansione che trova modifiche.
+        """
+        stop_event = stop_event or threading.Event()
+        report = self.scan()
+        if on_report and _has_changes(report):
+            on_report(report)
+
+        inotify = _Inotify.create()
+        if inotify is None:
+            print("inotify non disponibile, uso scansioni incrementali periodiche")
+            while not stop_event.wait(settings.SCAN_POLL_INTERVAL):
+                report = self.scan()
+                if on_report and _has_changes(report):
+                    on_report(report)
+            return
+
+        try:
+            self._watch_all_dirs(inotify)
+            while not stop_event.is_set():
+                dirty = inotify.read_dirty_dirs(timeout=settings.SCAN_POLL_INTERVAL)
+                if not dirty:
+                    continue
+                # raccoglie gli eventi di una raffica (es. copia di un album) in una sola scansione
+                deadline = time.monotonic() + settings.SCAN_WATCH_DEBOUNCE
+                while time.monotonic() < deadline:
+                    dirty |= inotify.read_dirty_dirs(timeout=max(0.0, deadline - time.monotonic()))
+                report = self.scan(force_dirs=dirty)
+                self._watch_all_dirs(inotify)
+                if on_report and _has_changes(report):
+                    on_report(report)
+        finally:
+            inotify.close()
+
+    def _watch_all_dirs(self, inotify):
+        with self.repository.reader() as conn:
+            for (path,) in conn.execute("SELECT path FROM media_dirs"):
+                inotify.add(path)
+
+
+def _has_changes(report):
+    return bool(report['new'] or report['moved'] or report['missing'] or report['changed'])
+
+
+class _Inotify:
+    """Binding minimo a inotify via ctypes (solo Linux)."""
+
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_FROM = 0x00000040
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_DELETE = 0x00000200
+    IN_DELETE_SELF = 0x00000400
+    IN_NONBLOCK = 0o4000
+    IN_CLOEXEC = 0o2000000
+    MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF
+    EVENT_HEADER = struct.Struct('iIII')
+
+    def __init__(self, libc, fd):
+        self.libc = libc
+        self.fd = fd
+        self.watches = {}  # wd -> path
+        self.paths = set()
+
+    @classmethod
+    def create(cls):
+        if not sys.platform.startswith('linux'):
+            return None
+        try:
+            libc = ctypes.CDLL(None, use_errno=True)
+            fd = libc.inotify_init1(cls.IN_NONBLOCK | cls.IN_CLOEXEC)
+        except (OSError, AttributeError):
+            return None
+        if fd < 0:
+            return None
+        return cls(libc, fd)
+
+    def add(self, path):
+        if path in self.paths:
+            return
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(path), self.MASK)
+        if wd < 0:
+            err = ctypes.get_errno()
+            if err == errno.ENOSPC:
+                print("Limite di watch inotify raggiunto (fs.inotify.max_user_watches)")
+            return
+        self.watches[wd] = path
+        self.paths.add(path)
+
+    def read_dirty_dirs(self, timeout):
+        """Restituisce le directory con eventi arrivati entro timeout secondi."""
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return set()
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return set()
+        dirty = set()
+        offset = 0
+        while offset + self.EVENT_HEADER.size <= len(data):
+            wd, mask, _, name_len = self.EVENT_HEADER.unpack_from(data, offset)
+            offset += self.EVENT_HEADER.size + name_len
+            path = self.watches.get(wd)
+            if path is None:
+                continue
+            dirty.add(path)
+            if mask & self.IN_DELETE_SELF:
+                del self.watches[wd]
+                self.paths.discard(path)
+        return dirty
+
+    def close(self):
+        os.close(self.fd)
@@ -0,0 +1,72 @@
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from app import settings
+
+
+def build_match_expression(text):
+    """
+    Converte il testo digitato in un'espressione MATCH FTS5: ogni parola
+    diventa una stringa tra virgolette (niente sintassi FTS5 dall'utente) e
+    le parole sono in AND. Con il tokenizer trigram ogni parola trova anche
+    sottostringhe, purché lunga almeno 3 caratteri.
+    """
+    words = [w for w in text.split() if len(w) >= settings.SEARCH_MIN_CHARS]
+    return " ".join('"' + w.replace('"', '""') + '"' for w in words)
+
+
+def search_songs(repository, text, limit=None, is_stale=None):
+    """Restituisce le SongRow che corrispondono al testo."""
+    expression = build_match_expression(text)
+    if not expression:
+        return []
+    return repository.search_songs(expression, limit or settings.SEARCH_LIMIT, is_stale)
+
+
+class SongSearcher:
+    """
+    Esegue le ricerche su un thread dedicato, con una connessione in lettura
+    del Repository. Una nuova ricerca rende obsolete quelle precedenti: quelle ancora
+    in coda vengono saltate e quella in esecuzione viene interrotta dal
+    progress handler di SQLite.
+    """
+
+    def __init__(self, repository):
+        self.repository = repository
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="search")
+        self._lock = threading.Lock()
+        self._generation = 0
+
+    def _run(self, generation, text):
+        if generation != self._generation:
+            return None
+        # ogni N istruzioni della VM SQLite controlla se la ricerca è ancora attuale:
+        # un valore vero interrompe la query
+        is_stale = lambda: generation != self._generation
+        try:
+            return search_songs(self.repository, text, is_stale=is_stale)
+        except sqlite3.OperationalError as e:
+            if generation != self._generation:
+                # interrotta da una ricerca più recente
+                return None
+            print(f"Errore nella ricerca '{text}': {e}")
+            return []
+
+    def search(self, text):
+        """
+        Accoda una ricerca.
+
+        Returns:
+            Un Future con la lista di righe, oppure None se la ricerca è
+            stata superata da una più recente.
+        """
+        with self._lock:
+            self._generation += 1
+            generation = self._generation
+        return self.executor.submit(self._run, generation, text)
+
+    def shutdown(self):
+        with self._lock:
+            self._generation += 1
+        self.executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,208 @@
+import os
+import sqlite3
+from typing import List, Optional
+
+import numpy as np
+
+from app import settings
+from app.utils.features import DTYPE, create_feature_tables, feature_dim, unpack_many
+
+
+def _normalize(X):
+    norms = np.linalg.norm(X, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+    return (X / norms).astype(DTYPE)
+
+
+def _index_paths(path):
+    return f"{path}.vectors.npy", f"{path}.meta.npz"
+
+
+class SimilarityIndex:
+    """
+    Indice dei vicini per similarità coseno sui vettori delle canzoni.
+
+    build() normalizza i vettori di song_features e li scrive, raggruppati
+    per cluster (liste IVF sui centroidi del clustering delle playlist), in
+    un file .npy che load() apre con mmap: si leggono dal disco solo le liste
+    interrogate e le pagine restano nella page cache tra una query e l'altra.
+    Una query confronta il vettore con i centroidi e visita le liste più
+    vicine (almeno SIMILARITY_PROBES) a blocchi di SIMILARITY_BLOCK righe;
+    senza clustering la ricerca è esatta su tutta la libreria.
+
+    I risultati sono rowid della tabella songs, gli stessi della PlayQueue.
+    """
+
+    def __init__(self, vectors, rowids, offsets, centroids, lookup_rowids, lookup_positions, probes=None):
+        self.vectors = vectors  # (n, dim) normalizzati, ordinati per lista
+        self.rowids = rowids  # rowid della canzone di ogni riga di vectors
+        self.offsets = offsets  # righe [offsets[i], offsets[i + 1]) della lista i
+        self.centroids = centroids  # (liste, dim) normalizzati, vuoto senza clustering
+        self.lookup_rowids = lookup_rowids  # rowid ordinati, per trovare la riga di una canzone
+        self.lookup_positions = lookup_positions
+        self.probes = probes or settings.SIMILARITY_PROBES
+
+    def __len__(self):
+        return len(self.rowids)
+
+    # === Costruzione ===
+    @staticmethod
+    def _chunks(conn, chunk_rows):
+        """Blocchi (rowid della canzone, cluster, vettori) delle canzoni con un vettore."""
+        dim = feature_dim(conn)
+        after = 0
+        while True:
+            rows = conn.execute("""
+                SELECT f.rowid, s.rowid, f.cluster, f.vector
+                FROM song_features f
+                JOIN songs s ON s.song_id = f.song_id
+                WHERE f.rowid > ?
+                ORDER BY f.rowid
+                LIMIT ?
+                """, (after, chunk_rows)).fetchall()
+            if not rows:
+                return
+            after = rows[-1][0]
+            yield ([row[1] for row in rows], [row[2] for row in rows], unpack_many([row[3] for row in rows], dim))
+
+    @classmethod
+    def build(cls, db_path, path=None, chunk_rows=None):
+        """
+        Crea l'indice dal database leggendo CLUSTER_CHUNK_ROWS vettori per
+        volta (due passate nella stessa transazione di lettura: liste e poi
+        scrittura). I file vengono scritti accanto a quelli finali e
+        rinominati, così un player che sta usando l'indice vecchio non vede
+        mai un file a metà.
+
+        Returns:
+            Il numero di canzoni indicizzate.
+        """
+        conn = sqlite3.connect(db_path, timeout=settings.DB_BUSY_TIMEOUT, isolation_level=None)
+        try:
+            create_feature_tables(conn)
+            conn.execute("BEGIN")
+            return cls._build(conn, path or settings.SIMILARITY_INDEX_PATH,
+                              chunk_rows or settings.CLUSTER_CHUNK_ROWS)
+        finally:
+            conn.close()
+
+    @classmethod
+    def _build(cls, conn, path, chunk_rows):
+        dim = feature_dim(conn)
+        if dim is None:
+            return 0
+        blobs = [row[0] for row in conn.execute("SELECT centroid FROM cluster_centroids ORDER BY cluster")]
+        centroids = _normalize(unpack_many(blobs, dim)) if blobs else np.empty((0, dim), dtype=DTYPE)
+
+        # prima passata: lista di ogni canzone (le canzoni non ancora assegnate vanno al centroide più vicino)
+        lists, rowids = [], []
+        for chunk_rowids, clusters, X in cls._chunks(conn, chunk_rows):
+            labels = np.array([-1 if c is None else c for c in clusters], dtype=np.int64)
+            if len(centroids):
+                unassigned = (labels < 0) | (labels >= len(centroids))
+                if unassigned.any():
+                    labels[unassigned] = np.argmax(_normalize(X[unassigned]) @ centroids.T, axis=1)
+            else:
+                labels[:] = 0
+            lists.append(labels)
+            rowids.append(np.array(chunk_rowids, dtype=np.int64))
+        labels = np.concatenate(lists) if lists else np.empty(0, dtype=np.int64)
+        song_rowids = np.concatenate(rowids) if rowids else np.empty(0, dtype=np.int64)
+        del lists, rowids
+
+        order = np.argsort(labels, kind='stable')
+        destination = np.empty_like(order)
+        destination[order] = np.arange(len(order))
+        offsets = np.zeros(max(1, len(centroids)) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum(np.bincount(labels, minlength=max(1, len(centroids))))
+
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        vectors_path, meta_path = _index_paths(path)
+        tmp_suffix = f".{os.getpid()}.tmp"
+        # seconda passata: ogni blocco normalizzato viene scritto nelle righe della sua lista
+        vectors = np.lib.format.open_memmap(vectors_path + tmp_suffix, mode='w+', dtype=DTYPE,
+                                            shape=(len(order), dim))
+        start = 0
+        for _, _, X in cls._chunks(conn, chunk_rows):
+            vectors[destination[start:start + len(X)]] = _normalize(X)
+            start += len(X)
+        vectors.flush()
+        del vectors
+
+        lookup = np.argsort(song_rowids)
+        with open(meta_path + tmp_suffix, 'wb') as f:
+            np.savez(f, rowids=song_rowids[order], offsets=offsets, centroids=centroids,
+                     lookup_rowids=song_rowids[lookup], lookup_positions=destination[lookup])
+        os.replace(vectors_path + tmp_suffix, vectors_path)
+        os.replace(meta_path + tmp_suffix, meta_path)
+        return len(order)
+
+    @classmethod
+    def load(cls, path=None) -> Optional['SimilarityIndex']:
+        """Apre l'indice con mmap; None se non è stato ancora creato (run_cmd similarity-index)."""
+        vectors_path, meta_path = _index_paths(path or settings.SIMILARITY_INDEX_PATH)
+        if not (os.path.exists(vectors_path) and os.path.exists(meta_path)):
+            return None
+        vectors = np.load(vectors_path, mmap_mode='r')
+        with np.load(meta_path) as meta:
+            arrays = {name: meta[name] for name in meta.files}
+        if len(arrays['rowids']) != len(vectors):
+            print(f"Indice di similarità incoerente in {vectors_path}: va ricreato")
+            return None
+        return cls(vectors, arrays['rowids'], arrays['offsets'], arrays['centroids'],
+                   arrays['lookup_rowids'], arrays['lookup_positions'])
+
+    # === Query ===
+    def position_of(self, rowid):
+        i = int(np.searchsorted(self.lookup_rowids, rowid))
+        if i < len(self.lookup_rowids) and self.lookup_rowids[i] == rowid:
+            return int(self.lookup_positions[i])
+        return None
+
+    def neighbors(self, rowid, k=10, exclude=()) -> List[int]:
+        """rowid delle k canzoni più simili a rowid (esclusa lei e quelle in exclude)."""
+        position = self.position_of(rowid)
+        if position is None:
+            return []
+        excluded = set(exclude)
+        excluded.add(rowid)
+        return self.search(self.vectors[position], k, excluded)
+
+    def search(self, vector, k=10, exclude=()) -> List[int]:
+        """rowid delle k canzoni più simili al vettore, in ordine di similarità."""
+        query = np.asarray(vector, dtype=DTYPE)
+        query = query / (np.linalg.norm(query) or 1)
+        wanted = k + len(exclude)
+        if len(self.centroids):
+            lists = np.argsort(-(self.centroids @ query))
+        else:
+            lists = np.zeros(1, dtype=np.int64)
+
+        scores, positions = [], []
+        visited = found = 0
+        for index in lists:
+            # almeno `probes` liste, poi altre solo finché i candidati non bastano
+            if visited >= self.probes and found >= wanted:
+                break
+            visited += 1
+            start, end = int(self.offsets[index]), int(self.offsets[index + 1])
+            for block_start in range(start, end, settings.SIMILARITY_BLOCK):
+                block_scores = self.vectors[block_start:min(end, block_start + settings.SIMILARITY_BLOCK)] @ query
+                top = np.arange(len(block_scores))
+                if len(block_scores) > wanted:
+                    top = np.argpartition(-block_scores, wanted - 1)[:wanted]
+                scores.append(block_scores[top])
+                positions.append(top + block_start)
+                found += len(top)
+        if not scores:
+            return []
+        scores = np.concatenate(scores)
+        positions = np.concatenate(positions)
+        result = []
+        for position in positions[np.argsort(-scores, kind='stable')]:
+            rowid = int(self.rowids[position])
+            if rowid not in exclude:
+                result.append(rowid)
+                if len(result) == k:
+                    break
+        return result
@@ -0,0 +1,144 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+import numpy as np
+import snappy
+
+from app import settings
+from app.utils.audio import decode_pcm, decoder_available
+
+
+def create_waveform_table(conn):
+    """Crea la tabella delle forme d'onda (picchi compressi con snappy) se non esiste."""
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS song_waveforms (
+        song_id TEXT PRIMARY KEY,
+        peaks BLOB NOT NULL
+    )
+    """)
+
+
+def compute_peaks(chunks, rate, bins=None):
+    """
+    Picchi della forma d'onda da blocchi di PCM (campioni, canali): il
+    massimo del valore assoluto ogni 10 ms, ridotto a bins valori 0-255
+    relativi al picco della traccia.
+
+    Returns:
+        bytes lunghi bins (tutti zero per una traccia muta o vuota).
+    """
+    bins = bins or settings.WAVEFORM_BINS
+    window = rate // 100
+    windows = []
+    for pcm in chunks:
+        count = -(-len(pcm) // window)
+        padded = np.zeros((count * window, pcm.shape[1]), dtype=pcm.dtype)
+        padded[:len(pcm)] = pcm
+        windows.append(np.abs(padded).reshape(count, -1).max(axis=1))
+    fine = np.concatenate(windows) if windows else np.empty(0, dtype=np.float32)
+    if len(fine) == 0:
+        return bytes(bins)
+    # ogni bin è il massimo delle sue finestre (una sola se la traccia ne ha meno di bins)
+    peaks = np.maximum.reduceat(fine, (np.arange(bins) * len(fine)) // bins)
+    top = peaks.max()
+    if top <= 0:
+        return bytes(bins)
+    return np.round(peaks / top * 255).astype(np.uint8).tobytes()
+
+
+def extract_peaks(path, bins=None):
+    """Decodifica il file a WAVEFORM_SAMPLE_RATE mono e ne calcola i picchi (vedi compute_peaks)."""
+    rate = settings.WAVEFORM_SAMPLE_RATE
+    return compute_peaks(decode_pcm(path, rate, 1, rate * settings.LOUDNESS_CHUNK_SECONDS), rate, bins)
+
+
+def pack_peaks(peaks):
+    return snappy.compress(peaks)
+
+
+def unpack_peaks(blob):
+    return snappy.decompress(blob)
+
+
+class WaveformService:
+    """
+    Forme d'onda per la barra di avanzamento. Va creato in background
+    (all'avvio crea la tabella se manca).
+
+    read() legge e decomprime i picchi salvati (una riga per chiave primaria
+    e qualche centinaio di byte: si chiama anche dal thread di Tk). Le
+    tracce senza forma d'onda vengono analizzate su un thread dedicato solo
+    quando servono: prefetch() per la prossima traccia della coda, submit()
+    per quella che sta suonando. Il risultato viene salvato per le volte
+    successive; i file che ffmpeg non decodifica non vengono riprovati.
+    """
+
+    def __init__(self, repository):
+        self.repository = repository
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="waveform")
+        self._futures = {}  # song_id -> Future delle analisi in corso
+        self._failed = set()
+        self._lock = threading.Lock()
+        self._decoder = None  # controllato alla prima analisi
+        # qui e non alla prima read(): il thread di Tk non deve mai attendere il writer
+        with repository.writer() as conn:
+            create_waveform_table(conn)
+
+    def read(self, song_id) -> Optional[bytes]:
+        """Picchi salvati della canzone, None se non è ancora stata analizzata."""
+        with self.repository.reader() as conn:
+            row = conn.execute("SELECT peaks FROM song_waveforms WHERE song_id = ?", (song_id,)).fetchone()
+        return unpack_peaks(row[0]) if row else None
+
+    def load(self, track) -> Optional[bytes]:
+        """Picchi della Track, analizzando e salvando il file se mancano (eseguita nel worker)."""
+        peaks = self.read(track.song_id)
+        if peaks is not None or track.song_id in self._failed:
+            return peaks
+        if self._decoder is None:
+            self._decoder = decoder_available()
+        if not self._decoder or not track.mp4_path or not os.path.exists(track.mp4_path):
+            return None
+        try:
+            peaks = extract_peaks(track.mp4_path)
+        except Exception as e:
+            print(f"Errore nell'analisi della forma d'onda di {track.mp4_path}: {e}")
+            self._failed.add(track.song_id)
+            return None
+        with self.repository.writer() as conn:
+            conn.execute("INSERT OR REPLACE INTO song_waveforms (song_id, peaks) VALUES (?, ?)",
+                         (track.song_id, pack_peaks(peaks)))
+        return peaks
+
+    def submit(self, track):
+        """
+        Richiede i picchi della Track in background; richieste ripetute per
+        la stessa canzone condividono la stessa analisi.
+
+        Returns:
+            Un Future il cui risultato sono i picchi (o None).
+        """
+        with self._lock:
+            future = self._futures.get(track.song_id)
+            created = future is None
+            if created:
+                future = self.executor.submit(self.load, track)
+                self._futures[track.song_id] = future
+        if created:
+            # fuori dal lock: su un Future già concluso la callback viene chiamata subito
+            future.add_done_callback(lambda f, song_id=track.song_id: self._forget(song_id))
+        return future
+
+    def _forget(self, song_id):
+        with self._lock:
+            self._futures.pop(song_id, None)
+
+    def prefetch(self, track):
+        """Prepara la forma d'onda di una traccia in coda, così è pronta quando parte."""
+        if track is not None and track.song_id not in self._failed:
+            self.submit(track)
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
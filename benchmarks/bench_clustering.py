@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+Benchmark del clustering delle playlist (init_db.cluster_songs).
+
+Crea librerie sintetiche con vettori raggruppati attorno a centri noti e
+misura il clustering completo (durata, picco di memoria, purezza rispetto ai
+gruppi veri) e quello incrementale dopo l'arrivo dell'1% di canzoni nuove e
+il cambio di vettore dello 0,5% di quelle note. Esce con codice 1 se la
+memoria supera il budget o se le playlist non contengono ogni canzone
+esattamente una volta:
+
+    python -m benchmarks.bench_clustering --songs 100000 1000000
+"""
+import io
+import os
+import sys
+import time
+import sqlite3
+import argparse
+import tempfile
+import contextlib
+import tracemalloc
+
+import numpy as np
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from app.utils.features import create_feature_tables, store_features
+from init_db.cluster_songs import cluster_library
+from init_db.import_songs import create_songs_table
+
+DIM = 32
+TRUE_CLUSTERS = 50
+NEW_FRACTION = 0.01  # canzoni aggiunte dopo il primo clustering
+CHANGED_FRACTION = 0.005  # canzoni già note il cui vettore cambia gruppo prima dell'incrementale
+GENERATE_CHUNK = 100000
+MEMORY_BUDGET_MB = 128  # picco di memoria Python/NumPy, indipendente dalla dimensione della libreria
+
+
+def build_library(db_path, n_songs, rng):
+    """Canzoni e vettori sintetici; restituisce il gruppo vero di ogni canzone e il numero di quelle già note."""
+    centers = rng.uniform(-10, 10, size=(TRUE_CLUSTERS, DIM)).astype(np.float32)
+    truth = rng.integers(TRUE_CLUSTERS, size=n_songs).astype(np.int16)
+    known = int(n_songs * (1 - NEW_FRACTION))
+    conn = sqlite3.connect(db_path)
+    with contextlib.redirect_stdout(io.StringIO()):
+        create_songs_table(conn.cursor())
+    create_feature_tables(conn)
+    conn.executemany("INSERT INTO songs (song_id, title) VALUES (?, ?)",
+                     ((f"song{i}", f"Song {i}") for i in range(n_songs)))
+    for start in range(0, known, GENERATE_CHUNK):
+        end = min(known, start + GENERATE_CHUNK)
+        store_features(conn, [f"song{i}" for i in range(start, end)], feature_chunk(centers, truth[start:end], rng))
+    conn.commit()
+    conn.close()
+    return centers, truth, known
+
+
+def feature_chunk(centers, labels, rng):
+    return centers[labels] + rng.normal(size=(len(labels), DIM)).astype(np.float32)
+
+
+def purity(db_path, truth):
+    """
+    Quota delle canzoni che stanno nel cluster dove è in maggioranza il loro
+    gruppo vero, canzoni distinte nelle playlist e quelle in più di una.
+    """
+    conn = sqlite3.connect(db_path)
+    rows = conn.execute("SELECT song_id, cluster FROM song_features").fetchall()
+    playlist_songs = conn.execute("SELECT COUNT(DISTINCT song_id) FROM playlist_songs").fetchone()[0]
+    duplicated = conn.execute("SELECT COUNT(*) FROM (SELECT song_id FROM playlist_songs "
+                              "GROUP BY song_id HAVING COUNT(*) > 1)").fetchone()[0]
+    conn.close()
+    clusters = np.array([row[1] for row in rows], dtype=np.int64)
+    groups = truth[np.array([int(row[0][4:]) for row in rows])]
+    table = np.zeros((clusters.max() + 1, TRUE_CLUSTERS), dtype=np.int64)
+    np.add.at(table, (clusters, groups), 1)
+    return table.max(axis=1).sum() / len(rows), playlist_songs, duplicated
+
+
+def centroid_count(db_path):
+    conn = sqlite3.connect(db_path)
+    total = conn.execute("SELECT SUM(count) FROM cluster_centroids").fetchone()[0]
+    conn.close()
+    return total
+
+
+def run(n_songs, k):
+    rng = np.random.default_rng(7)
+    failed = False
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'cluster.db')
+        start = time.perf_counter()
+        centers, truth, known = build_library(db_path, n_songs, rng)
+        print(f"\n{n_songs} canzoni ({known} con vettore, dim {DIM}) create in {time.perf_counter() - start:.1f} s")
+
+        tracemalloc.start()
+        with contextlib.redirect_stdout(io.StringIO()):
+            full = cluster_library(db_path, k, incremental=False, seed=1)
+        peak_mb = tracemalloc.get_traced_memory()[1] / 2 ** 20
+        tracemalloc.stop()
+        score, in_playlists, _ = purity(db_path, truth)
+        print(f"completo:     {full['seconds']:6.2f} s  picco {peak_mb:6.1f} MiB  "
+              f"purezza {score:.3f}  {in_playlists} canzoni in {full['clusters']} playlist")
+        if peak_mb > MEMORY_BUDGET_MB:
+            print(f"ERRORE: picco di memoria oltre il budget di {MEMORY_BUDGET_MB} MiB")
+            failed = True
+        if in_playlists != known:
+            print(f"ERRORE: {known - in_playlists} canzoni non sono in nessuna playlist")
+            failed = True
+
+        # canzoni nuove e canzoni note spostate in un altro gruppo vero
+        changed = rng.choice(known, size=int(known * CHANGED_FRACTION), replace=False)
+        truth[changed] = (truth[changed] + 1 + rng.integers(TRUE_CLUSTERS - 1, size=len(changed))) % TRUE_CLUSTERS
+        counted = centroid_count(db_path)
+        conn = sqlite3.connect(db_path)
+        store_features(conn, [f"song{i}" for i in range(known, n_songs)],
+                       feature_chunk(centers, truth[known:], rng))
+        store_features(conn, [f"song{i}" for i in changed], feature_chunk(centers, truth[changed], rng))
+        conn.commit()
+        conn.close()
+        with contextlib.redirect_stdout(io.StringIO()):
+            incremental = cluster_library(db_path, k, seed=1)
+        score, in_playlists, duplicated = purity(db_path, truth)
+        print(f"incrementale: {incremental['seconds']:6.2f} s  {incremental['assigned']} canzoni nuove o cambiate  "
+              f"purezza {score:.3f}  ({full['seconds'] / incremental['seconds']:.0f}x più veloce)")
+        if incremental['mode'] != 'incremental' or in_playlists != n_songs:
+            print(f"ERRORE: clustering incrementale non applicato ({incremental['mode']}, "
+                  f"{in_playlists} di {n_songs} canzoni in playlist)")
+            failed = True
+        if duplicated:
+            print(f"ERRORE: {duplicated} canzoni con il vettore cambiato sono in più di una playlist")
+            failed = True
+        # le canzoni cambiate lasciano il vecchio centroide ed entrano nel nuovo: il totale cresce delle sole nuove
+        if centroid_count(db_path) - counted != n_songs - known:
+            print(f"ERRORE: conteggi dei centroidi cresciuti di {centroid_count(db_path) - counted}, "
+                  f"attese {n_songs - known} canzoni nuove")
+            failed = True
+    return failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--songs', type=int, nargs='+', default=[100000, 1000000], help="dimensioni delle librerie")
+    parser.add_argument('-k', '--clusters', type=int, default=TRUE_CLUSTERS, help="cluster cercati")
+    args = parser.parse_args()
+
+    failed = [n for n in args.songs if run(n, args.clusters)]
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
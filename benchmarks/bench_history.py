@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Benchmark della cronologia degli ascolti (app.utils.history).
+
+Simula anni di ascolti su una libreria sintetica e misura:
+- il costo di record() per chi registra (player), che non tocca il database;
+- la durata delle transazioni di scrittura del buffer;
+- la classifica delle canzoni più ascoltate sugli aggregati di play_stats,
+  confrontata con la stessa classifica calcolata sulla cronologia completa.
+
+Esce con codice 1 se gli aggregati non coincidono con la cronologia:
+
+    python -m benchmarks.bench_history --years 5 --plays-per-day 60
+"""
+import io
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+import contextlib
+import statistics
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from app import settings
+from app.utils.history import EVENT_COMPLETE, EVENT_SKIP, EVENT_START, PlayHistory
+from app.utils.repository import Repository
+from benchmarks.synthetic import build_synthetic_library, song_id_of
+from init_db.import_songs import import_songs_from_json
+
+TOP_N = 50
+QUERY_RUNS = 20
+
+RAW_TOP_QUERY = """
+    SELECT song_id, SUM(event = 'start') AS starts
+    FROM play_history
+    GROUP BY song_id
+    ORDER BY starts DESC
+    LIMIT ?
+"""
+
+
+def simulated_events(n_songs, years, plays_per_day, rng):
+    """Eventi (song_id, evento, posizione, istante) in ordine di tempo; pochi brani molto ascoltati."""
+    start = time.time() - years * 365 * 86400
+    plays = int(years * 365 * plays_per_day)
+    for i in range(plays):
+        played_at = start + i * 86400 / plays_per_day
+        song_id = song_id_of(min(n_songs - 1, int(rng.paretovariate(1.2)) - 1))
+        yield song_id, EVENT_START, 0, played_at
+        if rng.random() < 0.3:
+            yield song_id, EVENT_SKIP, rng.randrange(1000, 120000), played_at + 30
+        else:
+            yield song_id, EVENT_COMPLETE, rng.randrange(120000, 360000), played_at + 200
+
+
+def timed_query(run):
+    timings = []
+    for _ in range(QUERY_RUNS):
+        start = time.perf_counter()
+        result = run()
+        timings.append((time.perf_counter() - start) * 1000)
+    return result, statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--songs', type=int, default=20000, help="canzoni della libreria sintetica")
+    parser.add_argument('--years', type=float, default=5, help="anni di cronologia simulati")
+    parser.add_argument('--plays-per-day', type=int, default=60, help="canzoni avviate al giorno")
+    args = parser.parse_args()
+
+    rng = random.Random(3)
+    with tempfile.TemporaryDirectory() as tmp:
+        library = build_synthetic_library(tmp, args.songs, n_playlists=0, max_files=0)
+        db_path = os.path.join(tmp, 'history.db')
+        with contextlib.redirect_stdout(io.StringIO()):
+            import_songs_from_json(db_path, library['songs_json'])
+        repository = Repository(db_path)
+        repository.prepare()
+        # intervallo enorme: le scritture avvengono solo con flush() esplicito e vengono misurate
+        history = PlayHistory(repository, flush_interval=3600, max_buffer=10 ** 9)
+        try:
+            events = list(simulated_events(args.songs, args.years, args.plays_per_day, rng))
+
+            batch = settings.HISTORY_MAX_BUFFER
+            record_s, flushes = 0.0, []
+            for first in range(0, len(events), batch):
+                start = time.perf_counter()
+                for event in events[first:first + batch]:
+                    history.record(*event)
+                record_s += time.perf_counter() - start
+                start = time.perf_counter()
+                history.flush()
+                flushes.append((time.perf_counter() - start) * 1000)
+            print(f"{len(events)} eventi ({args.years:g} anni, {args.plays_per_day} ascolti al giorno)")
+            print(f"record():  {record_s * 1e6 / len(events):.2f} µs per evento (nessun accesso al database)")
+            print(f"scrittura: {len(flushes)} transazioni da {batch} eventi, "
+                  f"p50 {statistics.median(flushes):.1f} ms, max {max(flushes):.1f} ms")
+
+            top, top_ms = timed_query(lambda: history.top_songs(TOP_N))
+            _, recent_ms = timed_query(lambda: history.top_songs(TOP_N, by='last_played'))
+            with repository.reader() as conn:
+                raw, raw_ms = timed_query(lambda: conn.execute(RAW_TOP_QUERY, (TOP_N,)).fetchall())
+            print(f"top {TOP_N} per avvii:      {top_ms:8.2f} ms sugli aggregati, "
+                  f"{raw_ms:8.2f} ms sulla cronologia ({raw_ms / top_ms:.0f}x)")
+            print(f"top {TOP_N} più recenti:    {recent_ms:8.2f} ms sugli aggregati")
+
+            # gli aggregati incrementali devono dare gli stessi conteggi della cronologia
+            expected = {song_id: starts for song_id, starts in raw}
+            mismatched = [s.song_id for s in top if s.song_id in expected and expected[s.song_id] != s.starts]
+            if [s.starts for s in top] != sorted(expected.values(), reverse=True) or mismatched:
+                print(f"ERRORE: aggregati diversi dalla cronologia ({mismatched[:5]})")
+                return 1
+        finally:
+            history.close()
+            repository.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Benchmark del costo della strumentazione (app.utils.metrics).
+
+Misura il costo per chiamata di span() e count() con le metriche
+disabilitate e abilitate, rispetto a un ciclo vuoto, come migliore di
+alcune ripetizioni. Esce con codice 1 se uno span disabilitato costa più
+del budget rispetto a un with nullcontext(), il context manager più
+semplice possibile:
+
+    python -m benchmarks.bench_metrics --calls 1000000
+"""
+import os
+import sys
+import time
+import argparse
+from contextlib import nullcontext
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from app.utils.metrics import Metrics
+
+DISABLED_BUDGET_RATIO = 1.5  # costo massimo di uno span disabilitato rispetto a with nullcontext()
+REPEATS = 5  # ripetizioni di ogni misura, si tiene la migliore
+
+
+def per_call_ns(func, calls):
+    best = float('inf')
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        func(calls)
+        best = min(best, time.perf_counter() - start)
+    return best * 1e9 / calls
+
+
+def bare(calls):
+    for _ in range(calls):
+        pass
+
+
+def null_contexts(calls):
+    for _ in range(calls):
+        with nullcontext():
+            pass
+
+
+def spans(metrics):
+    def run(calls):
+        for _ in range(calls):
+            with metrics.span('bench'):
+                pass
+    return run
+
+
+def counts(metrics):
+    def run(calls):
+        for _ in range(calls):
+            metrics.count('bench')
+    return run
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--calls', type=int, default=1000000, help="chiamate per misura")
+    args = parser.parse_args()
+
+    base = per_call_ns(bare, args.calls)
+    null = per_call_ns(null_contexts, args.calls) - base
+    print(f"with nullcontext()  {null:8.1f} ns/chiamata")
+    results = {}
+    for enabled in (False, True):
+        metrics = Metrics(enabled)
+        label = 'abilitate' if enabled else 'disabilitate'
+        results[enabled] = per_call_ns(spans(metrics), args.calls) - base
+        print(f"span  {label:<13} {results[enabled]:8.1f} ns/chiamata")
+        print(f"count {label:<13} {per_call_ns(counts(metrics), args.calls) - base:8.1f} ns/chiamata")
+
+    if results[False] > null * DISABLED_BUDGET_RATIO:
+        print(f"ERRORE: span disabilitato oltre {DISABLED_BUDGET_RATIO}x il costo di with nullcontext() "
+              f"({results[False]:.1f} contro {null:.1f} ns)")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
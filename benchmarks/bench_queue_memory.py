@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Benchmark di memoria della coda di riproduzione.
+
+Confronta la vecchia coda (lista di tuple di stringhe per ogni canzone) con
+la PlayQueue (solo rowid in un array('q')), misura lo stato dello shuffle a
+metà giro (quando gli scambi sparsi sono più numerosi) e su una libreria
+sintetica il tempo per costruire la coda di una playlist e per leggere le
+Track mentre la coda viene suonata:
+
+    python -m benchmarks.bench_queue_memory --sizes 100000 1000000
+"""
+import os
+import sys
+import time
+import sqlite3
+import argparse
+import tempfile
+import tracemalloc
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from app.music_player.play_queue import PlayQueue
+from app.music_player.shuffle import ShuffleBag
+from app.utils.repository import Repository
+from init_db.import_songs import create_songs_table
+from init_db.import_playlists import create_database_tables
+
+PLAYED_TRACKS = 2000  # Track lette in ordine per misurare la materializzazione
+
+
+def traced(build):
+    """Restituisce (oggetto, byte allocati, secondi) per la costruzione di build()."""
+    tracemalloc.start()
+    start = time.perf_counter()
+    obj = build()
+    seconds = time.perf_counter() - start
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return obj, size, seconds
+
+
+def tuple_queue(n):
+    # formato della vecchia coda: (file_path, titolo, cover_path, artists)
+    return [(f"/music/mp4/{i:07d}.mp4", f"Song title {i}", f"/music/cover/640/{i:07d}.jpg", f"Artist {i % 5000}")
+            for i in range(n)]
+
+
+def half_round_shuffle(n):
+    bag = ShuffleBag(n, seed=0)
+    for _ in range(n // 2):
+        bag.next()
+    return bag
+
+
+def build_library(db_path, n_songs):
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+    create_songs_table(cursor)
+    create_database_tables(cursor)
+    cursor.executemany(
+        "INSERT INTO songs (song_id, title, artists, mp4_path, copertina_640_path) VALUES (?, ?, ?, ?, ?)",
+        ((f"song{i:07d}", f"Song title {i}", f"Artist {i % 5000}", f"/music/mp4/{i:07d}.mp4",
+          f"/music/cover/640/{i:07d}.jpg") for i in range(n_songs)))
+    cursor.execute("INSERT INTO playlists (id, name) VALUES (1, 'bench')")
+    cursor.execute("INSERT INTO playlist_songs SELECT 1, song_id FROM songs")
+    conn.commit()
+    conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100000, 1000000], help="entry della coda")
+    parser.add_argument('--no-db', action='store_true', help="misura solo la memoria, senza libreria sintetica")
+    args = parser.parse_args()
+
+    for n in args.sizes:
+        _, tuples_bytes, tuples_s = traced(lambda: tuple_queue(n))
+        _, queue_bytes, queue_s = traced(lambda: PlayQueue(rowids=range(1, n + 1)))
+        print(f"{n:>9} entry  tuple: {tuples_bytes / 2**20:8.1f} MiB ({tuples_s:.2f} s)  "
+              f"PlayQueue: {queue_bytes / 2**20:6.1f} MiB ({queue_s:.2f} s)  "
+              f"rapporto {tuples_bytes / max(queue_bytes, 1):.0f}x")
+        _, shuffle_bytes, shuffle_s = traced(lambda: half_round_shuffle(n))
+        print(f"{'':>9}        shuffle a metà giro: {shuffle_bytes / 2**20:6.1f} MiB "
+              f"({shuffle_s / max(n // 2, 1) * 1e6:.1f} µs per estrazione)")
+        if args.no_db:
+            continue
+
+        with tempfile.TemporaryDirectory() as tmp:
+            db_path = os.path.join(tmp, 'bench.db')
+            build_library(db_path, n)
+            repository = Repository(db_path)
+            repository.prepare()
+            play_queue, _, build_s = traced(lambda: PlayQueue.for_playlist(repository, 1))
+            start = time.perf_counter()
+            for index in range(min(PLAYED_TRACKS, n)):
+                assert play_queue[index] is not None
+            per_track_us = (time.perf_counter() - start) / min(PLAYED_TRACKS, n) * 1e6
+            repository.close()
+        print(f"{'':>9}        coda della playlist dal DB in {build_s * 1000:.0f} ms, "
+              f"Track lette in {per_track_us:.1f} µs l'una")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
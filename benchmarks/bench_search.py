@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Benchmark della ricerca full-text (FTS5 trigram) su una libreria sintetica.
+
+Simula la digitazione carattere per carattere e misura il tempo di ogni
+query; l'obiettivo è restare sotto i 50 ms per tasto su 500k canzoni:
+
+    python -m benchmarks.bench_search --songs 500000
+"""
+import os
+import sys
+import time
+import random
+import sqlite3
+import argparse
+import tempfile
+import statistics
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from app.utils.search import search_songs
+from app.utils.repository import Repository
+from init_db.import_songs import create_songs_table
+
+WORDS = ("love night dream fire heart rain blue summer dance light shadow river "
+         "gold star road home wild sweet broken city moon ocean storm forever").split()
+ARTISTS = [f"{random.Random(i).choice(WORDS).title()} Band {i}" for i in range(5000)]
+TARGET_MS = 50
+
+
+def build_library(db_path, n_songs):
+    rng = random.Random(42)
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+    create_songs_table(cursor)
+    rows = (
+        (f"song{i}", " ".join(rng.choice(WORDS) for _ in range(rng.randint(1, 4))).title(),
+         rng.choice(ARTISTS), f"/mp4/{i}.mp4", None, None, None)
+        for i in range(n_songs)
+    )
+    cursor.executemany("INSERT INTO songs (song_id, title, artists, mp4_path, copertina_640_path, "
+                       "copertina_300_path, copertina_64_path) VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+    conn.commit()
+    conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--songs', type=int, default=500000, help="canzoni nella libreria sintetica")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        start = time.perf_counter()
+        db_path = os.path.join(tmp, 'bench.db')
+        build_library(db_path, args.songs)
+        repository = Repository(db_path)
+        repository.prepare()
+        print(f"libreria di {args.songs} canzoni creata in {time.perf_counter() - start:.1f} s")
+
+        timings = []
+        empty = []  # query complete senza risultati: indice di ricerca non funzionante
+        for query in ("broken heart", "summer dance band 42", "moon river", "storm"):
+            for end in range(1, len(query) + 1):
+                start = time.perf_counter()
+                rows = search_songs(repository, query[:end])
+                timings.append((time.perf_counter() - start) * 1000)
+            if not rows:
+                empty.append(query)
+        repository.close()
+
+    timings.sort()
+    p99 = timings[min(len(timings) - 1, int(len(timings) * 0.99))]
+    print(f"tasti={len(timings)}  media={statistics.mean(timings):.2f} ms  "
+          f"p50={statistics.median(timings):.2f} ms  p99={p99:.2f} ms  max={timings[-1]:.2f} ms")
+    if empty:
+        print(f"ERRORE: nessun risultato per {', '.join(repr(query) for query in empty)}")
+        return 1
+    if timings[-1] > TARGET_MS:
+        print(f"ATTENZIONE: superato l'obiettivo di {TARGET_MS} ms per tasto")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
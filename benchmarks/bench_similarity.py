@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Benchmark dell'indice di similarità della radio (app.utils.similarity).
+
+Crea una libreria sintetica, la raggruppa con il clustering delle playlist,
+costruisce l'indice e misura le query dei vicini sull'indice aperto con mmap:
+latenza (p50/p99) e recall@k rispetto alla ricerca esatta su tutti i
+vettori. Esce con codice 1 se il p99 supera il budget o la recall è troppo
+bassa:
+
+    python -m benchmarks.bench_similarity --songs 1000000
+"""
+import io
+import os
+import sys
+import time
+import sqlite3
+import argparse
+import tempfile
+import contextlib
+
+import numpy as np
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from app.utils.similarity import SimilarityIndex
+from benchmarks.bench_clustering import TRUE_CLUSTERS, build_library
+from init_db.cluster_songs import cluster_library
+
+K = 10
+QUERIES = 200
+P99_BUDGET_MS = 50
+MIN_RECALL = 0.9
+
+
+def exact_neighbors(index, position, k):
+    """Vicini esatti (posizioni nell'indice) confrontando il vettore con tutta la libreria."""
+    scores = index.vectors @ index.vectors[position]
+    scores[position] = -np.inf
+    top = np.argpartition(-scores, k)[:k]
+    return set(int(index.rowids[p]) for p in top)
+
+
+def run(n_songs, k):
+    rng = np.random.default_rng(11)
+    failed = False
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'library.db')
+        index_path = os.path.join(tmp, 'similarity')
+        start = time.perf_counter()
+        build_library(db_path, n_songs, rng)
+        with contextlib.redirect_stdout(io.StringIO()):
+            cluster_library(db_path, TRUE_CLUSTERS, incremental=False, seed=1)
+        print(f"\n{n_songs} canzoni create e raggruppate in {time.perf_counter() - start:.1f} s")
+
+        start = time.perf_counter()
+        count = SimilarityIndex.build(db_path, index_path)
+        size_mb = sum(os.path.getsize(os.path.join(tmp, name)) for name in os.listdir(tmp)
+                      if name.startswith('similarity.')) / 2 ** 20
+        print(f"indice:   {count} canzoni in {time.perf_counter() - start:.1f} s, {size_mb:.0f} MiB su disco")
+
+        index = SimilarityIndex.load(index_path)
+        conn = sqlite3.connect(db_path)
+        query_rowids = [row[0] for row in conn.execute(
+            "SELECT s.rowid FROM songs s JOIN song_features f ON f.song_id = s.song_id "
+            "ORDER BY random() LIMIT ?", (QUERIES,))]
+        conn.close()
+
+        index.neighbors(query_rowids[0], k)  # prima query: apertura delle pagine dell'indice
+        timings, hits = [], 0
+        for rowid in query_rowids:
+            started = time.perf_counter()
+            result = index.neighbors(rowid, k)
+            timings.append((time.perf_counter() - started) * 1000)
+            hits += len(set(result) & exact_neighbors(index, index.position_of(rowid), k))
+        p50, p99 = np.percentile(timings, [50, 99])
+        recall = hits / (len(query_rowids) * k)
+        print(f"query:    p50 {p50:6.2f} ms  p99 {p99:6.2f} ms  recall@{k} {recall:.3f}")
+        if p99 > P99_BUDGET_MS:
+            print(f"ERRORE: p99 oltre il budget di {P99_BUDGET_MS} ms")
+            failed = True
+        if recall < MIN_RECALL:
+            print(f"ERRORE: recall sotto {MIN_RECALL}")
+            failed = True
+        del index
+    return failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--songs', type=int, nargs='+', default=[1000000], help="dimensioni delle librerie")
+    parser.add_argument('-k', type=int, default=K, help="vicini per query")
+    args = parser.parse_args()
+
+    failed = [n for n in args.songs if run(n, args.k)]
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
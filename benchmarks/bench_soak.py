@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+"""
+Soak test del player sul backend finto con orologio simulato.
+
+Simula ore di ascolto su una libreria sintetica: fine traccia, skip avanti e
+indietro, salti, shuffle, pause, seek e richieste in coda, con qualche file
+mancante o in errore. Dopo ogni azione controlla che lo stato pubblicato sia
+coerente con quello che il backend sta suonando, e alla fine riporta la
+crescita della memoria (tracemalloc) e la latenza delle transizioni.
+
+Esce con codice 1 se lo stato è incoerente o un budget viene superato:
+
+    python -m benchmarks.bench_soak --hours 24 --actions 20000
+"""
+import io
+import os
+import sys
+import gc
+import time
+import random
+import argparse
+import tempfile
+import threading
+import contextlib
+import statistics
+import tracemalloc
+from collections import Counter, defaultdict
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from app.music_player.fake_backend import FakeBackend
+from app.music_player.music_palyer import MusicPlayer
+from app.music_player.play_queue import PlayQueue
+from app.utils.repository import Repository
+from benchmarks.synthetic import build_synthetic_library
+from init_db.import_playlists import import_playlists_bulk
+from init_db.import_songs import import_songs_from_json
+
+MEMORY_BUDGET_KIB = 1024  # crescita massima tra fine riscaldamento e fine soak
+LATENCY_BUDGET_MS = 50  # p95 massimo dal comando all'avvio della traccia
+WARMUP = 0.2  # frazione delle azioni prima della prima fotografia della memoria
+SYNC_TIMEOUT = 5.0
+THREAD_GRACE_S = 2.0  # tempo concesso ai thread di preload e disponibilità per terminare
+
+# peso delle azioni simulate: l'ascolto fino alla fine resta la più frequente
+ACTIONS = {
+    'end': 30,
+    'listen': 10,
+    'next': 20,
+    'prev': 8,
+    'jump': 6,
+    'shuffle': 4,
+    'pause': 6,
+    'seek': 6,
+    'enqueue': 5,
+    'insert_next': 5,
+}
+
+
+class Soak:
+    def __init__(self, player, backend, play_queue, rng):
+        self.player = player
+        self.backend = backend
+        self.play_queue = play_queue
+        self.rng = rng
+        self.counts = Counter()
+        self.latencies = defaultdict(list)  # azione -> ms dal comando all'avvio della traccia
+        self.violations = []
+
+    def act(self, action):
+        player, backend, rng = self.player, self.backend, self.rng
+        started = player.state.started
+        start = time.perf_counter()
+        if action == 'end':
+            active = backend.active_player()
+            if active is None:
+                player.next_track()
+            else:
+                backend.advance(active.get_length() - active.get_time() + 1)
+        elif action == 'listen':
+            backend.advance(rng.randrange(1000, 60000))
+        elif action == 'next':
+            player.next_track()
+        elif action == 'prev':
+            player.prev_track()
+        elif action == 'jump':
+            player.play_song_at_index(rng.randrange(len(self.play_queue)))
+        elif action == 'shuffle':
+            player.toggle_shuffle()
+        elif action == 'pause':
+            player.toggle_pause()
+        elif action == 'seek':
+            player.seek(rng.randrange(0, 120000))
+        elif action == 'enqueue':
+            player.enqueue(self.play_queue.rowid_at(rng.randrange(len(self.play_queue))))
+        elif action == 'insert_next':
+            player.insert_next(self.play_queue.rowid_at(rng.randrange(len(self.play_queue))))
+        if not player.sync(SYNC_TIMEOUT):
+            self.violations.append(f"{action}: il thread del player non risponde")
+            return
+        self.counts[action] += 1
+        if player.state.started != started:
+            self.latencies[action].append((time.perf_counter() - start) * 1000)
+        self.check(action)
+
+    def check(self, action):
+        """Lo stato pubblicato deve corrispondere a quello che il backend suona."""
+        state = self.player.state
+        playing = [p for p in self.backend.players if p.state == 'playing']
+        if len(playing) > 1:
+            self.violations.append(f"{action}: {len(playing)} player suonano insieme")
+        if state.is_stopped or state.is_paused:
+            if playing:
+                self.violations.append(f"{action}: il backend suona ma lo stato è fermo o in pausa")
+            return
+        if state.track is None:
+            self.violations.append(f"{action}: stato in riproduzione senza traccia")
+        elif playing and playing[0].media.path != state.track.mp4_path:
+            self.violations.append(f"{action}: il backend suona {playing[0].media.path}, "
+                                   f"lo stato dice {state.track.mp4_path}")
+
+
+def memory_snapshot():
+    gc.collect()
+    return tracemalloc.take_snapshot().filter_traces((
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, __file__),  # statistiche raccolte dal soak stesso
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    ))
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--songs', type=int, default=5000, help="canzoni della libreria sintetica")
+    parser.add_argument('--hours', type=float, default=24, help="ore di ascolto simulate (minimo)")
+    parser.add_argument('--actions', type=int, default=20000, help="azioni simulate (minimo)")
+    parser.add_argument('--missing', type=float, default=0.02, help="frazione di canzoni senza file")
+    parser.add_argument('--failing', type=float, default=0.01, help="frazione di file che danno errore al play")
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    actions, weights = zip(*ACTIONS.items())
+    with tempfile.TemporaryDirectory() as tmp:
+        n_files = args.songs - int(args.songs * args.missing)
+        library = build_synthetic_library(tmp, args.songs, n_playlists=1, max_files=n_files, seed=args.seed)
+        db_path = os.path.join(tmp, 'soak.db')
+        with contextlib.redirect_stdout(io.StringIO()):
+            import_songs_from_json(db_path, library['songs_json'])
+            import_playlists_bulk(db_path, library['csv_dir'])
+        repository = Repository(db_path)
+        repository.prepare()
+        all_id = next(p.id for p in repository.get_playlists() if p.name == 'Cluster all')
+        play_queue = PlayQueue.for_playlist(repository, all_id)
+        failing = [os.path.join(library['mp4_dir'], name)
+                   for name in rng.sample(sorted(os.listdir(library['mp4_dir'])), int(n_files * args.failing))]
+
+        threads_before = threading.active_count()
+        backend = FakeBackend(fail_paths=failing)
+        player = MusicPlayer(backend=backend)
+        target_ms = args.hours * 3600 * 1000
+        warmup = int(args.actions * WARMUP)
+        tracemalloc.start()
+        baseline = None
+        wall_start = time.perf_counter()
+        soak = Soak(player, backend, play_queue, rng)
+        # i print del player (shuffle, file mancanti, errori) sono attesi e vengono scartati,
+        # su devnull perché un buffer in memoria risulterebbe come crescita
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            player.start()
+            player.load_playlist(play_queue)
+            player.sync(SYNC_TIMEOUT)
+            done = 0
+            while done < args.actions or backend.clock.now_ms < target_ms:
+                soak.act(rng.choices(actions, weights)[0])
+                done += 1
+                if done == warmup:
+                    baseline = memory_snapshot()
+            final = memory_snapshot()
+            player.shutdown()
+        wall = time.perf_counter() - wall_start
+        tracemalloc.stop()
+        # shutdown() non aspetta i worker di preload e disponibilità
+        deadline = time.perf_counter() + THREAD_GRACE_S
+        while threading.active_count() > threads_before and time.perf_counter() < deadline:
+            time.sleep(0.01)
+        threads_after = threading.active_count()
+        repository.close()
+
+    simulated_h = backend.clock.now_ms / 3600000
+    print(f"{done} azioni, {simulated_h:.1f} ore simulate in {wall:.1f} s "
+          f"({simulated_h * 3600 / wall:.0f}x tempo reale)")
+    print("azioni: " + ", ".join(f"{name}={soak.counts[name]}" for name in actions))
+    print(f"media aperti: {backend.media_opened}, tracce avviate: {player.state.started}")
+
+    failed = False
+    all_latencies = []
+    print("\nlatenza dal comando all'avvio della traccia:")
+    for name in actions:
+        values = soak.latencies.get(name)
+        if not values:
+            continue
+        all_latencies.extend(values)
+        print(f"  {name:<12} n={len(values):<6} p50={statistics.median(values):6.2f} ms  "
+              f"p95={percentile(values, 0.95):6.2f} ms  max={max(values):7.2f} ms")
+    count, mean, worst = player.transition_stats()
+    print(f"  gap fine traccia -> play (ultimi {count}): medio {mean:.2f} ms, massimo {worst:.2f} ms")
+    if all_latencies and percentile(all_latencies, 0.95) > LATENCY_BUDGET_MS:
+        print(f"ERRORE: p95 della latenza oltre il budget di {LATENCY_BUDGET_MS} ms")
+        failed = True
+
+    growth = final.compare_to(baseline, 'lineno')
+    growth_kib = sum(stat.size_diff for stat in growth) / 1024
+    print(f"\nmemoria: crescita di {growth_kib:.1f} KiB dopo il riscaldamento (budget {MEMORY_BUDGET_KIB} KiB)")
+    for stat in growth[:5]:
+        if stat.size_diff > 0:
+            print(f"  {stat}")
+    if growth_kib > MEMORY_BUDGET_KIB:
+        print("ERRORE: crescita della memoria oltre il budget")
+        failed = True
+    if threads_after > threads_before:
+        print(f"ERRORE: thread rimasti attivi: {threads_before} prima, {threads_after} dopo")
+        failed = True
+
+    if soak.violations:
+        print(f"\nERRORE: {len(soak.violations)} incoerenze di stato, le prime:")
+        for violation in soak.violations[:10]:
+            print(f"  {violation}")
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Benchmark dell'avvio a freddo dell'app.
+
+Misura in processi separati (quindi senza moduli già in cache):
+- il tempo di import di app.ui.ui e che VLC, Pillow e pandas non vengano
+  importati con esso;
+- il tempo fino al primo disegno della finestra (solo se c'è un display).
+
+Esce con codice 1 se un budget viene superato, così può girare nei test:
+
+    python -m benchmarks.bench_startup --runs 5
+"""
+import os
+import sys
+import argparse
+import subprocess
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+IMPORT_BUDGET_MS = 150
+FIRST_PAINT_BUDGET_MS = 500
+HEAVY_MODULES = ('vlc', 'PIL', 'pandas', 'numpy')
+
+IMPORT_SCRIPT = f"""
+import sys, time
+start = time.perf_counter()
+import app.ui.ui
+elapsed = (time.perf_counter() - start) * 1000
+print(elapsed, *[m for m in {HEAVY_MODULES!r} if m in sys.modules])
+"""
+
+FIRST_PAINT_SCRIPT = """
+import time
+start = time.perf_counter()
+from tkinter import Tk
+from app.ui.ui import App
+root = Tk()
+App(root)
+
+def painted(event):
+    if event.widget is root:
+        print((time.perf_counter() - start) * 1000)
+        root.after(0, root.destroy)
+
+root.bind('<Map>', painted, add='+')
+root.mainloop()
+"""
+
+
+def run_script(script):
+    result = subprocess.run([sys.executable, '-c', script], cwd=project_root,
+                            capture_output=True, text=True, timeout=60)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "errore")
+    # l'app può stampare messaggi propri: la misura è l'ultima riga
+    return result.stdout.strip().splitlines()[-1].split()
+
+
+def has_display():
+    return sys.platform in ('win32', 'darwin') or bool(os.environ.get('DISPLAY') or os.environ.get('WAYLAND_DISPLAY'))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--runs', type=int, default=5, help="avvii misurati (si tiene il migliore)")
+    args = parser.parse_args()
+    failed = False
+
+    timings, heavy = [], set()
+    for _ in range(args.runs):
+        elapsed, *loaded = run_script(IMPORT_SCRIPT)
+        timings.append(float(elapsed))
+        heavy.update(loaded)
+    best = min(timings)
+    print(f"import app.ui.ui: migliore {best:.1f} ms, peggiore {max(timings):.1f} ms (budget {IMPORT_BUDGET_MS} ms)")
+    if heavy:
+        print(f"ERRORE: moduli pesanti importati all'avvio: {', '.join(sorted(heavy))}")
+        failed = True
+    if best > IMPORT_BUDGET_MS:
+        print("ERRORE: superato il budget di import")
+        failed = True
+
+    if not has_display():
+        print("primo disegno: nessun display disponibile, misura saltata")
+    else:
+        timings = [float(run_script(FIRST_PAINT_SCRIPT)[0]) for _ in range(args.runs)]
+        best = min(timings)
+        print(f"primo disegno: migliore {best:.1f} ms, peggiore {max(timings):.1f} ms "
+              f"(budget {FIRST_PAINT_BUDGET_MS} ms)")
+        if best > FIRST_PAINT_BUDGET_MS:
+            print("ERRORE: superato il budget del primo disegno")
+            failed = True
+
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+"""
+Suite di benchmark su una libreria sintetica.
+
+Genera una libreria (canzoni, playlist, mp4 e copertine finte) e misura
+import, query delle playlist, popolamento della lista canzoni, decodifica
+delle copertine, shuffle e coda di riproduzione. I risultati vengono
+salvati in JSON e confrontati con un baseline: se un caso è più lento del
+baseline oltre la tolleranza, o se leggere una copertina dalla cache non è
+molto più veloce che decodificarla, lo script esce con codice 1.
+
+    python -m benchmarks.bench_suite --songs 10000 --save-baseline
+    python -m benchmarks.bench_suite --songs 10000          # confronta
+    python -m benchmarks.bench_suite --songs 1000000 --playlists 5000
+"""
+import io
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import sqlite3
+import argparse
+import platform
+import tempfile
+import contextlib
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from app import settings
+from app.music_player.play_queue import PlayQueue
+from app.music_player.shuffle import ShuffleBag
+from app.utils.playlist_rows import PlaylistRows
+from app.utils.repository import Repository
+from benchmarks.synthetic import build_synthetic_library
+from init_db.import_playlists import import_playlists_bulk, import_playlists_from_csv
+from init_db.import_songs import import_songs_from_json
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+DEFAULT_TOLERANCE = 0.25  # +25% rispetto al baseline è una regressione
+MIN_DELTA_S = 0.01  # sotto i 10 ms di differenza è rumore
+LIST_WINDOW = 150  # righe materializzate dalla lista canzoni per ogni salto
+DRAG_STEPS = 20  # posizioni della scrollbar trascinata fino in fondo
+COVER_SAMPLE = 200
+COVER_HIT_SPEEDUP = 10  # una lettura dalla cache deve essere almeno 10x più veloce di una decodifica
+SHUFFLE_STEPS = 100000
+QUEUE_READS = 10000
+
+
+class Suite:
+    def __init__(self):
+        self.results = {}
+        self.errors = []  # controlli falliti, indipendenti dal baseline
+
+    @contextlib.contextmanager
+    def case(self, name, ops=1):
+        """Misura il blocco; i print delle funzioni misurate vengono scartati."""
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            yield
+        seconds = time.perf_counter() - start
+        self.results[name] = {'seconds': seconds, 'ops': ops}
+        rate = f"  {ops / seconds:12.0f} op/s" if ops > 1 and seconds > 0 else ""
+        print(f"  {name:<32} {seconds * 1000:10.1f} ms{rate}")
+
+
+def run_import(suite, library, db_path):
+    with suite.case('import_songs_from_json'):
+        import_songs_from_json(db_path, library['songs_json'])
+
+    # l'import storico gira su una copia, il database dei casi successivi usa quello bulk
+    legacy_db = f"{db_path}.legacy"
+    shutil.copyfile(db_path, legacy_db)
+    with suite.case('import_playlists_from_csv'):
+        import_playlists_from_csv(legacy_db, library['csv_dir'])
+    os.remove(legacy_db)
+
+    with suite.case('import_playlists_bulk'):
+        import_playlists_bulk(db_path, library['csv_dir'])
+
+
+def run_queries(suite, repository, rng):
+    with suite.case('get_playlists x10', ops=10):
+        for _ in range(10):
+            playlists = repository.get_playlists()
+
+    sample = rng.sample(playlists, min(200, len(playlists)))
+    with suite.case('playlist count + first page', ops=len(sample)):
+        for playlist in sample:
+            repository.count_playlist_songs(playlist.id)
+            repository.get_playlist_songs_page(playlist.id)
+
+    all_id = next(p.id for p in playlists if p.name == 'Cluster all')
+    with suite.case('keyset walk of largest playlist'):
+        after, total = '', 0
+        while True:
+            page = repository.get_playlist_songs_page(all_id, after)
+            total += len(page)
+            if not page:
+                break
+            after = page[-1].song_id
+    return all_id
+
+
+def run_song_list(suite, repository, playlist_id, rng):
+    # come VirtualSongList.render: righe di una finestra dopo salti della scrollbar
+    with suite.case('song list open + first window'):
+        rows = PlaylistRows(repository, playlist_id)
+        [row.title for row in (rows[i] for i in range(min(LIST_WINDOW, len(rows))))]
+    jumps = [rng.randrange(len(rows)) for _ in range(20)]
+    with suite.case('song list scroll jumps', ops=len(jumps)):
+        for first in jumps:
+            [rows[i].title for i in range(first, min(len(rows), first + LIST_WINDOW))]
+    # trascinamento della scrollbar fino in fondo, su una lista appena aperta
+    rows = PlaylistRows(repository, playlist_id)
+    drag = [len(rows) * step // DRAG_STEPS for step in range(1, DRAG_STEPS + 1)]
+    with suite.case('song list drag to end', ops=len(drag)):
+        for first in drag:
+            [rows[i].title for i in range(max(0, first - LIST_WINDOW), first)]
+
+
+def run_covers(suite, covers):
+    try:
+        from app.utils.covers import CoverService
+    except ImportError:
+        print("  copertine: Pillow non installato, casi saltati")
+        return
+    if not covers:
+        print("  copertine: nessuna copertina generata, casi saltati")
+        return
+    # cache su disco disattivata: si misura la decodifica vera
+    service = CoverService(cache_dir='', max_workers=1)
+    sample = covers[:COVER_SAMPLE]
+    for size in (640, 64):
+        with suite.case(f'cover decode {size}px', ops=len(sample)):
+            for path in sample:
+                service.load(path, (size, size))
+    # solo le copertine che stanno insieme nel budget della cache, lette a giro
+    # fino allo stesso numero di letture: con tutto il campione l'LRU le
+    # scarterebbe prima di rileggerle e si misurerebbe un'altra decodifica
+    hits = sample[:max(1, settings.COVER_CACHE_MAX_BYTES // (640 * 640 * 3))]
+    for path in hits:
+        service.load(path, (640, 640))
+    with suite.case('cover cache hit 640px', ops=len(sample)):
+        for i in range(len(sample)):
+            service.load(hits[i % len(hits)], (640, 640))
+    service.shutdown()
+    decode, hit = suite.results['cover decode 640px'], suite.results['cover cache hit 640px']
+    if hit['seconds'] * COVER_HIT_SPEEDUP > decode['seconds']:
+        suite.errors.append(f"cover cache hit 640px solo {decode['seconds'] / hit['seconds']:.1f}x più veloce "
+                            f"della decodifica (attesi almeno {COVER_HIT_SPEEDUP}x)")
+
+
+def run_shuffle_and_queue(suite, repository, playlist_id, n_songs, rng):
+    bag = ShuffleBag(n_songs, seed=1)
+    steps = min(SHUFFLE_STEPS, n_songs)
+    with suite.case('shuffle next', ops=steps):
+        for _ in range(steps):
+            bag.next()
+    with suite.case('shuffle prev + select', ops=2000):
+        for _ in range(1000):
+            bag.prev()
+        for _ in range(1000):
+            bag.select(rng.randrange(n_songs))
+
+    with suite.case('queue build for playlist'):
+        play_queue = PlayQueue.for_playlist(repository, playlist_id)
+    reads = min(QUEUE_READS, len(play_queue))
+    with suite.case('queue sequential reads', ops=reads):
+        for i in range(reads):
+            play_queue[i]
+    positions = [rng.randrange(len(play_queue)) for _ in range(reads)]
+    with suite.case('queue random reads', ops=reads):
+        for i in positions:
+            play_queue[i]
+    with suite.case('queue enqueue + insert_next', ops=2 * SHUFFLE_STEPS):
+        for i in range(SHUFFLE_STEPS):
+            play_queue.enqueue(i)
+            play_queue.insert_next(i)
+
+
+def compare(results, baseline, tolerance):
+    """Stampa il confronto con il baseline e restituisce i casi in regressione."""
+    regressions = []
+    print(f"\nconfronto con il baseline (tolleranza +{tolerance:.0%}):")
+    for name, result in results.items():
+        base = baseline.get('results', {}).get(name)
+        if base is None:
+            print(f"  {name:<32} nuovo")
+            continue
+        ratio = result['seconds'] / base['seconds'] if base['seconds'] > 0 else 1.0
+        regressed = ratio > 1 + tolerance and result['seconds'] - base['seconds'] > MIN_DELTA_S
+        print(f"  {name:<32} {ratio:6.2f}x{'  REGRESSIONE' if regressed else ''}")
+        if regressed:
+            regressions.append(name)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--songs', type=int, default=10000, help="canzoni della libreria sintetica")
+    parser.add_argument('--playlists', type=int, default=2000, help="playlist generate")
+    parser.add_argument('--playlist-size', type=int, default=100, help="dimensione media delle playlist")
+    parser.add_argument('--files', type=int, default=10000, help="canzoni con mp4 e copertine su disco")
+    parser.add_argument('--output', help="file JSON dei risultati (default: results/<canzoni>-<data>.json)")
+    parser.add_argument('--baseline', help="baseline da confrontare (default: results/baseline-<canzoni>.json)")
+    parser.add_argument('--save-baseline', action='store_true', help="salva i risultati come nuovo baseline")
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE)
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    suite = Suite()
+    with tempfile.TemporaryDirectory() as tmp:
+        start = time.perf_counter()
+        library = build_synthetic_library(tmp, args.songs, args.playlists, args.playlist_size, args.files)
+        print(f"libreria sintetica di {args.songs} canzoni e {args.playlists} playlist "
+              f"generata in {time.perf_counter() - start:.1f} s")
+
+        db_path = os.path.join(tmp, 'bench.db')
+        run_import(suite, library, db_path)
+        repository = Repository(db_path)
+        repository.prepare()
+        try:
+            all_id = run_queries(suite, repository, rng)
+            run_song_list(suite, repository, all_id, rng)
+            run_covers(suite, library['covers'])
+            run_shuffle_and_queue(suite, repository, all_id, args.songs, rng)
+        finally:
+            repository.close()
+
+    report = {
+        'meta': {
+            'songs': args.songs,
+            'playlists': args.playlists,
+            'playlist_size': args.playlist_size,
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'sqlite': sqlite3.sqlite_version,
+            'date': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        },
+        'results': suite.results,
+    }
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    output = args.output or os.path.join(RESULTS_DIR, f"{args.songs}-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f"\nrisultati salvati in {output}")
+
+    for error in suite.errors:
+        print(f"ERRORE: {error}")
+    failed = 1 if suite.errors else 0
+
+    baseline_path = args.baseline or os.path.join(RESULTS_DIR, f"baseline-{args.songs}.json")
+    if args.save_baseline:
+        shutil.copyfile(output, baseline_path)
+        print(f"baseline aggiornato: {baseline_path}")
+        return failed
+    if not os.path.exists(baseline_path):
+        print(f"nessun baseline in {baseline_path} (crealo con --save-baseline)")
+        return failed
+    with open(baseline_path, encoding='utf-8') as f:
+        regressions = compare(suite.results, json.load(f), args.tolerance)
+    if regressions:
+        print(f"ERRORE: {len(regressions)} casi in regressione: {', '.join(regressions)}")
+        return 1
+    return failed
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Benchmark della latenza di transizione tra tracce, con e senza preload.
+
+Misura il tempo tra la fine (stop) della traccia corrente e lo stato Playing
+della successiva. Richiede libvlc e una cartella con dei file mp4:
+
+    python -m benchmarks.bench_transitions ~/Desktop/mp4 --tracks 20
+"""
+import os
+import sys
+import glob
+import time
+import argparse
+import statistics
+
+import vlc
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from app.music_player.preloader import MediaPreloader
+
+
+def wait_playing(player, timeout=5.0):
+    """Attende lo stato Playing e restituisce l'istante in cui è stato raggiunto."""
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        if player.get_state() == vlc.State.Playing:
+            return time.perf_counter()
+        time.sleep(0.0005)
+    raise TimeoutError("il player non è entrato in riproduzione")
+
+
+def run_transitions(files, preload):
+    """Esegue una transizione per ogni file e restituisce le latenze in ms."""
+    player = vlc.MediaPlayer()
+    player.audio_set_volume(0)
+    preloader = MediaPreloader()
+    latencies = []
+    try:
+        for i, file_path in enumerate(files):
+            if preload:
+                # durante la traccia precedente il preloader ha tutto il tempo di finire
+                preloader.schedule(file_path)
+                preloader.wait()
+
+            start = time.perf_counter()
+            player.stop()
+            media = preloader.take(file_path) if preload else None
+            player.set_media(media or vlc.Media(file_path))
+            player.play()
+            latencies.append((wait_playing(player) - start) * 1000)
+    finally:
+        player.stop()
+        preloader.shutdown()
+    return latencies
+
+
+def report(label, latencies):
+    latencies = sorted(latencies)
+    p50 = statistics.median(latencies)
+    p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+    print(f"{label:<14} n={len(latencies):<4} media={statistics.mean(latencies):7.1f} ms  "
+          f"p50={p50:7.1f} ms  p95={p95:7.1f} ms  max={latencies[-1]:7.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('mp4_dir', help="cartella con i file mp4")
+    parser.add_argument('--tracks', type=int, default=20, help="numero di transizioni da misurare")
+    args = parser.parse_args()
+
+    files = sorted(glob.glob(os.path.join(args.mp4_dir, '*.mp4')))[:args.tracks]
+    if len(files) < 2:
+        print(f"Servono almeno 2 file mp4 in {args.mp4_dir}")
+        return 1
+
+    report("senza preload", run_transitions(files, preload=False))
+    report("con preload", run_transitions(files, preload=True))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
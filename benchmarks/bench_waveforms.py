@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Benchmark della lettura e del disegno delle forme d'onda (app.utils.waveforms).
+
+Salva forme d'onda sintetiche compresse con snappy per una libreria intera
+e misura, per canzoni casuali, lettura dal database e decompressione più
+il calcolo delle barre e il disegno sulla WaveformSeekBar (il disegno solo
+se c'è un display). Esce con codice 1 se il p99 supera il budget:
+
+    python -m benchmarks.bench_waveforms --songs 100000
+"""
+import os
+import sys
+import time
+import sqlite3
+import argparse
+import tempfile
+
+import numpy as np
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from app import settings
+from app.ui.waveform_bar import bar_heights
+from app.utils.repository import Repository
+from app.utils.waveforms import WaveformService, create_waveform_table, pack_peaks
+from benchmarks.bench_startup import has_display
+
+READS = 500
+WIDTH = 640  # larghezza della barra disegnata
+BUDGET_MS = 10
+GENERATE_CHUNK = 10000
+
+
+def synthetic_peaks(rng, count):
+    """Picchi con l'andamento di una canzone: inviluppo lento e rumore."""
+    bins = settings.WAVEFORM_BINS
+    envelope = np.cumsum(rng.normal(size=(count, bins // 32)), axis=1)
+    envelope = np.repeat(envelope - envelope.min(axis=1, keepdims=True), 32, axis=1)
+    peaks = envelope / (envelope.max(axis=1, keepdims=True) + 1e-9) * 0.7 + rng.uniform(0, 0.3, size=(count, bins))
+    return np.round(peaks / peaks.max(axis=1, keepdims=True) * 255).astype(np.uint8)
+
+
+def build_library(db_path, n_songs, rng):
+    conn = sqlite3.connect(db_path)
+    create_waveform_table(conn)
+    stored = 0
+    for start in range(0, n_songs, GENERATE_CHUNK):
+        end = min(n_songs, start + GENERATE_CHUNK)
+        blobs = [pack_peaks(row.tobytes()) for row in synthetic_peaks(rng, end - start)]
+        stored += sum(map(len, blobs))
+        conn.executemany("INSERT INTO song_waveforms (song_id, peaks) VALUES (?, ?)",
+                         ((f"song{i}", blob) for i, blob in zip(range(start, end), blobs)))
+    conn.commit()
+    conn.close()
+    return stored
+
+
+def run(n_songs):
+    rng = np.random.default_rng(5)
+    failed = False
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'waveforms.db')
+        stored = build_library(db_path, n_songs, rng)
+        print(f"\n{n_songs} forme d'onda: {stored / n_songs:.0f} byte compressi in media "
+              f"(su {settings.WAVEFORM_BINS})")
+
+        repository = Repository(db_path)
+        repository.prepare()
+        service = WaveformService(repository)
+        song_ids = [f"song{i}" for i in rng.integers(n_songs, size=READS)]
+        root = bar = None
+        if has_display():
+            from tkinter import Tk
+            from app.ui.waveform_bar import WaveformSeekBar
+
+            root = Tk()
+            bar = WaveformSeekBar(root, settings.SEEK_BAR_STEPS, width=WIDTH)
+            bar.pack(fill='x')
+            root.update()
+        try:
+            service.read(song_ids[0])  # prima lettura: apertura della connessione
+            timings = []
+            for song_id in song_ids:
+                started = time.perf_counter()
+                peaks = service.read(song_id)
+                if bar is not None:
+                    bar.set_waveform(peaks)
+                    bar.set(rng.integers(settings.SEEK_BAR_STEPS))
+                    root.update_idletasks()
+                else:
+                    bar_heights(peaks, WIDTH // settings.WAVEFORM_BAR_PX, settings.WAVEFORM_HEIGHT // 2 - 1)
+                timings.append((time.perf_counter() - started) * 1000)
+        finally:
+            if root is not None:
+                root.destroy()
+            service.shutdown()
+            repository.close()
+
+        p50, p99 = np.percentile(timings, [50, 99])
+        what = "lettura e disegno" if bar is not None else "lettura e calcolo delle barre (nessun display: disegno saltato)"
+        print(f"{what}: p50 {p50:.2f} ms  p99 {p99:.2f} ms  (budget {BUDGET_MS} ms)")
+        if p99 > BUDGET_MS:
+            print(f"ERRORE: p99 oltre il budget di {BUDGET_MS} ms")
+            failed = True
+    return failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--songs', type=int, nargs='+', default=[100000], help="dimensioni delle librerie")
+    args = parser.parse_args()
+
+    failed = [n for n in args.songs if run(n)]
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
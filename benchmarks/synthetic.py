@@ -0,0 +1,113 @@
+"""
+Generatore di librerie sintetiche per i benchmark.
+
+Crea in una cartella gli stessi input dell'app reale:
+- songs.json con le canzoni (stesso formato di data_songs_cleaned.json);
+- csv/playlist_cluster_New_<n>.csv con le playlist, più una playlist
+  "all" che contiene l'intera libreria;
+- mp4/ e copertine/ con file finti: gli mp4 sono pochi byte, le copertine
+  sono JPEG veri (se Pillow è installato), copiati da un piccolo set di
+  immagini diverse.
+
+Per le librerie grandi solo le prime max_files canzoni hanno i file su disco;
+le altre puntano a percorsi inesistenti, come una libreria su un disco
+parzialmente montato.
+"""
+import os
+import csv
+import json
+import random
+import shutil
+
+WORDS = ("love night dream fire heart rain blue summer dance light shadow river "
+         "gold star road home wild sweet broken city moon ocean storm forever").split()
+COVER_SIZES = (640, 300, 64)
+DISTINCT_COVERS = 16  # immagini diverse generate, poi copiate
+FAKE_MP4 = b"\x00\x00\x00\x18ftypmp42\x00\x00\x00\x00mp42isom"
+
+
+def song_id_of(index):
+    return f"syn{index:07d}"
+
+
+def _write_covers(cover_dir, size, n_files):
+    """Scrive n_files copertine JPEG size x size e ne restituisce i percorsi (None senza Pillow)."""
+    try:
+        from PIL import Image
+    except ImportError:
+        return None
+    os.makedirs(cover_dir, exist_ok=True)
+    rng = random.Random(size)
+    sources = []
+    for i in range(min(DISTINCT_COVERS, n_files)):
+        # gradiente con rumore: si comprime come una foto e non come un colore pieno
+        img = Image.effect_noise((size, size), 64).convert('RGB')
+        img = Image.blend(img, Image.new('RGB', (size, size), tuple(rng.randrange(256) for _ in range(3))), 0.5)
+        path = os.path.join(cover_dir, f"source_{i}.jpg")
+        img.save(path, format='JPEG', quality=85)
+        sources.append(path)
+    paths = []
+    for i in range(n_files):
+        path = os.path.join(cover_dir, f"{song_id_of(i)}.jpg")
+        shutil.copyfile(sources[i % len(sources)], path)
+        paths.append(path)
+    return paths
+
+
+def build_synthetic_library(root, n_songs, n_playlists=2000, playlist_size=100, max_files=10000, seed=42):
+    """
+    Genera la libreria sintetica in root.
+
+    Returns:
+        dict con i percorsi generati: songs_json, csv_dir, mp4_dir, cover_dir.
+    """
+    rng = random.Random(seed)
+    mp4_dir = os.path.join(root, 'mp4')
+    cover_dir = os.path.join(root, 'copertine')
+    csv_dir = os.path.join(root, 'csv')
+    os.makedirs(mp4_dir, exist_ok=True)
+    os.makedirs(csv_dir, exist_ok=True)
+
+    n_files = min(max_files, n_songs)
+    for i in range(n_files):
+        with open(os.path.join(mp4_dir, f"{song_id_of(i)}.mp4"), 'wb') as f:
+            f.write(FAKE_MP4)
+    covers = {size: _write_covers(os.path.join(cover_dir, str(size)), size, n_files) for size in COVER_SIZES}
+
+    artists = [f"{rng.choice(WORDS).title()} Band {i}" for i in range(max(1, n_songs // 20))]
+    songs_json = os.path.join(root, 'songs.json')
+    with open(songs_json, 'w', encoding='utf-8') as f:
+        # scritto un oggetto alla volta: a 1M canzoni il JSON non sta comodo in una lista
+        f.write('[')
+        for i in range(n_songs):
+            song = {
+                'song_id': song_id_of(i),
+                'title': " ".join(rng.choice(WORDS) for _ in range(rng.randint(1, 4))).title(),
+                'artists': rng.choice(artists),
+                'mp4_path': os.path.join(mp4_dir, f"{song_id_of(i)}.mp4"),
+            }
+            for size in COVER_SIZES:
+                song[f'copertina_{size}_path'] = os.path.join(cover_dir, str(size), f"{song_id_of(i)}.jpg")
+            if i:
+                f.write(',\n')
+            json.dump(song, f, ensure_ascii=False)
+        f.write(']\n')
+
+    def write_playlist(name, song_ids):
+        with open(os.path.join(csv_dir, f"playlist_cluster_New_{name}.csv"), 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(('song_id',))
+            writer.writerows((song_id,) for song_id in song_ids)
+
+    write_playlist('all', (song_id_of(i) for i in range(n_songs)))
+    for p in range(n_playlists):
+        size = min(n_songs, max(1, int(rng.expovariate(1 / playlist_size))))
+        write_playlist(p, (song_id_of(i) for i in rng.sample(range(n_songs), size)))
+
+    return {
+        'songs_json': songs_json,
+        'csv_dir': csv_dir,
+        'mp4_dir': mp4_dir,
+        'cover_dir': cover_dir,
+        'covers': covers[COVER_SIZES[0]],
+    }
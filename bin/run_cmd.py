@@ -0,0 +1,344 @@
+#!/usr/bin/env python3
+"""
+Riga di comando del lettore: import, scansione, ricerca, export delle
+playlist e riproduzione senza interfaccia grafica, sullo stesso database
+dell'app.
+
+    run_cmd search "moon river"
+    run_cmd play "Cluster 12" --shuffle
+    run_cmd play "Cluster 12" --radio
+
+All'avvio vengono importati solo click e le impostazioni: i moduli pesanti
+(pandas, VLC, il database) sono importati dentro i comandi che li usano,
+così anche run_cmd --help parte in poche decine di millisecondi.
+"""
+import os
+import sys
+
+import click
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from app import settings
+
+
+def _repository(ctx):
+    from app.utils.repository import Repository
+
+    if ctx.obj.get('repository') is None:
+        ctx.obj['repository'] = Repository(ctx.obj['db_path'])
+        ctx.call_on_close(ctx.obj['repository'].close)
+        ctx.obj['repository'].prepare()
+    return ctx.obj['repository']
+
+
+def _find_playlist(repository, playlist):
+    """Playlist per id numerico o per nome esatto."""
+    playlists = repository.get_playlists()
+    for item in playlists:
+        if str(item.id) == playlist or item.name == playlist:
+            return item
+    raise click.BadParameter(f"playlist '{playlist}' non trovata ({len(playlists)} nel database)",
+                             param_hint='PLAYLIST')
+
+
+@click.group()
+@click.option('--db', 'db_path', type=click.Path(dir_okay=False), default=settings.DATABASE_PATH,
+              show_default=True, help="database SQLite da usare")
+@click.option('--metrics', 'with_metrics', is_flag=True,
+              help=f"misura i percorsi caldi ed esporta le metriche (log e porta {settings.METRICS_PORT})")
+@click.pass_context
+def cli(ctx, db_path, with_metrics):
+    """Gestione della libreria musicale dalla riga di comando."""
+    ctx.ensure_object(dict)
+    ctx.obj['db_path'] = db_path
+    if with_metrics or settings.METRICS_ENABLED:
+        from app.utils.metrics import metrics
+
+        metrics.enabled = True
+        metrics.start()
+        ctx.call_on_close(metrics.stop)
+
+
+# === Import e scansione ===
+@cli.command('import-songs')
+@click.argument('json_path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--incremental', is_flag=True, help="aggiorna solo le canzoni cambiate invece di ricaricare tutto")
+@click.pass_context
+def import_songs(ctx, json_path, incremental):
+    """Importa le canzoni dal JSON nel database."""
+    from init_db.import_songs import import_songs_from_json
+
+    import_songs_from_json(ctx.obj['db_path'], json_path, incremental=incremental)
+
+
+@cli.command('import-playlists')
+@click.argument('csv_folder', type=click.Path(exists=True, file_okay=False))
+@click.option('--incremental', is_flag=True, help="reimporta solo le playlist i cui CSV sono nuovi o cambiati")
+@click.option('--workers', type=int, default=None, help="processi usati per leggere i CSV (default: numero di CPU)")
+@click.pass_context
+def import_playlists(ctx, csv_folder, incremental, workers):
+    """Importa le playlist dai CSV nel database."""
+    from init_db.import_playlists import import_playlists_bulk
+
+    import_playlists_bulk(ctx.obj['db_path'], csv_folder, incremental=incremental, workers=workers)
+
+
+@cli.command('import-features')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.pass_context
+def import_features(ctx, path):
+    """Importa i vettori delle canzoni da un .npz (song_id, features) o da un CSV."""
+    from app.utils.features import create_feature_tables, read_features_file, store_features
+
+    song_ids, matrix = read_features_file(path)
+    with _repository(ctx).writer() as conn:
+        create_feature_tables(conn)
+        store_features(conn, song_ids, matrix)
+    click.echo(f"{len(song_ids)} vettori di dimensione {matrix.shape[1]} importati")
+
+
+@cli.command()
+@click.option('-k', '--clusters', type=int, default=settings.CLUSTER_COUNT, show_default=True,
+              help="numero di playlist da creare")
+@click.option('--full', is_flag=True, help="ricalcola tutti i cluster invece di assegnare solo le canzoni nuove")
+@click.option('--seed', type=int, default=None, help="seed per risultati riproducibili")
+@click.pass_context
+def cluster(ctx, clusters, full, seed):
+    """Crea le playlist "Cluster N" con un k-means sui vettori delle canzoni."""
+    from init_db.cluster_songs import cluster_library
+
+    cluster_library(ctx.obj['db_path'], clusters, incremental=not full, seed=seed)
+
+
+@cli.command('similarity-index')
+@click.option('--path', type=click.Path(dir_okay=False), default=settings.SIMILARITY_INDEX_PATH, show_default=True,
+              help="prefisso dei file dell'indice")
+@click.pass_context
+def similarity_index(ctx, path):
+    """Crea l'indice di similarità per la radio (dopo import-features e cluster)."""
+    import time
+    from app.utils.similarity import SimilarityIndex
+
+    start = time.perf_counter()
+    count = SimilarityIndex.build(ctx.obj['db_path'], path)
+    click.echo(f"{count} canzoni indicizzate in {time.perf_counter() - start:.1f} s")
+
+
+@cli.command()
+@click.option('--out-dir', type=click.Path(file_okay=False), default=None,
+              help="directory delle copertine create (default: la cartella copertine)")
+@click.option('--size', 'sizes', type=click.Choice([str(size) for size in settings.COVER_SIZES]), multiple=True,
+              help="risoluzione da creare (ripetibile, default: tutte)")
+@click.option('--workers', type=int, default=None, help="processi usati per ridimensionare (default: numero di CPU)")
+@click.pass_context
+def covers(ctx, out_dir, sizes, workers):
+    """Crea le copertine mancanti (64, 300, 640 px) dalla più grande disponibile."""
+    from init_db.generate_covers import generate_missing_covers
+
+    generate_missing_covers(ctx.obj['db_path'], out_dir, [int(size) for size in sizes], workers)
+
+
+@cli.command()
+@click.option('--full', is_flag=True, help="rianalizza anche le canzoni già analizzate")
+@click.option('--workers', type=int, default=None, help="processi usati per l'analisi (default: numero di CPU)")
+@click.pass_context
+def loudness(ctx, full, workers):
+    """Calcola loudness e guadagno di normalizzazione delle canzoni (riprende da dove si era fermata)."""
+    from init_db.analyze_loudness import analyze_loudness
+
+    analyze_loudness(ctx.obj['db_path'], full=full, workers=workers)
+
+
+@cli.command()
+@click.option('--full', is_flag=True, help="rielabora anche le canzoni che hanno già una forma d'onda")
+@click.option('--workers', type=int, default=None, help="processi usati per l'estrazione (default: numero di CPU)")
+@click.pass_context
+def waveforms(ctx, full, workers):
+    """Estrae le forme d'onda mancanti per la barra di avanzamento (l'app le crea comunque quando servono)."""
+    from init_db.extract_waveforms import extract_missing_waveforms
+
+    extract_missing_waveforms(ctx.obj['db_path'], full=full, workers=workers)
+
+
+@cli.command()
+@click.option('--root', 'roots', multiple=True, type=click.Path(exists=True, file_okay=False),
+              help="directory da scansionare (ripetibile, default: mp4 e copertine)")
+@click.option('--watch', is_flag=True, help="resta attivo e aggiorna l'indice a ogni modifica")
+@click.pass_context
+def scan(ctx, roots, watch):
+    """Indicizza i file della libreria e li riconcilia con le canzoni."""
+    from app.utils.scanner import LibraryScanner
+
+    scanner = LibraryScanner(_repository(ctx), roots=roots or None)
+    if not watch:
+        _print_report(scanner.scan())
+        return
+    try:
+        scanner.watch(on_report=_print_report)
+    except KeyboardInterrupt:
+        pass
+
+
+def _print_report(report):
+    click.echo("  ".join(f"{key}={value:.2f}" if isinstance(value, float) else f"{key}={value}"
+                         for key, value in report.items()))
+
+
+# === Consultazione ===
+@cli.command()
+@click.pass_context
+def playlists(ctx):
+    """Elenca le playlist (id, canzoni, nome)."""
+    repository = _repository(ctx)
+    for playlist in repository.get_playlists():
+        click.echo(f"{playlist.id}\t{repository.count_playlist_songs(playlist.id)}\t{playlist.name}")
+
+
+@cli.command()
+@click.argument('text')
+@click.option('--limit', type=int, default=settings.SEARCH_LIMIT, show_default=True, help="risultati massimi")
+@click.pass_context
+def search(ctx, text, limit):
+    """Cerca canzoni per titolo o artisti (parole di almeno 3 caratteri)."""
+    from app.utils.search import search_songs
+
+    for row in search_songs(_repository(ctx), text, limit=limit):
+        click.echo(f"{row.song_id}\t{row.title}\t{row.artists or ''}\t{row.mp4_path or ''}")
+
+
+@cli.command()
+@click.argument('song_id')
+@click.option('--limit', type=int, default=settings.RADIO_BATCH, show_default=True, help="risultati massimi")
+@click.pass_context
+def similar(ctx, song_id, limit):
+    """Canzoni più simili a SONG_ID secondo l'indice di similarità."""
+    from app.utils.similarity import SimilarityIndex
+
+    index = SimilarityIndex.load()
+    if index is None:
+        raise click.ClickException("indice di similarità assente: esegui prima run_cmd similarity-index")
+    repository = _repository(ctx)
+    song = repository.get_song(song_id)
+    if song is None:
+        raise click.BadParameter(f"canzone '{song_id}' non trovata", param_hint='SONG_ID')
+    rowids = index.neighbors(song.rowid, limit)
+    tracks = repository.get_tracks(rowids)
+    for rowid in rowids:
+        track = tracks.get(rowid)
+        if track is not None:
+            click.echo(f"{track.song_id}\t{track.title}\t{track.artists or ''}")
+
+
+@cli.command()
+@click.argument('playlist')
+@click.option('--format', 'fmt', type=click.Choice(['m3u', 'csv']), default='m3u', show_default=True)
+@click.option('-o', '--output', type=click.File('w', encoding='utf-8'), default='-',
+              help="file di destinazione (default: standard output)")
+@click.pass_context
+def export(ctx, playlist, fmt, output):
+    """Esporta una playlist (per id o nome) in M3U o CSV."""
+    from app.utils.playlist_rows import PlaylistRows
+
+    repository = _repository(ctx)
+    rows = PlaylistRows(repository, _find_playlist(repository, playlist).id)
+    if fmt == 'csv':
+        import csv
+
+        writer = csv.writer(output)
+        writer.writerow(('song_id', 'title', 'artists', 'mp4_path'))
+        writer.writerows((row.song_id, row.title, row.artists, row.mp4_path) for row in rows)
+        return
+    output.write("#EXTM3U\n")
+    for row in rows:
+        if row.mp4_path:
+            title = f"{row.artists} - {row.title}" if row.artists else row.title
+            output.write(f"#EXTINF:-1,{title}\n{row.mp4_path}\n")
+
+
+@cli.command()
+@click.option('--by', type=click.Choice(['starts', 'completions', 'skips', 'last_played']), default='starts',
+              show_default=True, help="ordinamento della classifica")
+@click.option('--limit', type=int, default=20, show_default=True)
+@click.pass_context
+def top(ctx, by, limit):
+    """Canzoni più ascoltate (avvii, completamenti, skip) o ascoltate di recente."""
+    import time
+    from app.utils.history import PlayHistory
+
+    history = PlayHistory(_repository(ctx))
+    try:
+        for stats in history.top_songs(limit, by):
+            last = time.strftime('%Y-%m-%d %H:%M', time.localtime(stats.last_played)) if stats.last_played else '-'
+            title = stats.title or stats.song_id
+            click.echo(f"{stats.starts}\t{stats.completions}\t{stats.skips}\t{last}\t{title}"
+                       f"{' - ' + stats.artists if stats.artists else ''}")
+    finally:
+        history.close()
+
+
+# === Riproduzione ===
+@cli.command()
+@click.argument('playlist')
+@click.option('--shuffle', is_flag=True, help="riproduzione casuale senza ripetizioni")
+@click.option('--radio', is_flag=True, help="a fine playlist continua con le canzoni simili")
+@click.option('--start', type=int, default=0, show_default=True, help="indice della prima canzone")
+@click.option('--volume', type=click.IntRange(0, 100), default=100, show_default=True)
+@click.pass_context
+def play(ctx, playlist, shuffle, radio, start, volume):
+    """Riproduce una playlist senza interfaccia grafica (Ctrl+C per uscire)."""
+    import threading
+    from app.music_player.music_palyer import MusicPlayer
+    from app.music_player.play_queue import PlayQueue
+    from app.utils.history import PlayHistory
+
+    repository = _repository(ctx)
+    found = _find_playlist(repository, playlist)
+    play_queue = PlayQueue.for_playlist(repository, found.id)
+    if not play_queue:
+        raise click.ClickException(f"la playlist '{found.name}' è vuota")
+    similarity = None
+    if radio:
+        from app.utils.similarity import SimilarityIndex
+
+        similarity = SimilarityIndex.load()
+        if similarity is None:
+            raise click.ClickException("indice di similarità assente: esegui prima run_cmd similarity-index")
+
+    finished = threading.Event()
+    shown = {'started': 0}
+
+    def on_state_change(state):
+        # chiamata dal thread del player; stampa solo all'avvio di ogni traccia
+        if state.track is not None and not state.is_stopped and state.started != shown['started']:
+            shown['started'] = state.started
+            artists = f" - {state.track.artists}" if state.track.artists else ""
+            position = f"{state.index + 1}/{len(play_queue)}" if state.index >= 0 else "radio"
+            click.echo(f"▶ [{position}] {state.track.title}{artists}")
+        elif state.is_stopped and state.started:
+            finished.set()
+
+    history = PlayHistory(repository)
+    player = MusicPlayer(on_state_change, headless=True, history=history, similarity=similarity)
+    player.start()
+    player.set_volume(volume)
+    if shuffle:
+        player.toggle_shuffle()
+    if radio:
+        player.toggle_radio()
+    player.load_playlist(play_queue, start_index=start)
+    click.echo(f"Playlist '{found.name}': {len(play_queue)} canzoni")
+    try:
+        while not finished.wait(0.5):
+            pass
+    except KeyboardInterrupt:
+        pass
+    finally:
+        player.shutdown()
+        history.close()
+
+
+if __name__ == '__main__':
+    cli()
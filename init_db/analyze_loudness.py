@@ -0,0 +1,206 @@
+import os
+import sys
+import time
+import sqlite3
+import argparse
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from app import settings
+from app.utils.audio import decode_pcm, decoder_available
+from app.utils.repository import add_loudness_columns
+
+CHANNELS = 2  # le tracce mono vengono ascoltate su due canali e contate come tali
+SUB_BLOCK_SECONDS = 0.1  # i blocchi da 400 ms con sovrapposizione del 75% sono 4 sotto-blocchi consecutivi
+ABSOLUTE_GATE_LUFS = -70.0
+RELATIVE_GATE_LU = -10.0
+ERROR_SAMPLE_SIZE = 10  # errori mostrati nel riepilogo
+
+# filtro K della ITU-R BS.1770 a 48 kHz: shelving sugli acuti e passa-alto (b, a)
+K_WEIGHTING_RATE = 48000
+K_WEIGHTING = (
+    ((1.53512485958697, -2.69169618940638, 1.19839281085285), (1.0, -1.69065929318241, 0.73248077421585)),
+    ((1.0, -2.0, 1.0), (1.0, -1.99004745483398, 0.99007225036621)),
+)
+
+
+@lru_cache(maxsize=4)
+def _spectral_weights(block, rate):
+    """
+    Pesi sul modulo quadro della rfft di un sotto-blocco: risposta del filtro
+    K e normalizzazione di Parseval, così (|X|^2 @ pesi) è la potenza media
+    del sotto-blocco filtrato.
+    """
+    z_inverse = np.exp(-2j * np.pi * np.fft.rfftfreq(block, 1 / rate) / K_WEIGHTING_RATE)
+    response = np.ones_like(z_inverse)
+    for b, a in K_WEIGHTING:
+        response *= np.polyval(b[::-1], z_inverse) / np.polyval(a[::-1], z_inverse)
+    weights = np.abs(response) ** 2 * 2
+    weights[0] /= 2
+    if block % 2 == 0:
+        weights[-1] /= 2
+    return weights / block ** 2
+
+
+def sub_block_powers(pcm, rate):
+    """
+    Potenza K-pesata (somma sui canali) di ogni sotto-blocco da 100 ms di un
+    PCM (campioni, canali). Il filtro è applicato nel dominio della frequenza
+    su tutti i sotto-blocchi insieme; i campioni dell'ultimo sotto-blocco
+    incompleto sono ignorati.
+    """
+    block = int(rate * SUB_BLOCK_SECONDS)
+    count = len(pcm) // block
+    if count == 0:
+        return np.empty(0)
+    blocks = pcm[:count * block].reshape(count, block, pcm.shape[1])
+    spectrum = np.fft.rfft(blocks, axis=1)
+    power = spectrum.real ** 2 + spectrum.imag ** 2
+    return np.einsum('nfc,f->n', power, _spectral_weights(block, rate))
+
+
+def integrated_loudness(powers):
+    """Loudness integrata (LUFS) dai sotto-blocchi con il gating della BS.1770; None se la traccia è muta."""
+    if len(powers) < 4:
+        return None
+    blocks = np.lib.stride_tricks.sliding_window_view(powers, 4).mean(axis=1)
+    with np.errstate(divide='ignore'):
+        loudness = -0.691 + 10 * np.log10(blocks)
+    gated = blocks[loudness > ABSOLUTE_GATE_LUFS]
+    if len(gated) == 0:
+        return None
+    relative_gate = -0.691 + 10 * np.log10(gated.mean()) + RELATIVE_GATE_LU
+    gated = blocks[(loudness > ABSOLUTE_GATE_LUFS) & (loudness > relative_gate)]
+    return float(-0.691 + 10 * np.log10(gated.mean()))
+
+
+def gain_for(loudness_lufs, peak):
+    """
+    Guadagno (dB) che porta la traccia a LOUDNESS_TARGET_LUFS, limitato a
+    LOUDNESS_MAX_GAIN_DB e al margine del picco: l'amplificazione non fa mai
+    superare il fondo scala.
+    """
+    if loudness_lufs is None:
+        return 0.0
+    gain = min(settings.LOUDNESS_TARGET_LUFS - loudness_lufs, settings.LOUDNESS_MAX_GAIN_DB)
+    if peak > 0:
+        gain = min(gain, -20 * np.log10(peak))
+    return round(float(gain), 2)
+
+
+def _analyze_song(task):
+    """
+    Loudness integrata e picco di una canzone (eseguita nei processi del pool).
+
+    Returns:
+        (song_id, loudness in LUFS o None se muta, picco, errore)
+    """
+    song_id, path = task
+    if not os.path.exists(path):
+        return song_id, None, None, f"file non trovato -> {path}"
+    rate = settings.LOUDNESS_SAMPLE_RATE
+    # un numero intero di sotto-blocchi per lettura: nessun campione scartato tra un blocco e l'altro
+    chunk_frames = int(rate * SUB_BLOCK_SECONDS) * round(settings.LOUDNESS_CHUNK_SECONDS / SUB_BLOCK_SECONDS)
+    powers, peak = [], 0.0
+    try:
+        for pcm in decode_pcm(path, rate, CHANNELS, chunk_frames):
+            powers.append(sub_block_powers(pcm, rate))
+            if len(pcm):
+                peak = max(peak, float(np.abs(pcm).max()))
+    except Exception as e:
+        return song_id, None, None, f"{path}: {e}"
+    return song_id, integrated_loudness(np.concatenate(powers) if powers else np.empty(0)), peak, None
+
+
+def _analyze_all(tasks, workers):
+    """Analizza le canzoni in parallelo con un pool di processi, restituendo i risultati in ordine."""
+    if workers == 1:
+        yield from map(_analyze_song, tasks)
+        return
+    pool = ProcessPoolExecutor(max_workers=workers)
+    try:
+        chunksize = max(1, min(16, len(tasks) // ((workers or os.cpu_count() or 1) * 16)))
+        yield from pool.map(_analyze_song, tasks, chunksize=chunksize)
+    finally:
+        # anche se interrotti: niente attesa delle canzoni ancora in coda
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def analyze_loudness(db_path, full=False, workers=None):
+    """
+    Calcola loudness integrata (ITU-R BS.1770, con gating) e picco dei file
+    delle canzoni e salva in 'songs' il guadagno che il player applica
+    all'avvio di ogni traccia:
+
+    - ogni file viene decodificato da ffmpeg in PCM a LOUDNESS_SAMPLE_RATE e
+      analizzato a blocchi di LOUDNESS_CHUNK_SECONDS con NumPy (filtro K e
+      potenze di tutti i sotto-blocchi di un blocco in una sola FFT), in un
+      pool di processi;
+    - i risultati vengono salvati ogni LOUDNESS_COMMIT_EVERY canzoni: dopo
+      un'interruzione si riparte dalle canzoni senza sample_peak, cioè non
+      ancora analizzate o con un errore. full=True rianalizza tutto.
+
+    Returns:
+        Un dizionario di riepilogo (canzoni da analizzare, analizzate, mute,
+        errori, durata).
+    """
+    start = time.perf_counter()
+    summary = {'songs': 0, 'analyzed': 0, 'silent': 0, 'errors': {}}
+    if not decoder_available():
+        print(f"Errore: decoder '{settings.LOUDNESS_FFMPEG}' non trovato (impostazione LOUDNESS_FFMPEG)")
+        return summary
+
+    conn = sqlite3.connect(db_path, timeout=settings.DB_BUSY_TIMEOUT)
+    try:
+        add_loudness_columns(conn)
+        where = "" if full else " AND sample_peak IS NULL"
+        tasks = conn.execute(f"SELECT song_id, mp4_path FROM songs WHERE mp4_path IS NOT NULL{where} "
+                             "ORDER BY rowid").fetchall()
+        summary['songs'] = len(tasks)
+        print(f"Analisi della loudness di {len(tasks)} canzoni...")
+
+        results = []
+
+        def save():
+            with conn:
+                conn.executemany("UPDATE songs SET loudness_lufs = ?, sample_peak = ?, gain_db = ? WHERE song_id = ?",
+                                 results)
+            results.clear()
+
+        try:
+            for song_id, loudness, peak, error in _analyze_all(tasks, workers):
+                if error:
+                    summary['errors'][song_id] = error
+                    continue
+                results.append((loudness, peak, gain_for(loudness, peak), song_id))
+                summary['analyzed'] += 1
+                summary['silent'] += loudness is None
+                if len(results) >= settings.LOUDNESS_COMMIT_EVERY:
+                    save()
+        finally:
+            # salva anche quanto analizzato prima di un'interruzione
+            save()
+    finally:
+        conn.close()
+
+    summary['seconds'] = time.perf_counter() - start
+    print(f"Loudness analizzata per {summary['analyzed']} canzoni ({summary['silent']} mute, "
+          f"{len(summary['errors'])} errori) in {summary['seconds']:.1f}s.")
+    for song_id, error in list(summary['errors'].items())[:ERROR_SAMPLE_SIZE]:
+        print(f"  errore per '{song_id}': {error}")
+    return summary
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Calcola loudness e guadagno di normalizzazione delle canzoni.")
+    parser.add_argument('--db', default=settings.DATABASE_PATH, help="database SQLite")
+    parser.add_argument('--full', action='store_true', help="rianalizza anche le canzoni già analizzate")
+    parser.add_argument('--workers', type=int, default=None, help="processi del pool (default: numero di CPU)")
+    args = parser.parse_args()
+    analyze_loudness(args.db, args.full, args.workers)
@@ -0,0 +1,298 @@
+import os
+import sys
+import time
+import sqlite3
+import argparse
+
+import numpy as np
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from app import settings
+from app.utils.features import DTYPE, create_feature_tables, feature_dim, pack, unpack_many
+from init_db.import_playlists import create_database_tables
+
+PLAYLIST_PREFIX = 'Cluster'
+ASSIGN_BLOCK = 8192  # righe per calcolo delle distanze: una matrice (blocco, k) alla volta
+SQL_VARIABLES = 500  # rowid per query "IN (...)" durante il campionamento
+
+
+# === Mini-batch k-means ===
+def nearest(X, centroids):
+    """Indice del centroide più vicino a ogni riga di X, calcolato a blocchi."""
+    centroid_sq = (centroids ** 2).sum(axis=1)
+    labels = np.empty(len(X), dtype=np.int64)
+    for start in range(0, len(X), ASSIGN_BLOCK):
+        block = X[start:start + ASSIGN_BLOCK]
+        # |x - c|² = |x|² - 2 x·c + |c|²: |x|² è uguale per tutti i centroidi e non cambia l'argmin
+        labels[start:start + len(block)] = np.argmin(centroid_sq - 2 * (block @ centroids.T), axis=1)
+    return labels
+
+
+def init_centroids(sample, k, rng):
+    """Inizializzazione k-means++ su un campione: ogni centroide è estratto con probabilità ∝ distanza²."""
+    centroids = np.empty((k, sample.shape[1]), dtype=DTYPE)
+    centroids[0] = sample[rng.integers(len(sample))]
+    closest = ((sample - centroids[0]) ** 2).sum(axis=1, dtype=np.float64)
+    for i in range(1, k):
+        cumulative = np.cumsum(closest)
+        if cumulative[-1] > 0:
+            index = min(len(sample) - 1, int(np.searchsorted(cumulative, rng.random() * cumulative[-1])))
+        else:
+            index = rng.integers(len(sample))
+        centroids[i] = sample[index]
+        closest = np.minimum(closest, ((sample - centroids[i]) ** 2).sum(axis=1, dtype=np.float64))
+    return centroids
+
+
+def partial_fit(centroids, counts, X):
+    """
+    Un passo del mini-batch k-means (Sculley, 2010) sul batch X, in place.
+    Ogni centroide diventa la media di tutti i vettori che gli sono stati
+    assegnati finora: il passo per centroide è 1 / conteggio.
+
+    Returns:
+        Le etichette dei vettori di X.
+    """
+    labels = nearest(X, centroids)
+    batch_counts = np.bincount(labels, minlength=len(centroids))
+    # somme per centroide come prodotto con la matrice one-hot delle etichette (più veloce di np.add.at)
+    one_hot = np.zeros((len(X), len(centroids)), dtype=DTYPE)
+    one_hot[np.arange(len(X)), labels] = 1
+    sums = (one_hot.T @ X).astype(np.float64)
+    hit = batch_counts > 0
+    counts[hit] += batch_counts[hit]
+    step = (sums[hit] - batch_counts[hit, None] * centroids[hit]) / counts[hit, None]
+    centroids[hit] += step.astype(DTYPE)
+    return labels
+
+
+# === Lettura a blocchi ===
+def _rowids(conn, where=''):
+    return np.fromiter((row[0] for row in conn.execute(f"SELECT rowid FROM song_features {where} ORDER BY rowid")),
+                       dtype=np.int64)
+
+
+def _chunks(rowids, chunk_rows):
+    return [rowids[i:i + chunk_rows] for i in range(0, len(rowids), chunk_rows)]
+
+
+def _read_chunk(conn, chunk, dim, where=''):
+    """Righe (rowid, song_id, vettori) con rowid nell'intervallo del blocco."""
+    condition = f"AND {where}" if where else ""
+    rows = conn.execute(f"""
+        SELECT rowid, song_id, vector FROM song_features
+        WHERE rowid BETWEEN ? AND ? {condition}
+        ORDER BY rowid
+        """, (int(chunk[0]), int(chunk[-1]))).fetchall()
+    return [row[0] for row in rows], [row[1] for row in rows], unpack_many([row[2] for row in rows], dim)
+
+
+def _read_sample(conn, rowids, size, dim, rng):
+    chosen = np.sort(rng.choice(rowids, size=min(size, len(rowids)), replace=False))
+    blobs = []
+    for start in range(0, len(chosen), SQL_VARIABLES):
+        part = chosen[start:start + SQL_VARIABLES].tolist()
+        placeholders = ",".join("?" * len(part))
+        blobs.extend(row[0] for row in conn.execute(
+            f"SELECT vector FROM song_features WHERE rowid IN ({placeholders})", part))
+    return unpack_many(blobs, dim)
+
+
+def fit(conn, k, dim, batch_size, epochs, chunk_rows, sample_rows, rng):
+    """
+    Addestra i centroidi su tutta la libreria. In memoria c'è un solo blocco
+    di chunk_rows vettori alla volta (più i rowid, 8 byte per canzone); i
+    blocchi sono visitati in ordine casuale e mescolati al loro interno.
+    """
+    rowids = _rowids(conn)
+    sample = _read_sample(conn, rowids, sample_rows, dim, rng)
+    k = min(k, len(sample))
+    centroids = init_centroids(sample, k, rng)
+    del sample
+    counts = np.zeros(k, dtype=np.int64)
+    chunks = _chunks(rowids, chunk_rows)
+    for _ in range(epochs):
+        for index in rng.permutation(len(chunks)):
+            X = _read_chunk(conn, chunks[index], dim)[2]
+            order = rng.permutation(len(X))
+            for start in range(0, len(X), batch_size):
+                partial_fit(centroids, counts, X[order[start:start + batch_size]])
+    return centroids, counts
+
+
+# === Scrittura ===
+def _load_centroids(conn):
+    rows = conn.execute("SELECT cluster, centroid, count, playlist_id FROM cluster_centroids ORDER BY cluster").fetchall()
+    if not rows:
+        return None, None, []
+    centroids = unpack_many([row[1] for row in rows], len(rows[0][1]) // DTYPE.itemsize).copy()
+    counts = np.array([row[2] for row in rows], dtype=np.int64)
+    return centroids, counts, [row[3] for row in rows]
+
+
+def _save_centroids(conn, centroids, counts, playlist_ids):
+    conn.execute("DELETE FROM cluster_centroids")
+    conn.executemany("INSERT INTO cluster_centroids (cluster, centroid, count, playlist_id) VALUES (?, ?, ?, ?)",
+                     ((cluster, pack(centroid), int(count), playlist_id)
+                      for cluster, (centroid, count, playlist_id) in enumerate(zip(centroids, counts, playlist_ids))))
+
+
+def _cluster_playlists(conn, k):
+    """Id delle playlist "Cluster N" (create se mancano), svuotate delle vecchie canzoni."""
+    playlist_ids = []
+    for cluster in range(k):
+        name = f"{PLAYLIST_PREFIX} {cluster}"
+        conn.execute("INSERT INTO playlists (name) VALUES (?) ON CONFLICT (name) DO NOTHING", (name,))
+        playlist_ids.append(conn.execute("SELECT id FROM playlists WHERE name = ?", (name,)).fetchone()[0])
+        # la playlist non viene più da un CSV: l'import incrementale non la considera sua
+        conn.execute("DELETE FROM playlist_sources WHERE name = ?", (name,))
+    conn.executemany("DELETE FROM playlist_songs WHERE playlist_id = ?", ((pid,) for pid in playlist_ids))
+    return playlist_ids
+
+
+def _recluster(conn, k, dim, options, rng, summary):
+    centroids, counts = fit(conn, k, dim, options['batch_size'], options['epochs'],
+                            options['chunk_rows'], options['sample_rows'], rng)
+    k = len(centroids)
+    conn.execute("BEGIN")
+    # playlist di un clustering precedente con più cluster
+    _, _, old_ids = _load_centroids(conn)
+    stale = [(pid,) for pid in old_ids[k:] if pid is not None]
+    conn.executemany("DELETE FROM playlist_songs WHERE playlist_id = ?", stale)
+    conn.executemany("DELETE FROM playlists WHERE id = ?", stale)
+
+    playlist_ids = _cluster_playlists(conn, k)
+    for chunk in _chunks(_rowids(conn), options['chunk_rows']):
+        rowids, _, X = _read_chunk(conn, chunk, dim)
+        conn.executemany("UPDATE song_features SET cluster = ? WHERE rowid = ?",
+                         zip(nearest(X, centroids).tolist(), rowids))
+        summary['assigned'] += len(rowids)
+    _save_centroids(conn, centroids, counts, playlist_ids)
+    # una sola INSERT ... SELECT per tutte le playlist; le canzoni non più in 'songs' sono escluse
+    conn.execute("""
+        INSERT INTO playlist_songs (playlist_id, song_id)
+        SELECT c.playlist_id, f.song_id
+        FROM song_features f
+        JOIN cluster_centroids c ON c.cluster = f.cluster
+        JOIN songs s ON s.song_id = f.song_id
+        """)
+    conn.commit()
+    summary['clusters'] = k
+
+
+def _leave_old_clusters(conn, song_ids, counts, playlist_ids):
+    """
+    Toglie le canzoni dalle playlist "Cluster N" in cui sono già. Sono
+    quelle con il vettore cambiato (store_features le rimette da assegnare):
+    il vecchio centroide non le conta più e la nuova assegnazione non le
+    lascia in due playlist.
+    """
+    cluster_of = {playlist_id: cluster for cluster, playlist_id in enumerate(playlist_ids)}
+    select = (f"SELECT playlist_id FROM playlist_songs WHERE song_id = ? "
+              f"AND playlist_id IN ({','.join('?' * len(playlist_ids))})")
+    left = [(row[0], song_id) for song_id in song_ids for row in conn.execute(select, (song_id, *playlist_ids))]
+    if not left:
+        return
+    old_clusters = [cluster_of[playlist_id] for playlist_id, _ in left]
+    np.maximum(counts - np.bincount(old_clusters, minlength=len(counts)), 0, out=counts)
+    conn.executemany("DELETE FROM playlist_songs WHERE playlist_id = ? AND song_id = ?", left)
+
+
+def _assign_new(conn, new_rowids, centroids, counts, playlist_ids, dim, options, summary):
+    conn.execute("BEGIN")
+    for chunk in _chunks(new_rowids, options['chunk_rows']):
+        rowids, song_ids, X = _read_chunk(conn, chunk, dim, where="cluster IS NULL")
+        _leave_old_clusters(conn, song_ids, counts, playlist_ids)
+        # le canzoni nuove spostano anche i centroidi, come un passo di addestramento
+        labels = np.concatenate([partial_fit(centroids, counts, X[start:start + options['batch_size']])
+                                 for start in range(0, len(X), options['batch_size'])] or [np.empty(0, np.int64)])
+        conn.executemany("UPDATE song_features SET cluster = ? WHERE rowid = ?", zip(labels.tolist(), rowids))
+        conn.executemany("""
+            INSERT OR IGNORE INTO playlist_songs (playlist_id, song_id)
+            SELECT ?, song_id FROM songs WHERE song_id = ?
+            """, ((playlist_ids[label], song_id) for label, song_id in zip(labels.tolist(), song_ids)))
+        summary['assigned'] += len(rowids)
+    _save_centroids(conn, centroids, counts, playlist_ids)
+    conn.commit()
+    summary['clusters'] = len(centroids)
+
+
+def cluster_library(db_path, k=None, incremental=True, batch_size=None, epochs=None, chunk_rows=None,
+                    sample_rows=None, seed=None):
+    """
+    Raggruppa le canzoni per vettore di caratteristiche con un mini-batch
+    k-means vettorizzato e scrive una playlist "Cluster N" per cluster in
+    'playlists' e 'playlist_songs', al posto dei CSV esterni.
+
+    Con incremental=True, se esiste già un clustering con lo stesso numero di
+    cluster, vengono assegnate solo le canzoni nuove (o con il vettore
+    cambiato, che lasciano la playlist del vecchio cluster) al centroide più
+    vicino, aggiornando i centroidi; le altre canzoni restano dove sono. Si riparte da zero se le canzoni nuove sono
+    più di CLUSTER_MAX_NEW_FRACTION.
+
+    Returns:
+        Un dizionario di riepilogo (modo, canzoni, assegnate, cluster, durata).
+    """
+    start = time.perf_counter()
+    k = k or settings.CLUSTER_COUNT
+    options = {
+        'batch_size': batch_size or settings.CLUSTER_BATCH_SIZE,
+        'epochs': epochs or settings.CLUSTER_EPOCHS,
+        'chunk_rows': chunk_rows or settings.CLUSTER_CHUNK_ROWS,
+        'sample_rows': sample_rows or settings.CLUSTER_SAMPLE_ROWS,
+    }
+    rng = np.random.default_rng(seed)
+    summary = {'mode': 'unchanged', 'songs': 0, 'assigned': 0, 'clusters': 0}
+
+    # isolation_level=None: le transazioni sono aperte esplicitamente con BEGIN
+    conn = sqlite3.connect(db_path, timeout=settings.DB_BUSY_TIMEOUT, isolation_level=None)
+    try:
+        conn.execute("PRAGMA journal_mode = WAL")
+        create_feature_tables(conn)
+        create_database_tables(conn.cursor())
+        dim = feature_dim(conn)
+        summary['songs'] = conn.execute("SELECT COUNT(*) FROM song_features").fetchone()[0]
+        if dim is None:
+            print("Nessun vettore nella tabella 'song_features': importali con run_cmd import-features.")
+            return summary
+
+        centroids, counts, playlist_ids = _load_centroids(conn)
+        new_rowids = _rowids(conn, "WHERE cluster IS NULL")
+        reusable = (incremental and centroids is not None and len(centroids) == k
+                    and centroids.shape[1] == dim and None not in playlist_ids
+                    and len(new_rowids) <= settings.CLUSTER_MAX_NEW_FRACTION * summary['songs'])
+        if reusable:
+            if len(new_rowids):
+                summary['mode'] = 'incremental'
+                _assign_new(conn, new_rowids, centroids, counts, playlist_ids, dim, options, summary)
+            else:
+                summary['clusters'] = k
+        else:
+            summary['mode'] = 'full'
+            _recluster(conn, k, dim, options, rng, summary)
+    except Exception:
+        if conn.in_transaction:
+            conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+    summary['seconds'] = time.perf_counter() - start
+    mode = {'full': 'completo', 'incremental': 'incrementale', 'unchanged': 'invariato'}[summary['mode']]
+    print(f"Clustering {mode}: {summary['assigned']} di {summary['songs']} canzoni assegnate "
+          f"a {summary['clusters']} playlist in {summary['seconds']:.1f}s.")
+    return summary
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Crea le playlist 'Cluster N' dai vettori delle canzoni.")
+    parser.add_argument('--db', default=settings.DATABASE_PATH, help="database SQLite")
+    parser.add_argument('-k', '--clusters', type=int, default=settings.CLUSTER_COUNT, help="numero di playlist")
+    parser.add_argument('--full', action='store_true', help="ricalcola tutti i cluster invece di aggiungere le nuove")
+    parser.add_argument('--seed', type=int, default=None, help="seed per risultati riproducibili")
+    args = parser.parse_args()
+
+    cluster_library(args.db, args.clusters, incremental=not args.full, seed=args.seed)
@@ -0,0 +1,121 @@
+import os
+import sys
+import time
+import sqlite3
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from app import settings
+from app.utils.audio import decoder_available
+from app.utils.waveforms import create_waveform_table, extract_peaks, pack_peaks
+
+ERROR_SAMPLE_SIZE = 10  # errori mostrati nel riepilogo
+
+
+def _extract_song(task):
+    """
+    Picchi compressi della forma d'onda di una canzone (eseguita nei processi del pool).
+
+    Returns:
+        (song_id, blob compresso, errore)
+    """
+    song_id, path = task
+    if not os.path.exists(path):
+        return song_id, None, f"file non trovato -> {path}"
+    try:
+        return song_id, pack_peaks(extract_peaks(path)), None
+    except Exception as e:
+        return song_id, None, f"{path}: {e}"
+
+
+def _extract_all(tasks, workers):
+    """Estrae le forme d'onda in parallelo con un pool di processi, restituendo i risultati in ordine."""
+    if workers == 1:
+        yield from map(_extract_song, tasks)
+        return
+    pool = ProcessPoolExecutor(max_workers=workers)
+    try:
+        chunksize = max(1, min(16, len(tasks) // ((workers or os.cpu_count() or 1) * 16)))
+        yield from pool.map(_extract_song, tasks, chunksize=chunksize)
+    finally:
+        # anche se interrotti: niente attesa delle canzoni ancora in coda
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def extract_missing_waveforms(db_path, full=False, workers=None):
+    """
+    Estrae le forme d'onda delle canzoni che non ce l'hanno (tutte con
+    full=True) per la barra di avanzamento dell'app:
+
+    - ogni file viene decodificato da ffmpeg in PCM mono a
+      WAVEFORM_SAMPLE_RATE e ridotto con NumPy a WAVEFORM_BINS picchi da un
+      byte, compressi con snappy, in un pool di processi;
+    - i risultati vengono salvati in song_waveforms ogni
+      WAVEFORM_COMMIT_EVERY canzoni, quindi dopo un'interruzione si riparte
+      da quelle mancanti.
+
+    L'app estrae comunque da sola, in background, le forme d'onda mancanti
+    delle tracce in coda: questo comando serve a prepararle tutte in anticipo.
+
+    Returns:
+        Un dizionario di riepilogo (canzoni da elaborare, estratte, byte
+        salvati, errori, durata).
+    """
+    start = time.perf_counter()
+    summary = {'songs': 0, 'extracted': 0, 'bytes': 0, 'errors': {}}
+    if not decoder_available():
+        print(f"Errore: decoder '{settings.LOUDNESS_FFMPEG}' non trovato (impostazione LOUDNESS_FFMPEG)")
+        return summary
+
+    conn = sqlite3.connect(db_path, timeout=settings.DB_BUSY_TIMEOUT)
+    try:
+        create_waveform_table(conn)
+        missing = "" if full else " AND NOT EXISTS (SELECT 1 FROM song_waveforms w WHERE w.song_id = s.song_id)"
+        tasks = conn.execute(f"SELECT s.song_id, s.mp4_path FROM songs s WHERE s.mp4_path IS NOT NULL{missing} "
+                             "ORDER BY s.rowid").fetchall()
+        summary['songs'] = len(tasks)
+        print(f"Estrazione delle forme d'onda di {len(tasks)} canzoni...")
+
+        results = []
+
+        def save():
+            with conn:
+                conn.executemany("INSERT OR REPLACE INTO song_waveforms (song_id, peaks) VALUES (?, ?)", results)
+            results.clear()
+
+        try:
+            for song_id, blob, error in _extract_all(tasks, workers):
+                if error:
+                    summary['errors'][song_id] = error
+                    continue
+                results.append((song_id, blob))
+                summary['extracted'] += 1
+                summary['bytes'] += len(blob)
+                if len(results) >= settings.WAVEFORM_COMMIT_EVERY:
+                    save()
+        finally:
+            # salva anche quanto estratto prima di un'interruzione
+            save()
+    finally:
+        conn.close()
+
+    summary['seconds'] = time.perf_counter() - start
+    average = summary['bytes'] / summary['extracted'] if summary['extracted'] else 0
+    print(f"Forme d'onda estratte per {summary['extracted']} canzoni ({average:.0f} byte in media, "
+          f"{len(summary['errors'])} errori) in {summary['seconds']:.1f}s.")
+    for song_id, error in list(summary['errors'].items())[:ERROR_SAMPLE_SIZE]:
+        print(f"  errore per '{song_id}': {error}")
+    return summary
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Estrae le forme d'onda delle canzoni per la barra di avanzamento.")
+    parser.add_argument('--db', default=settings.DATABASE_PATH, help="database SQLite")
+    parser.add_argument('--full', action='store_true', help="rielabora anche le canzoni che hanno già una forma d'onda")
+    parser.add_argument('--workers', type=int, default=None, help="processi del pool (default: numero di CPU)")
+    args = parser.parse_args()
+    extract_missing_waveforms(args.db, args.full, args.workers)
@@ -0,0 +1,158 @@
+import os
+import sys
+import time
+import sqlite3
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from app import settings
+from app import resources
+
+COVER_COLUMNS = {size: f'copertina_{size}_path' for size in settings.COVER_SIZES}
+JPEG_QUALITY = 90
+ERROR_SAMPLE_SIZE = 10  # errori mostrati nel riepilogo
+
+
+def _save_atomic(img, dest):
+    """Salva il JPEG in un file temporaneo e lo rinomina: nessun lettore vede un file a metà."""
+    os.makedirs(os.path.dirname(dest), exist_ok=True)
+    tmp_path = f"{dest}.{os.getpid()}.tmp"
+    try:
+        img.save(tmp_path, format='JPEG', quality=JPEG_QUALITY)
+        os.replace(tmp_path, dest)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def _generate_song(task):
+    """
+    Crea le copertine mancanti di una canzone (eseguita nei processi del pool).
+
+    La sorgente è la copertina esistente più grande; le risoluzioni più
+    grandi della sorgente non vengono create (sarebbero solo ingrandite).
+
+    Returns:
+        (song_id, {size: percorso creato}, errore)
+    """
+    song_id, paths, out_dir, sizes = task
+    existing = {size: path for size, path in paths.items() if path and os.path.exists(path)}
+    if not existing:
+        return song_id, {}, None
+    source_size = max(existing)
+    targets = sorted((size for size in sizes if size not in existing and size < source_size), reverse=True)
+    if not targets:
+        return song_id, {}, None
+
+    from PIL import Image  # import locale: Pillow serve solo nei processi del pool
+
+    created = {}
+    try:
+        with Image.open(existing[source_size]) as img:
+            # draft permette al decoder JPEG di ridurre gia' in fase di decodifica
+            img.draft('RGB', (targets[0], targets[0]))
+            img = img.convert('RGB')
+        # dalla più grande alla più piccola, ognuna ridotta dalla precedente
+        for size in targets:
+            img.thumbnail((size, size))
+            dest = os.path.join(out_dir, str(size), f"{song_id}.jpg")
+            _save_atomic(img, dest)
+            created[size] = dest
+    except Exception as e:
+        return song_id, created, f"{existing[source_size]}: {e}"
+    return song_id, created, None
+
+
+def _generate_all(tasks, workers):
+    """Genera le copertine in parallelo con un pool di processi, restituendo i risultati in ordine."""
+    if workers == 1:
+        yield from map(_generate_song, tasks)
+        return
+    pool = ProcessPoolExecutor(max_workers=workers)
+    try:
+        chunksize = max(1, min(16, len(tasks) // ((workers or os.cpu_count() or 1) * 16)))
+        yield from pool.map(_generate_song, tasks, chunksize=chunksize)
+    finally:
+        # anche se interrotti: niente attesa delle canzoni ancora in coda
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def generate_missing_covers(db_path, out_dir=None, sizes=None, workers=None):
+    """
+    Crea le copertine delle risoluzioni mancanti (percorso NULL o file che
+    non esiste) a partire dalla più grande disponibile:
+
+    - le immagini vengono decodificate (in draft mode) e ridotte da un pool
+      di processi, e scritte in out_dir/<size>/<song_id>.jpg in modo atomico;
+    - i nuovi percorsi vengono scritti nel database ogni COVER_COMMIT_EVERY
+      canzoni, con un executemany per colonna: dopo un'interruzione si
+      riparte dalle copertine i cui percorsi non sono stati salvati.
+
+    Returns:
+        Un dizionario di riepilogo (canzoni esaminate, copertine create per
+        risoluzione, canzoni aggiornate, errori, durata).
+    """
+    start = time.perf_counter()
+    out_dir = out_dir or resources.COPERTINE_DIR
+    sizes = tuple(sizes or settings.COVER_SIZES)
+    summary = {'songs': 0, 'created': {size: 0 for size in sizes}, 'updated': 0, 'errors': {}}
+
+    conn = sqlite3.connect(db_path, timeout=settings.DB_BUSY_TIMEOUT)
+    try:
+        columns = ", ".join(COVER_COLUMNS[size] for size in settings.COVER_SIZES)
+        tasks = [(row[0], dict(zip(settings.COVER_SIZES, row[1:])), out_dir, sizes)
+                 for row in conn.execute(f"SELECT song_id, {columns} FROM songs")]
+        summary['songs'] = len(tasks)
+        print(f"Controllo delle copertine di {len(tasks)} canzoni ({', '.join(map(str, sizes))} px)...")
+
+        updates = {size: [] for size in sizes}
+        pending = 0  # canzoni con percorsi non ancora salvati
+
+        def save():
+            with conn:
+                for size, params in updates.items():
+                    if params:
+                        conn.executemany(f"UPDATE songs SET {COVER_COLUMNS[size]} = ? WHERE song_id = ?", params)
+                    params.clear()
+
+        try:
+            for song_id, created, error in _generate_all(tasks, workers):
+                if error:
+                    summary['errors'][song_id] = error
+                for size, path in created.items():
+                    updates[size].append((path, song_id))
+                    summary['created'][size] += 1
+                if created:
+                    summary['updated'] += 1
+                    pending += 1
+                if pending >= settings.COVER_COMMIT_EVERY:
+                    save()
+                    pending = 0
+        finally:
+            # salva anche quanto creato prima di un'interruzione
+            save()
+    finally:
+        conn.close()
+
+    summary['seconds'] = time.perf_counter() - start
+    created = ", ".join(f"{size}px: {count}" for size, count in summary['created'].items())
+    print(f"Copertine create ({created}) per {summary['updated']} canzoni in {summary['seconds']:.1f}s.")
+    for song_id, error in list(summary['errors'].items())[:ERROR_SAMPLE_SIZE]:
+        print(f"  errore per '{song_id}': {error}")
+    return summary
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Crea le copertine mancanti nelle risoluzioni salvate nel database.")
+    parser.add_argument('--db', default=settings.DATABASE_PATH, help="database SQLite")
+    parser.add_argument('--out-dir', default=resources.COPERTINE_DIR, help="directory delle copertine create")
+    parser.add_argument('--size', type=int, action='append', choices=settings.COVER_SIZES,
+                        help="risoluzione da creare (ripetibile, default: tutte)")
+    parser.add_argument('--workers', type=int, default=None, help="processi del pool (default: numero di CPU)")
+    args = parser.parse_args()
+    generate_missing_covers(args.db, args.out_dir, args.size, args.workers)
@@ -1,8 +1,13 @@
 
 import sqlite3
-import pandas as pd
 import glob
 import os
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+CSV_PATTERN = 'playlist_cluster_New_*.csv'
+MISSING_SAMPLE_SIZE = 10  # song_id mancanti mostrati per playlist nel riepilogo
 
 def create_database_tables(cursor):
     """Crea le tabelle 'playlists' e 'playlist_songs' se non esistono."""
@@ -21,8 +26,22 @@ def create_database_tables(cursor):
         PRIMARY KEY (playlist_id, song_id)
     )
     """)
+    # file CSV da cui è stata importata ogni playlist, per l'import incrementale
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS playlist_sources (
+        name TEXT PRIMARY KEY,
+        csv_path TEXT NOT NULL,
+        size INTEGER NOT NULL,
+        mtime_ns INTEGER NOT NULL
+    )
+    """)
     print("Tabelle 'playlists' e 'playlist_songs' create o già esistenti.")
 
+def playlist_name_from_csv(csv_file):
+    """Estrai il nome della playlist dal nome del file."""
+    cluster_num = os.path.basename(csv_file).replace('playlist_cluster_New_', '').replace('.csv', '')
+    return f"Cluster {cluster_num}"
+
 def import_playlists_from_csv(db_path, csv_folder_path):
     """
     Importa le playlist dai file CSV nel database SQLite.
@@ -42,7 +61,7 @@ def import_playlists_from_csv(db_path, csv_folder_path):
     conn.commit()
 
 
-    csv_files = glob.glob(os.path.join(csv_folder_path, 'playlist_cluster_New_*.csv'))
+    csv_files = glob.glob(os.path.join(csv_folder_path, CSV_PATTERN))
 
     if not csv_files:
         print(f"Nessun file CSV trovato in {csv_folder_path}")
@@ -53,9 +72,7 @@ def import_playlists_from_csv(db_path, csv_folder_path):
 
     for csv_file in csv_files:
         try:
-            # Estrai il nome della playlist dal nome del file
-            cluster_num = os.path.basename(csv_file).replace('playlist_cluster_New_', '').replace('.csv', '')
-            playlist_name = f"Cluster {cluster_num}"
+            playlist_name = playlist_name_from_csv(csv_file)
 
             # Inserisci la nuova playlist nella tabella 'playlists'
             cursor.execute("INSERT INTO playlists (name) VALUES (?)", (playlist_name,))
@@ -63,6 +80,8 @@ def import_playlists_from_csv(db_path, csv_folder_path):
             print(f"Creata playlist '{playlist_name}' con ID: {playlist_id}")
 
             # Leggi il CSV e inserisci le canzoni nella tabella 'playlist_songs'
+            import pandas as pd  # import locale: pandas serve solo per leggere i CSV
+
             df = pd.read_csv(csv_file)
             songs_to_insert = []
             for song_id in df['song_id']:
@@ -85,10 +104,178 @@ def import_playlists_from_csv(db_path, csv_folder_path):
     print("\nImportazione completata.")
     conn.close()
 
+def _parse_playlist_csv(csv_file):
+    """
+    Legge un CSV di playlist (eseguita nei processi del pool).
+
+    Returns:
+        (csv_file, playlist_name, song_ids, errore): song_ids è None in caso di errore.
+    """
+    import pandas as pd  # import locale: pandas serve solo per leggere i CSV
+
+    try:
+        df = pd.read_csv(csv_file, usecols=['song_id'], dtype={'song_id': str})
+        song_ids = df['song_id'].dropna().tolist()
+        return csv_file, playlist_name_from_csv(csv_file), song_ids, None
+    except Exception as e:
+        return csv_file, playlist_name_from_csv(csv_file), None, str(e)
+
+def _parse_all(csv_files, workers):
+    """Legge i CSV in parallelo con un pool di processi."""
+    if workers == 1 or len(csv_files) < 2:
+        return [_parse_playlist_csv(csv_file) for csv_file in csv_files]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        chunksize = max(1, len(csv_files) // ((workers or os.cpu_count() or 1) * 4))
+        return list(pool.map(_parse_playlist_csv, csv_files, chunksize=chunksize))
+
+def import_playlists_bulk(db_path, csv_folder_path, incremental=False, workers=None):
+    """
+    Importa le playlist dai CSV in blocco:
+
+    - i CSV vengono letti in parallelo da un pool di processi;
+    - tutte le coppie (playlist, song_id) finiscono in una tabella temporanea e
+      vengono validate contro 'songs' con un'unica join;
+    - tutte le scritture avvengono in una sola transazione.
+
+    Con incremental=True vengono rilette solo le playlist il cui CSV è nuovo o
+    cambiato (dimensione/mtime) e rimosse quelle il cui CSV non esiste più; le
+    altre playlist, e i loro ID, restano invariati.
+
+    Returns:
+        Un dizionario di riepilogo (playlist importate, rimosse, invariate,
+        canzoni inserite, song_id mancanti per playlist, errori, durata).
+    """
+    start = time.perf_counter()
+    summary = {'imported': 0, 'removed': 0, 'unchanged': 0, 'songs': 0,
+               'missing': {}, 'errors': {}}
+
+    csv_files = sorted(glob.glob(os.path.join(csv_folder_path, CSV_PATTERN)))
+    if not csv_files:
+        print(f"Nessun file CSV trovato in {csv_folder_path}")
+        return summary
+
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+    cursor.execute("PRAGMA journal_mode = WAL")
+    create_database_tables(cursor)
+    conn.commit()
+
+    # stato dei file su disco, confrontato con quello dell'ultimo import
+    on_disk = {}
+    for csv_file in csv_files:
+        st = os.stat(csv_file)
+        on_disk[playlist_name_from_csv(csv_file)] = (csv_file, st.st_size, st.st_mtime_ns)
+
+    if incremental:
+        known = {name: (path, size, mtime) for name, path, size, mtime
+                 in cursor.execute("SELECT name, csv_path, size, mtime_ns FROM playlist_sources")}
+        existing = {name for (name,) in cursor.execute("SELECT name FROM playlists")}
+        changed = [path for name, (path, size, mtime) in on_disk.items()
+                   if name not in existing or known.get(name) != (path, size, mtime)]
+        removed = [name for name in known if name not in on_disk]
+        summary['unchanged'] = len(on_disk) - len(changed)
+    else:
+        changed = csv_files
+        removed = []
+
+    print(f"Trovati {len(csv_files)} file CSV, {len(changed)} da importare...")
+    parsed = _parse_all(changed, workers)
+
+    try:
+        cursor.execute("BEGIN")
+        if incremental:
+            # le playlist da reimportare (e quelle rimosse) perdono le vecchie canzoni
+            targets = removed + [name for _, name, song_ids, _ in parsed if song_ids is not None]
+            cursor.executemany("""
+                DELETE FROM playlist_songs
+                WHERE playlist_id = (SELECT id FROM playlists WHERE name = ?)
+            """, ((name,) for name in targets))
+            cursor.executemany("DELETE FROM playlists WHERE name = ?", ((name,) for name in removed))
+            cursor.executemany("DELETE FROM playlist_sources WHERE name = ?", ((name,) for name in removed))
+            summary['removed'] = len(removed)
+        else:
+            # Pulisce le tabelle prima di un nuovo import
+            cursor.execute("DELETE FROM playlist_songs")
+            cursor.execute("DELETE FROM playlists")
+            cursor.execute("DELETE FROM playlist_sources")
+            cursor.execute("DELETE FROM sqlite_sequence WHERE name='playlists'")
+
+        cursor.execute("CREATE TEMP TABLE IF NOT EXISTS staged_playlist_songs (playlist_name TEXT, song_id TEXT)")
+        cursor.execute("DELETE FROM staged_playlist_songs")
+
+        for csv_file, playlist_name, song_ids, error in parsed:
+            if song_ids is None:
+                summary['errors'][playlist_name] = error
+                continue
+            cursor.execute("INSERT OR IGNORE INTO playlists (name) VALUES (?)", (playlist_name,))
+            cursor.executemany(
+                "INSERT INTO staged_playlist_songs (playlist_name, song_id) VALUES (?, ?)",
+                ((playlist_name, song_id) for song_id in song_ids)
+            )
+            cursor.execute(
+                "INSERT OR REPLACE INTO playlist_sources (name, csv_path, size, mtime_ns) VALUES (?, ?, ?, ?)",
+                (playlist_name,) + on_disk[playlist_name]
+            )
+            summary['imported'] += 1
+
+        # un'unica join valida tutte le coppie contro la tabella 'songs'
+        cursor.execute("""
+            INSERT OR IGNORE INTO playlist_songs (playlist_id, song_id)
+            SELECT p.id, st.song_id
+            FROM staged_playlist_songs st
+            JOIN playlists p ON p.name = st.playlist_name
+            JOIN songs s ON s.song_id = st.song_id
+        """)
+        summary['songs'] = cursor.rowcount
+
+        for playlist_name, song_id in cursor.execute("""
+            SELECT st.playlist_name, st.song_id
+            FROM staged_playlist_songs st
+            LEFT JOIN songs s ON s.song_id = st.song_id
+            WHERE s.song_id IS NULL
+        """).fetchall():
+            summary['missing'].setdefault(playlist_name, []).append(song_id)
+
+        cursor.execute("DELETE FROM staged_playlist_songs")
+        conn.commit()
+    except sqlite3.Error as e:
+        print(f"Errore durante l'importazione delle playlist: {e}")
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+    summary['seconds'] = time.perf_counter() - start
+    _print_summary(summary)
+    return summary
+
+def _print_summary(summary):
+    missing_total = sum(len(ids) for ids in summary['missing'].values())
+    print(f"\nImportazione completata in {summary['seconds']:.1f} s: "
+          f"{summary['imported']} playlist importate, {summary['removed']} rimosse, "
+          f"{summary['unchanged']} invariate, {summary['songs']} canzoni collegate.")
+    if missing_total:
+        print(f"Attenzione: {missing_total} song_id non trovati nella tabella 'songs' "
+              f"in {len(summary['missing'])} playlist (saltati):")
+        for playlist_name, song_ids in sorted(summary['missing'].items()):
+            sample = ', '.join(song_ids[:MISSING_SAMPLE_SIZE])
+            more = f" (+{len(song_ids) - MISSING_SAMPLE_SIZE})" if len(song_ids) > MISSING_SAMPLE_SIZE else ""
+            print(f"  - {playlist_name}: {len(song_ids)} mancanti: {sample}{more}")
+    for playlist_name, error in sorted(summary['errors'].items()):
+        print(f"Errore durante l'elaborazione di '{playlist_name}': {error}")
+
 if __name__ == '__main__':
     DATABASE_PATH = 'music-player.db'
     CSV_FOLDER = os.path.join('data', 'csv')
-    import_playlists_from_csv(DATABASE_PATH, CSV_FOLDER)
+
+    parser = argparse.ArgumentParser(description="Importa le playlist dai CSV nel database.")
+    parser.add_argument('--incremental', action='store_true',
+                        help="reimporta solo le playlist i cui CSV sono nuovi o cambiati")
+    parser.add_argument('--workers', type=int, default=None,
+                        help="processi usati per leggere i CSV (default: numero di CPU)")
+    args = parser.parse_args()
+
+    import_playlists_bulk(DATABASE_PATH, CSV_FOLDER, incremental=args.incremental, workers=args.workers)
 
 
 
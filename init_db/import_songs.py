@@ -2,9 +2,28 @@
 import sqlite3
 import json
 import os
+import time
+import hashlib
+import argparse
+import re
+
+# campi della tabella 'songs' letti dal JSON, nell'ordine delle colonne
+SONG_FIELDS = (
+    'song_id',
+    'title',
+    'artists',
+    'mp4_path',
+    'copertina_640_path',
+    'copertina_300_path',
+    'copertina_64_path',
+)
+
+BATCH_SIZE = 5000  # righe per transazione nell'import incrementale
+READ_CHUNK_SIZE = 1 << 16  # byte letti per volta dal file JSON
+_WHITESPACE = re.compile(r'\s*')
 
 def create_songs_table(cursor):
-    """Crea la tabella 'songs' se non esiste, con la nuova colonna 'cover_path'."""
+    """Crea la tabella 'songs' se non esiste e aggiunge le colonne nuove a quelle già create."""
     cursor.execute("""
     CREATE TABLE IF NOT EXISTS songs (
         song_id TEXT PRIMARY KEY,
@@ -13,20 +32,133 @@ def create_songs_table(cursor):
         mp4_path TEXT,
         copertina_640_path TEXT,
         copertina_300_path TEXT,
-        copertina_64_path TEXT
+        copertina_64_path TEXT,
+        content_hash TEXT,
+        loudness_lufs REAL,
+        sample_peak REAL,
+        gain_db REAL
     )
     """)
+    # database creati prima dell'import incrementale o dell'analisi della loudness
+    columns = [row[1] for row in cursor.execute("PRAGMA table_info(songs)")]
+    for name, sql_type in (('content_hash', 'TEXT'), ('loudness_lufs', 'REAL'),
+                           ('sample_peak', 'REAL'), ('gain_db', 'REAL')):
+        if name not in columns:
+            cursor.execute(f"ALTER TABLE songs ADD COLUMN {name} {sql_type}")
     print("Tabella 'songs' creata o già esistente.")
+    create_songs_search_index(cursor)
+
+def create_songs_search_index(cursor):
+    """
+    Crea l'indice full-text 'songs_fts' (FTS5, tokenizer trigram) su titolo e artisti.
+    È una tabella external-content su 'songs': i trigger la tengono allineata
+    a ogni INSERT, UPDATE e DELETE, quindi anche durante gli import.
+    """
+    exists = cursor.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'songs_fts'"
+    ).fetchone()
+    cursor.execute("""
+    CREATE VIRTUAL TABLE IF NOT EXISTS songs_fts USING fts5(
+        title,
+        artists,
+        content='songs',
+        content_rowid='rowid',
+        tokenize='trigram'
+    )
+    """)
+    cursor.execute("""
+    CREATE TRIGGER IF NOT EXISTS songs_fts_ai AFTER INSERT ON songs BEGIN
+        INSERT INTO songs_fts(rowid, title, artists) VALUES (new.rowid, new.title, new.artists);
+    END
+    """)
+    cursor.execute("""
+    CREATE TRIGGER IF NOT EXISTS songs_fts_ad AFTER DELETE ON songs BEGIN
+        INSERT INTO songs_fts(songs_fts, rowid, title, artists) VALUES ('delete', old.rowid, old.title, old.artists);
+    END
+    """)
+    cursor.execute("""
+    CREATE TRIGGER IF NOT EXISTS songs_fts_au AFTER UPDATE OF title, artists ON songs BEGIN
+        INSERT INTO songs_fts(songs_fts, rowid, title, artists) VALUES ('delete', old.rowid, old.title, old.artists);
+        INSERT INTO songs_fts(rowid, title, artists) VALUES (new.rowid, new.title, new.artists);
+    END
+    """)
+    if not exists:
+        # indicizza le canzoni già presenti prima della creazione dell'indice
+        cursor.execute("INSERT INTO songs_fts(songs_fts) VALUES ('rebuild')")
+    print("Indice di ricerca 'songs_fts' creato o già esistente.")
+
+def song_to_row(song):
+    """
+    Converte un oggetto JSON nella tupla di colonne più l'hash del contenuto,
+    oppure None se mancano i campi obbligatori.
+    """
+    # Assicurati che i campi obbligatori esistano
+    if 'song_id' not in song or 'title' not in song:
+        return None
+    values = tuple(song.get(field) for field in SONG_FIELDS)
+    content_hash = hashlib.sha1(
+        json.dumps(values, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    ).hexdigest()
+    return values + (content_hash,)
+
+def iter_json_array(f, chunk_size=READ_CHUNK_SIZE):
+    """
+    Legge in streaming un file con un array JSON di oggetti, restituendo un
+    oggetto alla volta. In memoria resta solo un blocco di file alla volta.
+    """
+    decoder = json.JSONDecoder()
+    buffer = ''
+    pos = 0
+    started = False
+    eof = False
+    while True:
+        # salta spazi, l'apertura dell'array e le virgole tra gli elementi
+        pos = _WHITESPACE.match(buffer, pos).end()
+        if pos < len(buffer):
+            char = buffer[pos]
+            if not started:
+                if char != '[':
+                    raise ValueError("il file JSON non contiene un array")
+                started = True
+                pos += 1
+                continue
+            if char == ']':
+                return
+            if char == ',':
+                pos += 1
+                continue
+            try:
+                obj, pos = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                # oggetto incompleto: servono altri dati
+                if eof:
+                    raise
+            else:
+                yield obj
+                continue
+
+        if eof:
+            raise ValueError("array JSON non terminato")
+        chunk = f.read(chunk_size)
+        if not chunk:
+            eof = True
+        # scarta la parte già consumata prima di aggiungere il nuovo blocco
+        buffer = buffer[pos:] + chunk
+        pos = 0
 
-def import_songs_from_json(db_path, songs_json_path):
+def import_songs_from_json(db_path, songs_json_path, incremental=False):
     """
     Importa le canzoni da un file JSON nel database SQLite.
-    Pulisce la tabella prima di importare per evitare dati obsoleti.
+    Pulisce la tabella prima di importare per evitare dati obsoleti;
+    con incremental=True usa invece import_songs_incremental.
     """
     if not os.path.exists(songs_json_path):
         print(f"Errore: Il file '{songs_json_path}' non è stato trovato.")
         return
 
+    if incremental:
+        return import_songs_incremental(db_path, songs_json_path)
+
     conn = sqlite3.connect(db_path)
     cursor = conn.cursor()
 
@@ -43,24 +175,12 @@ def import_songs_from_json(db_path, songs_json_path):
     
     print(f"Trovate {len(songs_data)} canzoni da importare da '{songs_json_path}'...")
 
-    songs_to_insert = []
-    for song in songs_data:
-        # Assicurati che i campi obbligatori esistano
-        if 'song_id' in song and 'title' in song:
-            songs_to_insert.append((
-                song.get('song_id'),
-                song.get('title'),
-                song.get('artists'),
-                song.get('mp4_path'),
-                song.get('copertina_640_path'),
-                song.get('copertina_300_path'),
-                song.get('copertina_64_path'),
-            ))
+    songs_to_insert = [row for row in map(song_to_row, songs_data) if row is not None]
 
     try:
         cursor.executemany("""
-            INSERT INTO songs (song_id, title, artists, mp4_path, copertina_640_path, copertina_300_path, copertina_64_path)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
+            INSERT INTO songs (song_id, title, artists, mp4_path, copertina_640_path, copertina_300_path, copertina_64_path, content_hash)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
         """, songs_to_insert)
         conn.commit()
         print(f"Importate con successo {len(songs_to_insert)} canzoni nel database.")
@@ -70,8 +190,126 @@ def import_songs_from_json(db_path, songs_json_path):
     finally:
         conn.close()
 
+def _table_exists(cursor, name):
+    return cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (name,)).fetchone() is not None
+
+def _apply_batch(cursor, batch, stats):
+    """Inserisce le righe nuove e aggiorna quelle cambiate di un batch."""
+    ids = [row[0] for row in batch]
+    placeholders = ','.join('?' * len(ids))
+    existing = dict(cursor.execute(
+        f"SELECT song_id, content_hash FROM songs WHERE song_id IN ({placeholders})", ids
+    ))
+    cursor.executemany("INSERT OR IGNORE INTO import_seen (song_id) VALUES (?)", ((i,) for i in ids))
+
+    to_insert = []
+    to_update = []
+    for row in batch:
+        old_hash = existing.get(row[0], False)
+        if old_hash is False:
+            to_insert.append(row)
+        elif old_hash != row[-1]:
+            # colonne da aggiornare + song_id per la WHERE
+            to_update.append(row[1:] + (row[0],))
+        else:
+            stats['unchanged'] += 1
+
+    # un file audio diverso va rianalizzato (run_cmd loudness e run_cmd waveforms):
+    # prima dell'UPDATE delle righe, finché mp4_path è ancora quello vecchio
+    relinked = [(row[-1], row[2]) for row in to_update]
+    if _table_exists(cursor, 'song_waveforms'):
+        cursor.executemany("""
+            DELETE FROM song_waveforms
+            WHERE song_id = ?1 AND EXISTS (SELECT 1 FROM songs WHERE song_id = ?1 AND mp4_path IS NOT ?2)
+        """, relinked)
+    cursor.executemany("""
+        UPDATE songs SET loudness_lufs = NULL, sample_peak = NULL, gain_db = NULL
+        WHERE song_id = ? AND mp4_path IS NOT ?
+    """, relinked)
+    cursor.executemany("""
+        INSERT INTO songs (song_id, title, artists, mp4_path, copertina_640_path, copertina_300_path, copertina_64_path, content_hash)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT(song_id) DO NOTHING
+    """, to_insert)
+    cursor.executemany("""
+        UPDATE songs
+        SET title = ?, artists = ?, mp4_path = ?, copertina_640_path = ?,
+            copertina_300_path = ?, copertina_64_path = ?, content_hash = ?
+        WHERE song_id = ?
+    """, to_update)
+    stats['inserted'] += len(to_insert)
+    stats['updated'] += len(to_update)
+
+def import_songs_incremental(db_path, songs_json_path, batch_size=BATCH_SIZE):
+    """
+    Import incrementale: legge il JSON in streaming (memoria costante), inserisce
+    le canzoni nuove, aggiorna solo quelle il cui hash del contenuto è cambiato
+    e, a file letto per intero, elimina quelle che non compaiono più.
+    Le playlist esistenti non vengono toccate.
+
+    Returns:
+        Un dizionario con i conteggi inserted, updated, deleted, unchanged,
+        skipped e le statistiche di durata e throughput.
+    """
+    stats = {'inserted': 0, 'updated': 0, 'deleted': 0, 'unchanged': 0, 'skipped': 0}
+    start = time.perf_counter()
+
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+    # WAL: l'app può continuare a leggere durante l'import
+    cursor.execute("PRAGMA journal_mode = WAL")
+    cursor.execute("PRAGMA synchronous = NORMAL")
+    create_songs_table(cursor)
+    # song_id visti nel file, in una tabella temporanea invece che in memoria
+    cursor.execute("CREATE TEMP TABLE IF NOT EXISTS import_seen (song_id TEXT PRIMARY KEY)")
+    cursor.execute("DELETE FROM import_seen")
+    conn.commit()
+
+    try:
+        with open(songs_json_path, 'r', encoding='utf-8') as f:
+            batch = []
+            for song in iter_json_array(f):
+                row = song_to_row(song)
+                if row is None:
+                    stats['skipped'] += 1
+                    continue
+                batch.append(row)
+                if len(batch) >= batch_size:
+                    _apply_batch(cursor, batch, stats)
+                    conn.commit()
+                    batch = []
+            if batch:
+                _apply_batch(cursor, batch, stats)
+                conn.commit()
+
+        # solo dopo aver letto tutto il file: un file troncato non cancella nulla
+        cursor.execute("DELETE FROM songs WHERE song_id NOT IN (SELECT song_id FROM import_seen)")
+        stats['deleted'] = cursor.rowcount
+        conn.commit()
+    except (sqlite3.Error, ValueError) as e:
+        print(f"Errore durante l'import incrementale: {e}")
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+    elapsed = time.perf_counter() - start
+    processed = stats['inserted'] + stats['updated'] + stats['unchanged']
+    stats['seconds'] = elapsed
+    stats['rows_per_second'] = processed / elapsed if elapsed > 0 else 0.0
+    print(f"Import incrementale completato in {elapsed:.1f} s: "
+          f"{stats['inserted']} inserite, {stats['updated']} aggiornate, "
+          f"{stats['deleted']} eliminate, {stats['unchanged']} invariate, "
+          f"{stats['skipped']} scartate ({stats['rows_per_second']:.0f} righe/s)")
+    return stats
+
 if __name__ == '__main__':
     DATABASE_PATH = 'music-player.db'
     SONGS_JSON_PATH = os.path.join('data', 'data_songs_cleaned.json')
-    
-    import_songs_from_json(DATABASE_PATH, SONGS_JSON_PATH)
+
+    parser = argparse.ArgumentParser(description="Importa le canzoni dal JSON nel database.")
+    parser.add_argument('--incremental', action='store_true',
+                        help="aggiorna solo le canzoni cambiate invece di ricaricare tutto")
+    args = parser.parse_args()
+
+    import_songs_from_json(DATABASE_PATH, SONGS_JSON_PATH, incremental=args.incremental)